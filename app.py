@@ -1,11 +1,21 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from services.pdf_processor import PDFProcessor
-from services.ai_transformer import AITransformer
-from services.video_generator import VideoGenerator  # Back to real video generator
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import parse_options_header
+from services.job_queue import create_job_queue, process_identity
+from services.pipeline import run_job, warm_up
+from services.batch import batch_manifest, iter_archive, submit_batch, submit_sessions
+from services.events import get_event_hub
+from services.render_profiles import get_render_profile
+from services.script import Script
+from services.upload_manager import MultipartReader, UploadManager, UploadError
+from services.metrics import get_metrics
+from services.storage import DRAFT, OUTPUT, UPLOAD, get_storage
 import uuid
+import atexit
+import zipfile
 import logging
 
 load_dotenv()
@@ -19,8 +29,8 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",  # Allow all origins for deployment
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type"],
+        "allow_headers": ["Content-Type", "Authorization", "Range", "If-None-Match", "If-Modified-Since", "Upload-Offset", "Last-Event-ID"],
+        "expose_headers": ["Content-Type", "Content-Range", "Accept-Ranges", "Content-Length", "ETag"],
         "supports_credentials": False,
         "max_age": 3600
     }
@@ -29,18 +39,44 @@ CORS(app, resources={
 # Configure max upload size (50MB)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
 
+# Let a fronting nginx/Apache send output files via X-Sendfile
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize services
-pdf_processor = PDFProcessor()
-ai_transformer = AITransformer()
-video_generator = VideoGenerator()  # Real video generator
+# Initialize job queue; render workers start on the first submitted job.
+# Session and job state live in the shared store, so any web worker can answer for any session.
+job_queue = create_job_queue(run_job, initializer=warm_up)
+atexit.register(job_queue.stop)
+
+# Sharded uploads/ and outputs/ with an index; the reaper enforces TTL and disk quota
+storage = get_storage()
+storage.adopt_legacy()
+STORAGE_REAP_INTERVAL = float(os.getenv('STORAGE_REAP_INTERVAL', '300'))
+# Only the web worker holding the reaper lease reaps, however many workers and containers run
+storage.start_reaper(
+    interval=STORAGE_REAP_INTERVAL,
+    protected=job_queue.store.active_sessions,
+    leader=lambda: job_queue.store.acquire_lease('storage-reaper', process_identity(), STORAGE_REAP_INTERVAL * 2)
+)
+atexit.register(storage.stop_reaper)
+
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
 
-# Ensure directories exist
-os.makedirs('uploads', exist_ok=True)
-os.makedirs('outputs', exist_ok=True)
+# Each open event stream holds a web worker thread for at most this long before the client reconnects
+SSE_MAX_SECONDS = float(os.getenv('SSE_MAX_SECONDS', '300'))
+
+# Longest requirements text read from an upload form
+REQUIREMENTS_MAX_BYTES = 64 * 1024
+
+upload_manager = UploadManager(
+    'uploads',
+    block_size=int(os.getenv('UPLOAD_BLOCK_SIZE', str(1024 * 1024))),
+    max_size=app.config['MAX_CONTENT_LENGTH'],
+    storage=storage
+)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -49,107 +85,217 @@ def health_check():
 @app.route('/upload', methods=['POST'])
 def upload_pdf():
     try:
-        if 'pdf' not in request.files:
+        content_type, options = parse_options_header(request.content_type)
+        if content_type != 'multipart/form-data' or 'boundary' not in options:
             return jsonify({"error": "No PDF file provided"}), 400
-        
-        pdf_file = request.files['pdf']
-        user_requirements = request.form.get('requirements', '')
-        
-        if pdf_file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
+        if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+            raise UploadError(f"File exceeds maximum size of {app.config['MAX_CONTENT_LENGTH']} bytes", 413)
         
         # Generate unique session ID
         session_id = str(uuid.uuid4())
         
-        # Save uploaded file
-        pdf_path = f"uploads/{session_id}.pdf"
-        pdf_file.save(pdf_path)
+        # Parse the form straight off the request stream so the PDF is saved in blocks,
+        # hashing as it is written, without werkzeug spooling the whole body first
+        reader = MultipartReader(request.stream, options['boundary'].encode(), upload_manager.block_size)
+        saved = None
+        user_requirements = ''
+        for name, filename in reader.parts():
+            if name == 'pdf' and filename is not None and saved is None:
+                if filename == '':
+                    return jsonify({"error": "No file selected"}), 400
+                saved = upload_manager.save_stream(reader, session_id)
+            elif name == 'requirements' and filename is None:
+                user_requirements = reader.read(REQUIREMENTS_MAX_BYTES).decode('utf-8', 'replace')
+        
+        if saved is None:
+            return jsonify({"error": "No PDF file provided"}), 400
         
         logger.info(f"PDF uploaded successfully: {session_id}")
         
         return jsonify({
             "session_id": session_id,
             "message": "PDF uploaded successfully",
-            "requirements": user_requirements
+            "requirements": user_requirements,
+            "sha256": saved['sha256']
         })
     
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    try:
+        data = request.get_json(silent=True) or {}
+        total_size = data.get('size')
+        upload = upload_manager.create(
+            data.get('filename', ''),
+            int(total_size) if total_size is not None else None
+        )
+        return jsonify(upload), 201
+    
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Chunked upload error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/upload/chunked/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def chunked_upload(upload_id):
+    try:
+        if request.method == 'GET':
+            # Clients resume from the returned offset
+            return jsonify(upload_manager.status(upload_id))
+        
+        if request.method == 'DELETE':
+            upload_manager.status(upload_id)
+            upload_manager.abort(upload_id)
+            return jsonify({"upload_id": upload_id, "message": "Upload aborted"})
+        
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        if offset is None:
+            return jsonify({"error": "Upload-Offset header is required"}), 400
+        
+        return jsonify(upload_manager.append(upload_id, request.stream, int(offset)))
+    
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except ValueError:
+        return jsonify({"error": "Invalid offset"}), 400
+    except Exception as e:
+        logger.error(f"Chunked upload error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        result = upload_manager.complete(upload_id)
+        
+        logger.info(f"PDF uploaded successfully: {result['session_id']}")
+        
+        return jsonify({
+            "session_id": result['session_id'],
+            "message": "PDF uploaded successfully",
+            "requirements": data.get('requirements', ''),
+            "sha256": result['sha256'],
+            "size": result['size']
+        })
+    
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Chunked upload error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/process/<session_id>', methods=['POST'])
 def process_pdf(session_id):
     try:
-        pdf_path = f"uploads/{session_id}.pdf"
-        
-        if not os.path.exists(pdf_path):
+        if UPLOAD not in storage.lookup(session_id):
             logger.error(f"PDF not found for session: {session_id}")
             return jsonify({"error": "PDF not found. Please upload again."}), 404
+        storage.touch(session_id)
         
         # Get user requirements
-        data = request.get_json() or {}
+        data = request.get_json(silent=True) or {}
         requirements = data.get('requirements', 'Create an engaging video')
         
-        logger.info(f"Starting processing for session: {session_id}")
-        
-        # Step 1: Extract content from PDF
-        logger.info(f"Step 1/3: Extracting content from PDF")
-        try:
-            extracted_content = pdf_processor.extract_content(pdf_path)
-            logger.info(f"Extracted {len(extracted_content.get('content', []))} pages")
-        except Exception as e:
-            logger.error(f"PDF extraction failed: {str(e)}")
-            return jsonify({"error": f"Failed to extract PDF content: {str(e)}"}), 500
-        
-        # Step 2: Transform content using AI
-        logger.info(f"Step 2/3: Transforming content with AI")
-        try:
-            transformed_content = ai_transformer.transform_content(
-                extracted_content, 
-                requirements
-            )
-            logger.info("AI transformation completed")
-        except Exception as e:
-            logger.error(f"AI transformation failed: {str(e)}")
-            # Continue with fallback even if AI fails
-            transformed_content = {
-                'script': 'Generated video from PDF',
-                'source_pages': extracted_content.get('metadata', {}).get('num_pages', 0)
-            }
-        
-        # Step 3: Generate video
-        logger.info(f"Step 3/3: Generating video")
+        # draft/preview/final; a quick draft is rendered first unless draft is false
         try:
-            video_path = video_generator.create_video(
-                transformed_content, 
-                session_id
-            )
-            logger.info(f"Video generated successfully: {video_path}")
-        except Exception as e:
-            logger.error(f"Video generation failed: {str(e)}")
-            return jsonify({"error": f"Failed to generate video: {str(e)}"}), 500
+            profile = get_render_profile(data.get('profile'))['name']
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        payload = {'requirements': requirements, 'profile': profile}
+        if 'draft' in data:
+            payload['draft'] = bool(data['draft'])
+        
+        # Rendering happens in the worker pool; the request returns immediately
+        job_queue.submit(session_id, payload)
+        job = job_queue.status(session_id)
+        
+        logger.info(f"Queued processing for session: {session_id}")
         
         return jsonify({
             "session_id": session_id,
-            "status": "completed",
-            "video_path": video_path,
-            "message": "Video generated successfully"
-        })
+            "status": job['state'],
+            "profile": profile,
+            "queue_position": job['queue_position'],
+            "eta_seconds": job['eta_seconds'],
+            "message": "Video generation queued"
+        }), 202
     
     except Exception as e:
         logger.error(f"Processing error: {str(e)}", exc_info=True)
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
 
+@app.route('/script/<session_id>', methods=['GET', 'POST'])
+def edit_script(session_id):
+    try:
+        # GET the script of the last render; POST an edited one to re-render only the scenes that changed
+        job = job_queue.status(session_id)
+        if request.method == 'GET':
+            script = ((job or {}).get('result') or {}).get('script')
+            if script is None:
+                return jsonify({"error": "No script for this session yet"}), 404
+            return jsonify({"session_id": session_id, "script": script})
+        
+        if UPLOAD not in storage.lookup(session_id):
+            return jsonify({"error": "PDF not found. Please upload again."}), 404
+        if job and job['state'] in ('queued', 'running'):
+            return jsonify({"error": "A render is already in progress for this session"}), 409
+        storage.touch(session_id)
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            script = Script.from_dict(data.get('script', data))
+            profile = get_render_profile(data.get('profile'))['name']
+        except ValueError as e:
+            # ScriptError is a ValueError too
+            return jsonify({"error": str(e)}), 400
+        payload = {'script': script.to_dict(), 'profile': profile}
+        if 'draft' in data:
+            payload['draft'] = bool(data['draft'])
+        
+        job_queue.submit(session_id, payload)
+        job = job_queue.status(session_id)
+        
+        logger.info(f"Queued re-render of an edited script for session: {session_id}")
+        
+        return jsonify({
+            "session_id": session_id,
+            "status": job['state'],
+            "profile": profile,
+            "scenes": len(script.scenes),
+            "queue_position": job['queue_position'],
+            "eta_seconds": job['eta_seconds'],
+            "message": "Re-render queued"
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Script error: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+def find_output(session_id, kind=OUTPUT):
+    """Return the indexed path of a session's output (MP4, or the PNG fallback)"""
+    entry = storage.lookup(session_id).get(kind)
+    return entry['path'] if entry else None
+
 @app.route('/download/<session_id>', methods=['GET'])
 def download_video(session_id):
     try:
-        # Try MP4 first, then PNG as fallback
-        video_path = f"outputs/{session_id}.mp4"
-        if not os.path.exists(video_path):
-            video_path = f"outputs/{session_id}.png"
+        # ?variant=draft serves the quick draft while the requested profile renders
+        kind = DRAFT if request.args.get('variant') == 'draft' else OUTPUT
+        video_path = find_output(session_id, kind)
         
-        if not os.path.exists(video_path):
+        if video_path is not None and not os.path.exists(video_path):
+            # Removed behind the index's back
+            storage.forget(session_id, kind, remove=False)
+            video_path = None
+        if video_path is None:
             return jsonify({"error": "Video not found"}), 404
+        storage.touch(session_id)
         
         # Determine file extension and MIME type
         file_ext = video_path.split('.')[-1]
@@ -160,8 +306,24 @@ def download_video(session_id):
             mimetype = 'image/png'
             download_name = f"generated_image_{session_id}.png"
         
-        return send_file(video_path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+        # ?inline=1 lets browsers play the video in place instead of saving it
+        inline = request.args.get('inline', '').lower() in ('1', 'true', 'yes')
+        
+        # conditional=True answers Range requests with 206 and revalidates via ETag/Last-Modified;
+        # the file body goes through wsgi.file_wrapper, which gunicorn serves with sendfile
+        return send_file(
+            os.path.abspath(video_path),
+            as_attachment=not inline,
+            download_name=download_name,
+            mimetype=mimetype,
+            conditional=True,
+            etag=True,
+            max_age=0
+        )
     
+    except RequestedRangeNotSatisfiable:
+        # send_file answers 416 with the file's length in Content-Range; not a server error
+        raise
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -169,23 +331,161 @@ def download_video(session_id):
 @app.route('/status/<session_id>', methods=['GET'])
 def get_status(session_id):
     try:
-        pdf_path = f"uploads/{session_id}.pdf"
-        video_path = f"outputs/{session_id}.mp4"
-        png_path = f"outputs/{session_id}.png"
+        # One index query instead of a stat per file
+        files = storage.lookup(session_id)
+        output_path = files[OUTPUT]['path'] if OUTPUT in files else None
         
         status = {
             "session_id": session_id,
-            "pdf_uploaded": os.path.exists(pdf_path),
-            "video_ready": os.path.exists(video_path) or os.path.exists(png_path),
-            "file_type": "mp4" if os.path.exists(video_path) else ("png" if os.path.exists(png_path) else "none")
+            "pdf_uploaded": UPLOAD in files,
+            "video_ready": output_path is not None,
+            "file_type": output_path.rsplit('.', 1)[-1] if output_path else "none",
+            "draft_ready": DRAFT in files
         }
         
+        job = job_queue.status(session_id)
+        if job:
+            # Output files from an earlier run may exist while a new job is pending
+            if job['state'] in ('queued', 'running'):
+                status["video_ready"] = False
+                if job['stage'] not in ('draft_ready', 'rendering'):
+                    status["draft_ready"] = False
+            status.update({
+                "state": job['state'],
+                "stage": job['stage'],
+                "percent": job['percent'],
+                "eta_seconds": job['eta_seconds'],
+                "queue_position": job['queue_position'],
+                "error": job['error'],
+                "timings": (job['result'] or {}).get('timings'),
+                "peak_rss_mb": (job['result'] or {}).get('peak_rss_mb'),
+                "downgraded": (job['result'] or {}).get('downgraded')
+            })
+        else:
+            status["state"] = "not_started"
+        
         return jsonify(status)
     
     except Exception as e:
         logger.error(f"Status error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/events/<session_id>', methods=['GET'])
+def stream_events(session_id):
+    try:
+        # EventSource sends Last-Event-ID when it reconnects; other clients may use the query string
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+        try:
+            last_event_id = int(last_event_id) if last_event_id not in (None, '') else None
+        except ValueError:
+            return jsonify({"error": "Invalid Last-Event-ID"}), 400
+        
+        snapshot = None
+        if last_event_id is None:
+            # Taken before the snapshot; later events are replayed after it, so none fall in between
+            last_event_id = job_queue.store.last_event_id()
+            job = job_queue.status(session_id)
+            if job is None:
+                if UPLOAD not in storage.lookup(session_id):
+                    return jsonify({"error": "Session not found"}), 404
+                snapshot = {"state": "not_started"}
+            else:
+                # Result paths are server-side; clients use /download
+                snapshot = {key: value for key, value in job.items() if key != 'result'}
+        
+        events = get_event_hub(job_queue.store).stream(session_id, last_event_id, snapshot,
+                                                         max_seconds=SSE_MAX_SECONDS)
+        return Response(events, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no',
+        })
+    
+    except Exception as e:
+        logger.error(f"Event stream error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _batch_documents(files):
+    """(name, stream) for each uploaded PDF, expanding zip archives"""
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            yield from iter_archive(file.stream)
+        else:
+            yield file.filename, file.stream
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    try:
+        # PDFs and zips as multipart "pdfs" fields, or JSON naming sessions uploaded earlier
+        data = request.get_json(silent=True) if request.is_json else request.form
+        data = data or {}
+        try:
+            profile = get_render_profile(data.get('profile'))['name']
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Drafts are for watching a single render; batches skip them unless asked
+        draft = data.get('draft', False)
+        if isinstance(draft, str):
+            draft = draft.lower() in ('1', 'true', 'yes')
+        payload = {
+            'requirements': data.get('requirements') or 'Create an engaging video',
+            'profile': profile,
+            'draft': bool(draft),
+        }
+        
+        if request.is_json:
+            session_ids = data.get('session_ids')
+            if not isinstance(session_ids, list) or not session_ids:
+                return jsonify({"error": "session_ids must be a non-empty list"}), 400
+            batch = submit_sessions(job_queue, storage, session_ids, payload, max_items=BATCH_MAX_ITEMS)
+        else:
+            files = [file for file in request.files.getlist('pdfs') if file.filename]
+            if not files:
+                return jsonify({"error": "No PDF files provided"}), 400
+            batch = submit_batch(job_queue, upload_manager, _batch_documents(files), payload,
+                                 max_items=BATCH_MAX_ITEMS)
+        
+        if not batch['submitted']:
+            return jsonify(dict(batch, error="No documents in the batch could be queued")), 400
+        return jsonify(batch), 202
+    
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Invalid zip archive"}), 400
+    except Exception as e:
+        logger.error(f"Batch error: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Batch failed: {str(e)}"}), 500
+
+@app.route('/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    try:
+        manifest = batch_manifest(job_queue, batch_id)
+        if manifest is None:
+            return jsonify({"error": "Batch not found"}), 404
+        for item in manifest['items']:
+            # Clients fetch outputs through /download rather than server paths
+            item.pop('video_path')
+            item['download_url'] = f"/download/{item['session_id']}" if item['state'] == 'completed' else None
+        return jsonify(manifest)
+    
+    except Exception as e:
+        logger.error(f"Batch status error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Merges the samples flushed by every render worker process
+    registry = get_metrics()
+    try:
+        counts = job_queue.store.count_by_status()
+        registry.set_gauge('pdfvideo_jobs_in_queue', counts.get('queued', 0), status='queued')
+        registry.set_gauge('pdfvideo_jobs_in_queue', counts.get('running', 0), status='running')
+        registry.set_gauge('pdfvideo_storage_bytes', storage.usage()['bytes'])
+    except Exception as e:
+        logger.warning(f"Failed to collect gauges: {str(e)}")
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route("/")
 def home():
     return "Backend is running"
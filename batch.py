@@ -0,0 +1,117 @@
+"""Convert many PDFs in one run
+
+    python batch.py catalog/ extra.pdf archive.zip --profile draft \
+        --requirements "Short product overview" --output-dir videos/
+
+Documents are queued as one batch and rendered by a pool of warm render
+workers, which load fonts, API clients and imports once and reuse them for
+every document. Videos are copied to --output-dir and a JSON manifest with
+per-document status is written next to them. The exit code is 1 if any
+document failed.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+from dotenv import load_dotenv
+from services.batch import batch_manifest, iter_paths, submit_batch
+from services.job_queue import create_job_queue
+from services.pipeline import run_job, warm_up
+from services.render_profiles import RENDER_PROFILES, default_profile_name
+from services.storage import get_storage
+from services.upload_manager import UploadManager
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _output_name(filename: str, used: set) -> str:
+    """File name for a document's video, unique within the output directory"""
+    stem = os.path.splitext(filename.replace('/', '_').replace('\\', '_'))[0] or 'document'
+    name = stem
+    counter = 1
+    while name in used:
+        counter += 1
+        name = f"{stem}_{counter}"
+    used.add(name)
+    return name
+
+
+def collect_outputs(manifest: dict, output_dir: str) -> None:
+    """Copy finished videos into output_dir and record where each one went"""
+    os.makedirs(output_dir, exist_ok=True)
+    used = set()
+    for item in manifest['items']:
+        source = item.get('video_path')
+        if not source or not os.path.exists(source):
+            item['output'] = None
+            continue
+        target = os.path.join(output_dir, f"{_output_name(item['filename'] or item['session_id'], used)}"
+                                          f"{os.path.splitext(source)[1]}")
+        shutil.copyfile(source, target)
+        item['output'] = target
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Convert many PDFs to videos in one batch')
+    parser.add_argument('paths', nargs='+', help='PDF files, directories of PDFs or zip archives')
+    parser.add_argument('--requirements', default='Create an engaging video')
+    parser.add_argument('--profile', default=default_profile_name(), choices=sorted(RENDER_PROFILES))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('RENDER_WORKERS', '1')),
+                        help='Render workers started by this command (0 relies on running worker.py processes)')
+    parser.add_argument('--output-dir', default='batch_output')
+    parser.add_argument('--manifest', help='Manifest path (default: <output-dir>/manifest.json)')
+    parser.add_argument('--max-items', type=int, default=int(os.getenv('BATCH_MAX_ITEMS', '500')))
+    parser.add_argument('--poll', type=float, default=2.0, help='Seconds between progress checks')
+    args = parser.parse_args(argv)
+
+    storage = get_storage()
+    upload_manager = UploadManager('uploads', storage=storage)
+    job_queue = create_job_queue(run_job, workers=args.workers, initializer=warm_up)
+    payload = {'requirements': args.requirements, 'profile': args.profile, 'draft': False}
+
+    started = time.perf_counter()
+    try:
+        batch = submit_batch(job_queue, upload_manager, iter_paths(args.paths), payload, max_items=args.max_items)
+        for item in batch['items']:
+            if 'error' in item:
+                logger.warning(f"Skipped {item['filename']}: {item['error']}")
+        if not batch['submitted']:
+            logger.error("No documents could be queued")
+            return 1
+        # Workers start with the first submission; only their progress is awaited here
+        job_queue.start()
+
+        last_counts = None
+        while True:
+            manifest = batch_manifest(job_queue, batch['batch_id'])
+            if manifest['counts'] != last_counts:
+                last_counts = manifest['counts']
+                logger.info(f"Batch {batch['batch_id']}: " +
+                            ', '.join(f"{count} {state}" for state, count in sorted(last_counts.items())))
+            if manifest['done']:
+                break
+            time.sleep(args.poll)
+    finally:
+        job_queue.stop(timeout=30)
+
+    collect_outputs(manifest, args.output_dir)
+    manifest['rejected'] = [item for item in batch['items'] if 'error' in item]
+    manifest['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+    manifest_path = args.manifest or os.path.join(args.output_dir, 'manifest.json')
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+    failed = manifest['counts'].get('failed', 0)
+    logger.info(f"Batch finished in {manifest['elapsed_seconds']}s: {manifest['counts'].get('completed', 0)} "
+                f"completed, {failed} failed, {len(manifest['rejected'])} rejected. Manifest: {manifest_path}")
+    return 1 if failed or manifest['rejected'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# Benchmark suite for the PDF to video pipeline
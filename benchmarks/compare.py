@@ -0,0 +1,62 @@
+"""Compare two benchmark reports
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10]
+
+Prints the p50/p95 change for every case present in both reports and exits
+with status 1 when any p50 latency regressed by more than the threshold.
+"""
+import sys
+import json
+import argparse
+from typing import Dict, List
+
+
+def load(path: str) -> Dict[str, Dict]:
+    with open(path, 'r') as file:
+        report = json.load(file)
+    return {result['name']: result for result in report.get('results', [])}
+
+
+def compare(baseline: Dict[str, Dict], candidate: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Relative latency change per case; positive means slower"""
+    rows = []
+    for name, new in candidate.items():
+        old = baseline.get(name)
+        if not old or 'error' in old or 'error' in new:
+            continue
+        row = {'name': name}
+        for key in ('p50', 'p95'):
+            before = old['latency_seconds'][key]
+            after = new['latency_seconds'][key]
+            row[key] = (after - before) / before if before else 0.0
+        row['rss'] = ((new['peak_rss_bytes'] - old['peak_rss_bytes']) / old['peak_rss_bytes']
+                      if old.get('peak_rss_bytes') else 0.0)
+        row['regressed'] = row['p50'] > threshold
+        rows.append(row)
+    return rows
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative p50 slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    rows = compare(load(args.baseline), load(args.candidate), args.threshold)
+    width = max([len(row['name']) for row in rows] + [4])
+    print(f"{'case':<{width}}  {'p50':>8}  {'p95':>8}  {'rss':>8}")
+    for row in rows:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        print(f"{row['name']:<{width}}  {row['p50']:>+8.1%}  {row['p95']:>+8.1%}  {row['rss']:>+8.1%}{flag}")
+
+    regressions = [row for row in rows if row['regressed']]
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
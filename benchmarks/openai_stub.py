@@ -0,0 +1,78 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class OpenAIStub:
+    """Local chat completions server so the OpenAI path can be benchmarked offline
+
+    Script prompts get a JSON script with the requested number of scenes (as a
+    tool call when the request offers tools) and every other prompt gets a
+    short summary, each after a fixed latency.
+    """
+
+    def __init__(self, latency: float = 0.05, scenes: int = 4):
+        self.latency = latency
+        self.scenes = scenes
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def _content(self, messages: list) -> str:
+        if 'video script' in messages[0].get('content', ''):
+            return json.dumps({
+                'title': 'Benchmark',
+                'scenes': [{
+                    'scene_number': i + 1,
+                    'narration': f'Scene {i + 1} explains one of the key points of the document in a sentence or two.',
+                    'visual_description': 'Gradient background with centered text',
+                    'duration_seconds': 4
+                } for i in range(self.scenes)]
+            })
+        return 'Summary of the key points in this part of the document. ' * 4
+
+    def start(self) -> 'OpenAIStub':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub._lock:
+                    stub.calls += 1
+                time.sleep(stub.latency)
+                message = {'role': 'assistant', 'content': stub._content(body['messages'])}
+                if body.get('tools'):
+                    message['tool_calls'] = [{
+                        'id': 'call_bench', 'type': 'function',
+                        'function': {'name': body['tools'][0]['function']['name'], 'arguments': message['content']}
+                    }]
+                    message['content'] = None
+                data = json.dumps({
+                    'id': 'bench', 'object': 'chat.completion', 'created': 0, 'model': body.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'tool_calls' if body.get('tools') else 'stop',
+                                 'message': message}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
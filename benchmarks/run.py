@@ -0,0 +1,302 @@
+"""Benchmark the PDF -> script -> video pipeline
+
+Runs PDF extraction, script generation (offline and against a local OpenAI
+stub) and video rendering over a matrix of synthetic inputs and writes a JSON
+report with latency percentiles, throughput, peak RSS and output sizes.
+
+    python -m benchmarks.run --quick --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+
+Every case runs in a fresh process so peak RSS belongs to that case alone.
+"""
+import os
+import sys
+import json
+import time
+import math
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_pdf import write_pdf  # noqa: E402
+
+SCHEMA_VERSION = 1
+
+# Words per page for each text density
+DENSITIES = {'sparse': 80, 'dense': 600}
+
+
+
+def build_cases(quick: bool = False) -> List[Dict]:
+    """The benchmark matrix; quick keeps one small case per kind"""
+    page_counts = [10, 50] if quick else [10, 100, 400]
+    densities = ['dense'] if quick else ['sparse', 'dense']
+    profiles = ['draft', 'final'] if quick else ['draft', 'preview', 'final']
+    scene_counts = [3] if quick else [1, 3, 8]
+
+    cases = []
+    for pages in page_counts:
+        for density in densities:
+            for budget in (None, 3000):
+                cases.append({
+                    'kind': 'extract',
+                    'name': f"extract/{pages}p/{density}/{'budget' if budget else 'full'}",
+                    'params': {'pages': pages, 'density': density, 'max_chars': budget},
+                })
+            cases.append({
+                'kind': 'transform_simple',
+                'name': f"transform_simple/{pages}p/{density}",
+                'params': {'pages': pages, 'density': density},
+            })
+    for mode in ('truncate', 'map_reduce'):
+        pages = page_counts[-1]
+        cases.append({
+            'kind': 'transform_openai',
+            'name': f"transform_openai/{mode}/{pages}p",
+            'params': {'pages': pages, 'density': 'dense', 'mode': mode, 'latency': 0.05},
+        })
+    for profile in profiles:
+        for scenes in scene_counts:
+            cases.append({
+                'kind': 'render',
+                'name': f"render/{profile}/{scenes}scenes",
+                'params': {'profile': profile, 'scenes': scenes, 'encoder': 'ffmpeg', 'scene_workers': 1},
+            })
+    return cases
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile, q in [0, 100]"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _rss_bytes(kilobytes_or_bytes: int) -> int:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return kilobytes_or_bytes if sys.platform == 'darwin' else kilobytes_or_bytes * 1024
+
+
+def _fixture_pdf(fixture_dir: str, pages: int, density: str) -> str:
+    path = os.path.join(fixture_dir, f"{pages}p_{density}.pdf")
+    if not os.path.exists(path):
+        write_pdf(path, pages, DENSITIES[density], seed=pages)
+    return path
+
+
+def _bench_scenes(count: int) -> List[Dict]:
+    return [{
+        'scene_number': i + 1,
+        'narration': f"Scene {i + 1} walks through one of the main findings of the document "
+                     f"and what it means for the reader in practical terms.",
+        'visual_description': 'Gradient background with centered text',
+        'duration_seconds': 4
+    } for i in range(count)]
+
+
+def _run_case(case: Dict, iterations: int, warmup: int, workdir: str) -> Dict:
+    """Run one case in this (fresh) process and return raw samples"""
+    os.chdir(workdir)
+    os.makedirs('outputs', exist_ok=True)
+    # Keep metric files out of the benchmark
+    os.environ['METRICS_DIR'] = ''
+    params = case['params']
+    kind = case['kind']
+    stub = None
+
+    if kind == 'extract':
+        from services.pdf_processor import PDFProcessor
+        processor = PDFProcessor()
+        pdf_path = _fixture_pdf(workdir, params['pages'], params['density'])
+
+        def step():
+            result = processor.extract_content(pdf_path, max_chars=params['max_chars'])
+            return {'pages': result['metadata']['pages_read'], 'chars': len(result['total_text'])}
+
+    elif kind in ('transform_simple', 'transform_openai'):
+        if kind == 'transform_openai':
+            from benchmarks.openai_stub import OpenAIStub
+            stub = OpenAIStub(latency=params['latency']).start()
+            os.environ.update(OPENAI_API_KEY='benchmark', OPENAI_BASE_URL=stub.base_url,
+                              AI_SUMMARY_MODE=params['mode'])
+        else:
+            os.environ.pop('OPENAI_API_KEY', None)
+        from services.pdf_processor import PDFProcessor
+        from services.ai_transformer import AITransformer
+        transformer = AITransformer()
+        pdf_path = _fixture_pdf(workdir, params['pages'], params['density'])
+        extracted = PDFProcessor().extract_content(pdf_path, max_chars=transformer.text_budget)
+
+        def step():
+            if kind == 'transform_simple':
+                result = transformer._simple_transform(extracted, 'Create an engaging video')
+            else:
+                result = transformer.transform_content(extracted, 'Create an engaging video')
+                if result.get('fallback'):
+                    raise Exception("OpenAI path fell back to the simple transform")
+            return {'documents': 1, 'chars': len(extracted['total_text'])}
+
+    elif kind == 'render':
+        from services.video_generator import VideoGenerator, script_scenes
+        generator = VideoGenerator(encoder=params['encoder'], profile=params['profile'])
+        generator.scene_workers = params['scene_workers']
+        content = {'script': {'title': 'Benchmark', 'scenes': _bench_scenes(params['scenes'])}}
+        video_seconds = sum(generator._scene_duration(scene) for scene in script_scenes(content))
+        fps = generator.render_settings()['fps']
+        counter = {'n': 0}
+
+        def step():
+            counter['n'] += 1
+            report = {}
+            output_path = generator.create_video(content, f"bench_{counter['n']}", report=report)
+            if report['fallback']:
+                raise Exception("Render fell back to the default video")
+            size = os.path.getsize(output_path)
+            os.remove(output_path)
+            return {'video_seconds': video_seconds, 'frames': video_seconds * fps, 'output_bytes': size}
+
+    else:
+        raise ValueError(f"Unknown benchmark kind: {kind}")
+
+    try:
+        for _ in range(warmup):
+            step()
+        latencies = []
+        units: Dict[str, float] = {}
+        for _ in range(iterations):
+            started = time.perf_counter()
+            produced = step()
+            latencies.append(time.perf_counter() - started)
+            for unit, amount in produced.items():
+                units[unit] = units.get(unit, 0) + amount
+        if stub is not None:
+            units['api_calls'] = stub.calls
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    return {
+        'latencies': latencies,
+        'units': units,
+        'peak_rss_bytes': _rss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+        'peak_child_rss_bytes': _rss_bytes(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss),
+    }
+
+
+def summarize(case: Dict, samples: Dict, iterations: int) -> Dict:
+    """Turn raw samples into the reported metrics"""
+    latencies = samples['latencies']
+    total = sum(latencies) or 1e-9
+    units = dict(samples['units'])
+    output_bytes = units.pop('output_bytes', None)
+    api_calls = units.pop('api_calls', None)
+
+    result = {
+        'name': case['name'],
+        'kind': case['kind'],
+        'params': case['params'],
+        'iterations': iterations,
+        'latency_seconds': {
+            'p50': round(percentile(latencies, 50), 6),
+            'p95': round(percentile(latencies, 95), 6),
+            'mean': round(total / len(latencies), 6),
+            'min': round(min(latencies), 6),
+            'max': round(max(latencies), 6),
+        },
+        # Units processed per second of wall-clock time across all iterations
+        'throughput': {f"{unit}_per_second": round(amount / total, 3) for unit, amount in units.items()},
+        'peak_rss_bytes': samples['peak_rss_bytes'],
+        'peak_child_rss_bytes': samples['peak_child_rss_bytes'],
+    }
+    if output_bytes is not None:
+        result['output_bytes'] = int(output_bytes / iterations)
+    if api_calls is not None:
+        result['api_calls_per_iteration'] = round(api_calls / (iterations + case.get('warmup', 0)), 2)
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(cases: List[Dict], iterations: int, warmup: int, workdir: str) -> Dict:
+    """Run every case in its own process and build the report"""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        print(f"  {case['name']} ...", end='', flush=True, file=sys.stderr)
+        case = dict(case, warmup=warmup)
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                samples = executor.submit(_run_case, case, iterations, warmup, workdir).result()
+            result = summarize(case, samples, iterations)
+            print(f" p50 {result['latency_seconds']['p50']:.3f}s", file=sys.stderr)
+        except Exception as e:
+            result = {'name': case['name'], 'kind': case['kind'], 'params': case['params'], 'error': str(e)}
+            print(f" failed: {str(e)}", file=sys.stderr)
+        results.append(result)
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'iterations': iterations,
+            'warmup': warmup,
+        },
+        'results': results,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', '-o', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--quick', action='store_true', help='Run a reduced matrix')
+    parser.add_argument('--iterations', '-n', type=int, default=5, help='Timed iterations per case')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed iterations per case')
+    parser.add_argument('--only', help='Comma-separated case kinds or name prefixes to run')
+    parser.add_argument('--workdir', help='Directory for fixtures and outputs (default: a temp dir)')
+    args = parser.parse_args(argv)
+
+    cases = build_cases(args.quick)
+    if args.only:
+        prefixes = [prefix.strip() for prefix in args.only.split(',') if prefix.strip()]
+        cases = [case for case in cases if any(case['name'].startswith(p) for p in prefixes)]
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='pdfvideo-bench-'))
+    os.makedirs(workdir, exist_ok=True)
+    print(f"Running {len(cases)} benchmark cases in {workdir}", file=sys.stderr)
+
+    report = run(cases, max(1, args.iterations), max(0, args.warmup), workdir)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 1 if any('error' in result for result in report['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
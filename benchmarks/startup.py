@@ -0,0 +1,108 @@
+"""Measure web tier startup time and report what its imports cost
+
+    python -m benchmarks.startup [--target-ms 400] [--runs 5] [--top 15]
+
+Imports the app in fresh interpreters (with -X importtime), prints the median
+import time and the packages that took longest, and exits with status 1 when
+the median exceeds the target or a render or AI package was loaded. Web
+workers only serve uploads, status, events and downloads, so those packages
+belong in render workers.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages the web tier must not import; render workers load them on first use
+HEAVY_PACKAGES = ('moviepy', 'numpy', 'PIL', 'openai', 'PyPDF2', 'imageio', 'requests')
+
+_PROBE = (
+    "import sys, time, json\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))\n"
+)
+
+
+def measure(module: str, workdir: str) -> Dict:
+    """Import a module in a fresh interpreter, returning its import time, loaded modules and importtime lines"""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    # The app creates its data and output directories on import, so it runs in a scratch directory
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(module=module)],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=120
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {process.stderr.strip()[-500:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['importtime'] = [line for line in process.stderr.splitlines() if line.startswith('import time:')]
+    return result
+
+
+def package_totals(importtime: List[str]) -> Dict[str, float]:
+    """Self time in milliseconds summed per top-level package"""
+    totals = {}
+    for line in importtime:
+        parts = [part.strip() for part in line.replace('import time:', '', 1).split('|')]
+        # The first line is the column header
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        self_us, _, name = parts
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1000
+    return totals
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    parser.add_argument('--runs', '-n', type=int, default=5, help='Fresh interpreters to time')
+    parser.add_argument('--target-ms', type=float, default=float(os.getenv('STARTUP_TARGET_MS', '400')),
+                        help='Median import time to stay under')
+    parser.add_argument('--top', type=int, default=15, help='Slowest packages to list')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='pdfvideo-startup-') as workdir:
+        for _ in range(max(1, args.runs)):
+            runs.append(measure(args.module, workdir))
+
+    median_ms = statistics.median(run['seconds'] for run in runs) * 1000
+    # Package times from the last run, when files are in the OS cache like in a restarted worker
+    totals = package_totals(runs[-1]['importtime'])
+    slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    heavy = sorted({name.split('.')[0] for name in runs[-1]['modules']} & set(HEAVY_PACKAGES))
+    report = {
+        'module': args.module,
+        'runs': len(runs),
+        'median_ms': round(median_ms, 1),
+        'min_ms': round(min(run['seconds'] for run in runs) * 1000, 1),
+        'target_ms': args.target_ms,
+        'modules_loaded': len(runs[-1]['modules']),
+        'heavy_packages': heavy,
+        'slowest_packages': [{'package': name, 'ms': round(ms, 1)} for name, ms in slowest],
+    }
+    passed = median_ms <= args.target_ms and not heavy
+
+    if args.json:
+        print(json.dumps(dict(report, passed=passed), indent=2))
+    else:
+        print(f"import {args.module}: median {report['median_ms']}ms, min {report['min_ms']}ms "
+              f"over {len(runs)} runs (target {args.target_ms:g}ms), {report['modules_loaded']} modules")
+        for row in report['slowest_packages']:
+            print(f"  {row['ms']:8.1f}ms  {row['package']}")
+        if heavy:
+            print(f"Render/AI packages imported by the web tier: {', '.join(heavy)}")
+        print('PASS' if passed else 'FAIL')
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
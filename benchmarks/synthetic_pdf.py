@@ -0,0 +1,85 @@
+import random
+from typing import List
+
+# Vocabulary for generated text; fixed so documents are identical across runs
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from or have an "
+    "which not at but were can all their has more one also been other its new some "
+    "data model system results analysis process energy market growth research method "
+    "design network value policy study report figure table section approach quality "
+    "performance structure development information management learning national"
+).split()
+
+LINE_WORDS = 12
+LINE_HEIGHT = 12
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_stream(lines: List[str]) -> bytes:
+    commands = ['BT', '/F1 10 Tf', f'{LINE_HEIGHT} TL', f'50 {PAGE_HEIGHT - 50} Td']
+    for line in lines:
+        commands.append(f'({_escape(line)}) Tj T*')
+    commands.append('ET')
+    return '\n'.join(commands).encode('latin-1')
+
+
+def generate_pages(pages: int, words_per_page: int, seed: int = 0) -> List[List[str]]:
+    """Deterministic page text as lists of lines"""
+    rng = random.Random(seed)
+    max_lines = (PAGE_HEIGHT - 100) // LINE_HEIGHT
+    result = []
+    for _ in range(pages):
+        words = [rng.choice(WORDS) for _ in range(words_per_page)]
+        lines = [' '.join(words[i:i + LINE_WORDS]) for i in range(0, len(words), LINE_WORDS)]
+        result.append(lines[:max_lines])
+    return result
+
+
+def write_pdf(path: str, pages: int, words_per_page: int, seed: int = 0, title: str = 'Benchmark') -> str:
+    """Write a text-only PDF with the given page count and text density
+
+    Pages hold at most 57 lines of 12 words, so densities above ~680 words per
+    page are truncated.
+    """
+    page_lines = generate_pages(pages, words_per_page, seed)
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, 4 info, then page/content pairs
+    objects = {
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+        4: f'<< /Title ({_escape(title)}) >>'.encode('latin-1'),
+    }
+    kids = []
+    for i, lines in enumerate(page_lines):
+        page_id = 5 + i * 2
+        content_id = page_id + 1
+        stream = _page_stream(lines)
+        objects[content_id] = (f'<< /Length {len(stream)} >>\nstream\n'.encode('latin-1')
+                               + stream + b'\nendstream')
+        objects[page_id] = (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>').encode('latin-1')
+        kids.append(f'{page_id} 0 R')
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'.encode('latin-1')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += f'{number} 0 obj\n'.encode('latin-1') + objects[number] + b'\nendobj\n'
+
+    xref_offset = len(output)
+    count = max(objects) + 1
+    output += f'xref\n0 {count}\n0000000000 65535 f \n'.encode('latin-1')
+    for number in range(1, count):
+        output += f'{offsets[number]:010d} 00000 n \n'.encode('latin-1')
+    output += (f'trailer\n<< /Size {count} /Root 1 0 R /Info 4 0 R >>\n'
+               f'startxref\n{xref_offset}\n%%EOF\n').encode('latin-1')
+
+    with open(path, 'wb') as file:
+        file.write(output)
+    return path
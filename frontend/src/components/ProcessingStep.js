@@ -29,73 +29,143 @@ function ProcessingStep({ onNext, sessionId, requirements }) {
   const [currentStep, setCurrentStep] = useState(0);
   const [error, setError] = useState(null);
   const [progress, setProgress] = useState(0);
+  const [detail, setDetail] = useState('');
 
   useEffect(() => {
+    let cancelled = false;
+    let pollTimer = null;
+    let eventSource = null;
+
+    const stageToStep = {
+      queued: 0,
+      extracting: 0,
+      transforming: 1,
+      narrating: 2,
+      rasterizing: 2,
+      rendering_draft: 3,
+      draft_ready: 3,
+      rendering: 4,
+      completed: processingSteps.length - 1,
+    };
+
+    // Applies a status snapshot or progress event; returns true once the job has finished
+    const applyStatus = (status) => {
+      if (status.stage in stageToStep) {
+        setCurrentStep(stageToStep[status.stage]);
+      }
+      if (typeof status.percent === 'number') {
+        setProgress(status.percent);
+      }
+
+      if (status.state === 'completed' || status.stage === 'completed') {
+        setProgress(100);
+        setDetail('');
+        setCurrentStep(processingSteps.length - 1);
+        setTimeout(() => {
+          onNext();
+        }, 1000);
+        return true;
+      }
+      if (status.state === 'failed' || status.stage === 'failed') {
+        setError('Processing failed. ' + (status.error || 'Unknown error'));
+        setProgress(0);
+        return true;
+      }
+      return false;
+    };
+
+    const pollStatus = async () => {
+      try {
+        const response = await axios.get(`${API_URL}/status/${sessionId}`, { timeout: 30000 });
+        if (cancelled) {
+          return;
+        }
+        if (applyStatus(response.data)) {
+          return;
+        }
+      } catch (err) {
+        console.error('Status polling error:', err);
+      }
+      if (!cancelled) {
+        pollTimer = setTimeout(pollStatus, 2000);
+      }
+    };
+
+    // Progress is pushed over server-sent events; polling is the fallback
+    const streamStatus = () => {
+      if (typeof window.EventSource === 'undefined') {
+        pollStatus();
+        return;
+      }
+
+      eventSource = new window.EventSource(`${API_URL}/events/${sessionId}`);
+      const onEvent = (handler) => (message) => {
+        if (cancelled) {
+          return;
+        }
+        if (handler(JSON.parse(message.data))) {
+          eventSource.close();
+        }
+      };
+      const renderLabel = (data) => (data.profile === 'draft' ? 'Draft' : 'Video');
+
+      eventSource.addEventListener('status', onEvent(applyStatus));
+      eventSource.addEventListener('progress', onEvent(applyStatus));
+      eventSource.addEventListener('completed', onEvent(applyStatus));
+      eventSource.addEventListener('failed', onEvent(applyStatus));
+      eventSource.addEventListener('transform', onEvent((data) => {
+        if (data.phase === 'summarizing') {
+          setDetail(`Summarizing part ${data.chunk} of ${data.chunks}`);
+        } else if (data.phase === 'repairing') {
+          setDetail('Correcting the video script');
+        } else {
+          setDetail('Writing the video script');
+        }
+        return false;
+      }));
+      eventSource.addEventListener('scene', onEvent((data) => {
+        setDetail(`${renderLabel(data)}: scene ${data.scene} of ${data.scenes} rendered`);
+        return false;
+      }));
+      eventSource.addEventListener('encoder', onEvent((data) => {
+        setDetail(`${renderLabel(data)}: ${data.frames} of ${data.total} frames encoded`);
+        return false;
+      }));
+      eventSource.onerror = () => {
+        // A dropped connection is retried by EventSource itself; a refused one falls back to polling
+        if (!cancelled && eventSource.readyState === window.EventSource.CLOSED) {
+          pollStatus();
+        }
+      };
+    };
+
     const processVideo = async () => {
       try {
         console.log('Starting video processing for session:', sessionId);
-        
-        // Simulate step progression
-        const stepInterval = setInterval(() => {
-          setCurrentStep((prev) => {
-            if (prev < processingSteps.length - 1) {
-              return prev + 1;
-            }
-            return prev;
-          });
-        }, 3000); // Slower progression
-
-        // Update progress
-        const progressInterval = setInterval(() => {
-          setProgress((prev) => {
-            if (prev >= 95) { // Stop at 95% until API responds
-              return 95;
-            }
-            return prev + 1;
-          });
-        }, 300);
-
-        // Call backend API with longer timeout
+
+        // The backend queues the job and returns immediately
         const response = await axios.post(
           `${API_URL}/process/${sessionId}`,
-          { requirements },
-          { 
+          { requirements, profile: 'preview' },
+          {
             headers: { 'Content-Type': 'application/json' },
-            timeout: 180000, // 3 minute timeout for processing
+            timeout: 30000,
           }
         );
 
         console.log('Processing response:', response.data);
-
-        // Clear intervals
-        clearInterval(stepInterval);
-        clearInterval(progressInterval);
-
-        // Complete progress
-        setProgress(100);
-        setCurrentStep(processingSteps.length - 1);
-
-        if (response.data.status === 'completed') {
-          setTimeout(() => {
-            onNext();
-          }, 1000);
-        } else {
-          setError('Processing completed but status is unclear. Please check the download page.');
-          setTimeout(() => {
-            onNext();
-          }, 2000);
-        }
+        streamStatus();
       } catch (err) {
         console.error('Processing error:', err);
         
         let errorMessage = 'Processing failed. ';
         
         if (err.code === 'ECONNABORTED') {
-          errorMessage += 'Request timeout. The video processing is taking longer than expected. This might be due to a large PDF or complex content.';
+          errorMessage += 'Request timeout. The server did not accept the job in time.';
         } else if (err.response) {
           errorMessage += err.response.data?.error || `Server error: ${err.response.status}`;
         } else if (err.request) {
-          errorMessage += 'No response from server. The backend may be processing your request.';
+          errorMessage += 'No response from server. The backend may be starting up.';
         } else {
           errorMessage += err.message;
         }
@@ -108,6 +178,14 @@ function ProcessingStep({ onNext, sessionId, requirements }) {
     if (sessionId) {
       processVideo();
     }
+
+    return () => {
+      cancelled = true;
+      clearTimeout(pollTimer);
+      if (eventSource) {
+        eventSource.close();
+      }
+    };
   }, [sessionId, requirements, onNext]);
 
   return (
@@ -170,6 +248,12 @@ function ProcessingStep({ onNext, sessionId, requirements }) {
             {Math.round(progress)}% Complete
           </Typography>
 
+          {detail && (
+            <Typography variant="body2" color="text.secondary" sx={{ mt: -2, mb: 3 }}>
+              {detail}
+            </Typography>
+          )}
+
           <List sx={{ maxWidth: 600, mx: 'auto' }}>
             {processingSteps.map((step, index) => (
               <ListItem key={index}>
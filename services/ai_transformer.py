@@ -1,9 +1,26 @@
 import os
+import time
+import random
+import openai
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 import logging
+from services.script import SCRIPT_SCHEMA, Script, ScriptError
 
 logger = logging.getLogger(__name__)
 
+# Transient API errors that are worth retrying with backoff
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+# How the model is asked for a script: 'json_mode' (response_format), 'function' (tool call) or 'text'
+SCRIPT_FORMATS = ('json_mode', 'function', 'text')
+
 class AITransformer:
     """Transforms PDF content using AI"""
     
@@ -13,10 +30,58 @@ class AITransformer:
             logger.warning("OpenAI API key not found. AI features will be limited.")
             self.client = None
         else:
-            self.client = OpenAI(api_key=api_key)
+            # OPENAI_BASE_URL points the client at a compatible server or a local stub
+            self.client = OpenAI(
+                api_key=api_key,
+                base_url=os.getenv('OPENAI_BASE_URL') or None,
+                max_retries=0  # Retries are handled by _chat
+            )
+        
+        self.model = "gpt-3.5-turbo"
+        self.temperature = 0.7
+        self.max_tokens = 1500
+        # Characters of document text that fit in one prompt
+        self.prompt_chars = 3000
+        
+        # 'truncate' sends the start of the document; 'map_reduce' summarizes all of it
+        self.mode = os.getenv('AI_SUMMARY_MODE', 'truncate')
+        self.max_document_chars = int(os.getenv('AI_MAX_DOCUMENT_CHARS', '200000'))
+        self.chunk_chars = int(os.getenv('AI_CHUNK_CHARS', '6000'))
+        self.concurrency = int(os.getenv('AI_CONCURRENCY', '4'))
+        self.max_retries = int(os.getenv('AI_MAX_RETRIES', '3'))
+        self.summary_max_tokens = 300
+        self.script_format = os.getenv('AI_SCRIPT_FORMAT', 'json_mode')
+        if self.script_format not in SCRIPT_FORMATS:
+            raise ValueError(f"Unknown script format: {self.script_format}")
+        # Extra requests allowed to repair a script that fails validation
+        self.script_repairs = 1
+    
+    @property
+    def text_budget(self) -> int:
+        """Characters of document text this transformer will use"""
+        if self.client and self.mode == 'map_reduce':
+            return self.max_document_chars
+        return self.prompt_chars
     
-    def transform_content(self, extracted_content: dict, requirements: str) -> dict:
-        """Transform extracted content based on user requirements"""
+    def cache_settings(self) -> dict:
+        """Settings that change the output of transform_content"""
+        return {
+            'ai_enabled': self.client is not None,
+            'model': self.model,
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'text_budget': self.text_budget,
+            'mode': self.mode,
+            'chunk_chars': self.chunk_chars,
+            'script_format': self.script_format,
+        }
+    
+    def transform_content(self, extracted_content: dict, requirements: str, on_event=None) -> dict:
+        """Transform extracted content based on user requirements
+        
+        on_event, if given, is called as on_event('transform', phase=...) as
+        chunks are summarized and the script is requested.
+        """
         try:
             if not self.client:
                 # Fallback: Simple transformation without AI
@@ -24,13 +89,43 @@ class AITransformer:
             
             text = extracted_content.get('total_text', '')
             
-            # Create prompt for AI
-            prompt = f"""Transform the following PDF content into a video script based on these requirements:
+            if self.mode == 'map_reduce' and len(text) > self.prompt_chars:
+                summary = self._map_reduce(text, requirements, on_event)
+                prompt = self._script_prompt(requirements, 'Summary of the PDF content', summary)
+            else:
+                # Limit to avoid token limits
+                prompt = self._script_prompt(requirements, 'PDF Content', text[:self.prompt_chars])
+            
+            if on_event:
+                on_event('transform', force=True, phase='scripting')
+            script = self._request_script([
+                {"role": "system", "content": "You are a professional video script writer."},
+                {"role": "user", "content": prompt}
+            ], on_event)
             
+            logger.info(f"AI transformation completed with {len(script.scenes)} scenes")
+            
+            return {
+                'script': script.to_dict(),
+                'source_pages': extracted_content.get('metadata', {}).get('num_pages', 0),
+                'requirements': requirements
+            }
+        
+        except Exception as e:
+            logger.error(f"AI transformation error: {str(e)}")
+            # Fallback to simple transformation
+            result = self._simple_transform(extracted_content, requirements)
+            result['fallback'] = True
+            return result
+    
+    def _script_prompt(self, requirements: str, content_label: str, content: str) -> str:
+        """Prompt asking the model for the structured video script"""
+        return f"""Transform the following PDF content into a video script based on these requirements:
+
 Requirements: {requirements}
 
-PDF Content:
-{text[:3000]}  # Limit to avoid token limits
+{content_label}:
+{content}
 
 Create a structured video script with:
 1. An engaging introduction
@@ -39,32 +134,140 @@ Create a structured video script with:
 4. A compelling conclusion
 
 Format as JSON with: title, scenes (each with: scene_number, narration, visual_description, duration_seconds)
+Respond with only the JSON object.
 """
+    
+    def _script_options(self) -> dict:
+        """Request options that make the model answer with the script JSON"""
+        if self.script_format == 'json_mode':
+            return {'response_format': {'type': 'json_object'}}
+        if self.script_format == 'function':
+            return {
+                'tools': [{
+                    'type': 'function',
+                    'function': {
+                        'name': 'write_script',
+                        'description': 'Return the finished video script',
+                        'parameters': SCRIPT_SCHEMA,
+                    },
+                }],
+                'tool_choice': {'type': 'function', 'function': {'name': 'write_script'}},
+            }
+        return {}
+    
+    def _response_text(self, response) -> str:
+        """Script JSON of a response, from the tool call arguments or the message content"""
+        message = response.choices[0].message
+        if message.tool_calls:
+            return message.tool_calls[0].function.arguments
+        return message.content or ''
+    
+    def _request_script(self, messages: list, on_event=None) -> Script:
+        """Ask for a script and validate it, asking for a correction if it is unusable
+        
+        Validation happens here, so an unusable script costs at most one more
+        short request instead of a full render of a generic video.
+        """
+        for attempt in range(self.script_repairs + 1):
+            response = self._chat(messages, max_tokens=self.max_tokens, **self._script_options())
+            text = self._response_text(response)
+            try:
+                return Script.parse(text)
+            except ScriptError as e:
+                logger.warning(f"Unusable script from the model (attempt {attempt + 1}): {str(e)}")
+                if attempt >= self.script_repairs:
+                    raise
+                if on_event:
+                    on_event('transform', force=True, phase='repairing', attempt=attempt + 2)
+                messages = messages + [
+                    {"role": "assistant", "content": text[:self.max_tokens * 4]},
+                    {"role": "user", "content": f"That script could not be used: {str(e)}. "
+                                                "Reply with only the corrected JSON object."}
+                ]
+    
+    def _chat(self, messages: list, max_tokens: int, **options):
+        """Call the chat completions API, retrying transient errors with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=max_tokens,
+                    **options
+                )
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+                logger.warning(f"OpenAI call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def _split_chunks(self, text: str) -> List[str]:
+        """Split text into chunks of roughly chunk_chars, breaking on whitespace"""
+        chunks = []
+        start = 0
+        while start < len(text):
+            end = min(start + self.chunk_chars, len(text))
+            if end < len(text):
+                boundary = text.rfind(' ', start, end)
+                if boundary > start:
+                    end = boundary
+            chunks.append(text[start:end].strip())
+            start = end
+        return [chunk for chunk in chunks if chunk]
+    
+    def _summarize_chunk(self, chunk: str, requirements: str, index: int, total: int) -> str:
+        """Map step: summarize one chunk of the document"""
+        response = self._chat(
+            [
+                {"role": "system", "content": "You summarize documents for video script writers."},
+                {"role": "user", "content": f"""Summarize part {index + 1} of {total} of a PDF document.
+Keep the facts and key points relevant to these video requirements: {requirements}
+
+Content:
+{chunk}"""}
+            ],
+            max_tokens=self.summary_max_tokens
+        )
+        return response.choices[0].message.content.strip()
+    
+    def _map_reduce(self, text: str, requirements: str, on_event=None) -> str:
+        """Summarize the whole document in concurrent chunks until it fits one prompt"""
+        text = text[:self.max_document_chars]
+        level = 0
+        while len(text) > self.prompt_chars:
+            chunks = self._split_chunks(text)
+            logger.info(f"Summarizing {len(chunks)} chunks (level {level})")
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a professional video script writer."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            
-            script_text = response.choices[0].message.content
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+                futures = [
+                    executor.submit(self._summarize_chunk, chunk, requirements, i, len(chunks))
+                    for i, chunk in enumerate(chunks)
+                ]
+                summaries = []
+                for i, future in enumerate(futures):
+                    try:
+                        summaries.append(future.result())
+                    except Exception as e:
+                        # A missing chunk is better than losing the whole document
+                        logger.warning(f"Chunk {i + 1}/{len(chunks)} summary failed: {str(e)}")
+                    if on_event:
+                        on_event('transform', force=i + 1 == len(chunks), phase='summarizing', level=level,
+                                 chunk=i + 1, chunks=len(chunks))
             
-            logger.info("AI transformation completed")
+            if not summaries:
+                raise Exception("All chunk summaries failed")
             
-            return {
-                'script': script_text,
-                'source_pages': extracted_content.get('metadata', {}).get('num_pages', 0),
-                'requirements': requirements
-            }
+            reduced = '\n\n'.join(summaries)
+            if len(chunks) == 1 or len(reduced) >= len(text):
+                # Summaries are not getting shorter; stop and truncate
+                text = reduced[:self.prompt_chars]
+                break
+            text = reduced
+            level += 1
         
-        except Exception as e:
-            logger.error(f"AI transformation error: {str(e)}")
-            # Fallback to simple transformation
-            return self._simple_transform(extracted_content, requirements)
+        return text
     
     def _simple_transform(self, extracted_content: dict, requirements: str) -> dict:
         """Simple transformation without AI"""
@@ -0,0 +1,136 @@
+import os
+import uuid
+import zipfile
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from services.job_queue import JobQueue, QUEUED, RUNNING
+from services.upload_manager import UploadManager, UploadError
+from services.storage import UPLOAD, StorageManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ITEMS = 500
+
+
+def _is_pdf_name(name: str) -> bool:
+    base = os.path.basename(name)
+    # Skip the resource forks macOS adds to archives
+    return name.lower().endswith('.pdf') and not base.startswith('._') and '__MACOSX/' not in name
+
+
+def iter_archive(file) -> Iterator[Tuple[str, object]]:
+    """Yield (name, stream) for each PDF in a zip archive, read member by member"""
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_pdf_name(info.filename):
+                continue
+            with archive.open(info) as member:
+                yield info.filename, member
+
+
+def iter_paths(paths: Iterable[str]) -> Iterator[Tuple[str, object]]:
+    """Yield (name, stream) for PDF files, directories of PDFs and zip archives"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if _is_pdf_name(name):
+                        with open(os.path.join(root, name), 'rb') as file:
+                            yield os.path.relpath(os.path.join(root, name), path), file
+        elif zipfile.is_zipfile(path):
+            yield from iter_archive(path)
+        else:
+            with open(path, 'rb') as file:
+                yield os.path.basename(path), file
+
+
+def submit_batch(job_queue: JobQueue, upload_manager: UploadManager, documents: Iterable[Tuple[str, object]],
+                 payload: dict, max_items: int = DEFAULT_MAX_ITEMS) -> Dict:
+    """Save each document as a session and queue them all as one batch
+
+    Documents are streamed to disk one at a time, so a large archive is never
+    held in memory. Documents that are rejected (not a PDF, too large, over
+    the item limit) are reported in the returned items with an error.
+    """
+    batch_id = str(uuid.uuid4())
+    items = []
+    accepted = 0
+    for name, stream in documents:
+        if accepted >= max_items:
+            items.append({'filename': name, 'error': f"Batch is limited to {max_items} documents"})
+            continue
+        session_id = str(uuid.uuid4())
+        try:
+            saved = upload_manager.save_stream(stream, session_id)
+        except UploadError as e:
+            items.append({'filename': name, 'error': str(e)})
+            continue
+        items.append({'filename': name, 'session_id': session_id, 'sha256': saved['sha256']})
+        accepted += 1
+    return _enqueue(job_queue, batch_id, items, payload)
+
+
+def submit_sessions(job_queue: JobQueue, storage: StorageManager, session_ids: List[str], payload: dict,
+                    max_items: int = DEFAULT_MAX_ITEMS) -> Dict:
+    """Queue already uploaded sessions (e.g. from chunked uploads) as one batch"""
+    if len(session_ids) > max_items:
+        raise UploadError(f"Batch is limited to {max_items} documents", 413)
+    items = []
+    for session_id in session_ids:
+        if UPLOAD in storage.lookup(str(session_id)):
+            items.append({'filename': None, 'session_id': str(session_id)})
+        else:
+            items.append({'session_id': str(session_id), 'error': "PDF not found. Please upload again."})
+    return _enqueue(job_queue, str(uuid.uuid4()), items, payload)
+
+
+def _enqueue(job_queue: JobQueue, batch_id: str, items: List[Dict], payload: dict) -> Dict:
+    queued = set()
+    for item in items:
+        if 'error' in item:
+            continue
+        job = job_queue.submit(item['session_id'], dict(payload, filename=item['filename']), batch_id)
+        # A job that was still pending is returned as is, and stays in its own batch
+        if job['batch_id'] != batch_id or item['session_id'] in queued:
+            item['error'] = "Document is already queued"
+        else:
+            queued.add(item['session_id'])
+    submitted = len(queued)
+    logger.info(f"Queued batch {batch_id} with {submitted} documents ({len(items) - submitted} rejected)")
+    return {
+        'batch_id': batch_id,
+        'submitted': submitted,
+        'rejected': len(items) - submitted,
+        'items': items,
+    }
+
+
+def batch_manifest(job_queue: JobQueue, batch_id: str) -> Optional[Dict]:
+    """Per-item status of a batch and a summary by state, or None for an unknown batch"""
+    jobs = job_queue.store.batch(batch_id)
+    if not jobs:
+        return None
+    counts = {}
+    items = []
+    for job in jobs:
+        result = job['result'] or {}
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+        items.append({
+            'filename': (job['payload'] or {}).get('filename'),
+            'session_id': job['session_id'],
+            'state': job['status'],
+            'stage': job['stage'],
+            'percent': round(job['percent'] or 0, 1),
+            'error': job['error'],
+            'video_path': result.get('video_path'),
+            'seconds': round(job['finished_at'] - job['started_at'], 2)
+            if job['finished_at'] and job['started_at'] else None,
+        })
+    return {
+        'batch_id': batch_id,
+        'total': len(items),
+        'counts': counts,
+        'done': not (counts.get(QUEUED) or counts.get(RUNNING)),
+        'items': items,
+    }
@@ -0,0 +1,144 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FrameCompositor:
+    """Builds video frames directly in NumPy uint8 buffers"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        # Gradient backgrounds keyed by (bg, accent, width, height)
+        self._backgrounds: Dict[Tuple, np.ndarray] = {}
+        # Page image backgrounds, few enough to hold one video's worth
+        self._images: Dict[Tuple, np.ndarray] = {}
+        self.max_images = 8
+
+    def new_buffer(self) -> np.ndarray:
+        """Allocate an empty RGB frame buffer"""
+        return np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    def gradient(self, bg: tuple, accent: tuple) -> np.ndarray:
+        """Return the cached vertical gradient from bg to accent as a read-only frame"""
+        key = (tuple(bg), tuple(accent), self.width, self.height)
+        background = self._backgrounds.get(key)
+        if background is None:
+            # One RGB row per scanline, broadcast across the width without copying
+            alpha = (np.arange(self.height, dtype=np.float32) / self.height)[:, None]
+            column = np.asarray(bg, dtype=np.float32) * (1 - alpha) + np.asarray(accent, dtype=np.float32) * alpha
+            column = column.astype(np.uint8)
+            background = np.broadcast_to(column[:, None, :], (self.height, self.width, 3))
+            self._backgrounds[key] = background
+        return background
+
+    def image_background(self, path: str, bg: tuple, accent: tuple, opacity: float = 0.35) -> np.ndarray:
+        """Return the gradient with an image fitted inside it and faded in, as a cached read-only frame"""
+        key = (path, tuple(bg), tuple(accent), opacity, self.width, self.height)
+        frame = self._images.get(key)
+        if frame is None:
+            frame = np.array(self.gradient(bg, accent))
+            with Image.open(path) as image:
+                image = image.convert('RGB')
+                # Fit inside the frame keeping the aspect ratio (a portrait page is pillarboxed)
+                scale = min(self.width / image.width, self.height / image.height)
+                size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+                pixels = np.asarray(image.resize(size, Image.BILINEAR))
+            height, width = pixels.shape[:2]
+            y, x = (self.height - height) // 2, (self.width - width) // 2
+            region = frame[y:y + height, x:x + width]
+            self.blend(region, pixels, opacity, region)
+            frame.setflags(write=False)
+            if len(self._images) >= self.max_images:
+                self._images.pop(next(iter(self._images)))
+            self._images[key] = frame
+        return frame
+
+    def fill_gradient(self, bg: tuple, accent: tuple, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Write the gradient background into a frame buffer"""
+        if out is None:
+            out = self.new_buffer()
+        np.copyto(out, self.gradient(bg, accent))
+        return out
+
+    def fill_solid(self, color: tuple, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Fill a frame buffer with a single color"""
+        if out is None:
+            out = self.new_buffer()
+        out[:] = np.asarray(color, dtype=np.uint8)
+        return out
+
+    def text_mask(self, text: str, font: ImageFont.ImageFont) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Rasterize a line of text to an alpha mask and its offset from the draw origin"""
+        left, top, right, bottom = font.getbbox(text)
+        size = (max(right - left, 1), max(bottom - top, 1))
+        # Only the text-sized mask goes through PIL, never the full frame
+        mask_img = Image.new('L', size, 0)
+        ImageDraw.Draw(mask_img).text((-left, -top), text, fill=255, font=font)
+        return np.asarray(mask_img), (left, top)
+
+    def blend_mask(self, out: np.ndarray, mask: np.ndarray, position: Tuple[int, int], color: tuple) -> None:
+        """Alpha-blend a solid color through a mask into the frame buffer in place"""
+        x, y = position
+        mask_h, mask_w = mask.shape
+        # Clip the mask to the frame bounds
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + mask_w, out.shape[1]), min(y + mask_h, out.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return
+        alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.uint16)[:, :, None]
+        region = out[y0:y1, x0:x1]
+        color = np.asarray(color, dtype=np.uint16)
+        region[:] = ((region * (255 - alpha) + color * alpha + 127) // 255).astype(np.uint8)
+
+    def draw_text(self, out: np.ndarray, text: str, font: ImageFont.ImageFont, position: Tuple[int, int],
+                  fill: tuple = (255, 255, 255), shadow: Optional[tuple] = None, shadow_offset: int = 2) -> None:
+        """Composite a line of text (and optional drop shadow) into the frame buffer"""
+        mask, (left, top) = self.text_mask(text, font)
+        x, y = position[0] + left, position[1] + top
+        if shadow is not None:
+            self.blend_mask(out, mask, (x + shadow_offset, y + shadow_offset), shadow)
+        self.blend_mask(out, mask, (x, y), fill)
+
+    def blend(self, a: np.ndarray, b: np.ndarray, weight, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Mix two frames as a * (1 - weight) + b * weight
+
+        weight is a scalar in [0, 1] or an array that broadcasts against the
+        frame, e.g. one value per column for a wipe.
+        """
+        if out is None:
+            out = self.new_buffer()
+        w = np.asarray(np.round(np.clip(weight, 0, 1) * 255), dtype=np.uint16)
+        # uint16 holds a * (255 - w) + b * w without overflow
+        mixed = a.astype(np.uint16) * (255 - w)
+        mixed += b.astype(np.uint16) * w
+        # Rounded division by 255 with shifts, exact for this range
+        mixed += 128
+        mixed += mixed >> 8
+        mixed >>= 8
+        np.copyto(out, mixed, casting='unsafe')
+        return out
+
+    def changed_rows(self, a: np.ndarray, b: np.ndarray) -> slice:
+        """The band of rows in which two frames differ, e.g. where text was drawn"""
+        rows = np.flatnonzero(np.any(a != b, axis=(1, 2)))
+        if rows.size == 0:
+            return slice(0, 0)
+        return slice(int(rows[0]), int(rows[-1]) + 1)
+
+    def zoom(self, frame: np.ndarray, scale: float, center: Tuple[float, float] = (0.5, 0.5),
+             out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Crop a 1/scale window around center (fractions of the frame) and stretch it to full size"""
+        if out is None:
+            out = self.new_buffer()
+        crop_w, crop_h = self.width / scale, self.height / scale
+        x0 = min(max(center[0] * self.width - crop_w / 2, 0), self.width - crop_w)
+        y0 = min(max(center[1] * self.height - crop_h / 2, 0), self.height - crop_h)
+        # Nearest-neighbour sampling as two gathers, no per-pixel Python
+        rows = (y0 + np.arange(self.height) * (crop_h / self.height)).astype(np.intp)
+        cols = (x0 + np.arange(self.width) * (crop_w / self.width)).astype(np.intp)
+        np.take(np.take(frame, rows, axis=0), cols, axis=1, out=out)
+        return out
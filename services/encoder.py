@@ -0,0 +1,276 @@
+import os
+import math
+import shutil
+import tempfile
+import subprocess
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FRAME_MODES = ('vfr', 'cfr')
+
+
+def find_ffmpeg() -> str:
+    """Locate the ffmpeg binary, preferring the one configured for MoviePy"""
+    for env_var in ('FFMPEG_BINARY', 'IMAGEIO_FFMPEG_EXE'):
+        path = os.getenv(env_var)
+        if path and os.path.exists(path):
+            return path
+    path = shutil.which('ffmpeg')
+    if path:
+        return path
+    try:
+        # Bundled with MoviePy through imageio
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+
+def profile_params(profile: Dict) -> List[str]:
+    """x264 rate control and keyframe settings for a render profile"""
+    params = ['-crf', str(profile['crf'])]
+    if profile.get('maxrate'):
+        params += ['-maxrate', profile['maxrate'], '-bufsize', profile.get('bufsize', profile['maxrate'])]
+    params += [
+        '-g', str(int(profile['fps'] * profile['keyframe_seconds'])),
+        '-tune', 'stillimage',
+        '-pix_fmt', 'yuv420p',  # Ensure compatibility
+        '-movflags', '+faststart'  # Web optimization
+    ]
+    if profile.get('low_memory'):
+        # Lookahead and B-frames hold dozens of frames in x264; stills barely benefit from them
+        params += ['-x264-params', 'rc-lookahead=0:sync-lookahead=0:bframes=0']
+    return params
+
+
+class FFmpegEncoder:
+    """Encodes still scene frames by streaming raw RGB data into an ffmpeg subprocess"""
+
+    def __init__(self, width: int, height: int, fps: int = 20, codec: str = 'libx264',
+                 preset: str = 'ultrafast', ffmpeg_params: Optional[List[str]] = None,
+                 ffmpeg_binary: Optional[str] = None, frame_mode: str = 'cfr'):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.codec = codec
+        self.preset = preset
+        self.ffmpeg_params = ffmpeg_params if ffmpeg_params is not None else [
+            '-pix_fmt', 'yuv420p',  # Ensure compatibility
+            '-movflags', '+faststart'  # Web optimization
+        ]
+        self.ffmpeg_binary = ffmpeg_binary or find_ffmpeg()
+        # 'vfr' encodes each still once with timestamps; 'cfr' repeats it at fps
+        if frame_mode not in FRAME_MODES:
+            raise ValueError(f"Unknown frame mode: {frame_mode}")
+        self.frame_mode = frame_mode
+
+    @classmethod
+    def from_profile(cls, profile: Dict, width: int = None, height: int = None,
+                     frame_mode: str = 'cfr') -> 'FFmpegEncoder':
+        """Encoder configured from a render profile"""
+        return cls(width or profile['width'], height or profile['height'], fps=profile['fps'],
+                   preset=profile['preset'], ffmpeg_params=profile_params(profile), frame_mode=frame_mode)
+
+    def frames_encoded(self, durations: List[float]) -> int:
+        """Number of frames the encoder processes for these scene durations"""
+        if self.frame_mode == 'vfr':
+            return len(durations) + 1
+        return sum(max(1, round(duration * self.fps)) for duration in durations)
+
+    def _input_step(self, frame_counts: List[int]) -> int:
+        """Largest number of output frames that evenly divides every scene"""
+        step = 0
+        for count in frame_counts:
+            step = math.gcd(step, count)
+        return max(step, 1)
+
+    def _keyframe_times(self, durations: List[float], keyframes: Optional[List[float]] = None) -> str:
+        """Scene start times, so every scene begins on a keyframe and seeks land on it"""
+        if keyframes is None:
+            keyframes = []
+            elapsed = 0.0
+            for duration in durations:
+                keyframes.append(elapsed)
+                elapsed += duration
+        return ','.join(f"{start:.3f}" for start in keyframes)
+
+    def _vfr_pts(self, durations: List[float]) -> str:
+        """setpts expression giving frame N the sum of the durations before it
+
+        Runs of equal durations (the frames of a transition) collapse into one
+        clip() term, so the expression grows with scenes rather than frames.
+        """
+        terms = []
+        start = 0
+        while start < len(durations):
+            end = start + 1
+            while end < len(durations) and durations[end] == durations[start]:
+                end += 1
+            if end - start == 1:
+                terms.append(f"{durations[start]:g}*gte(N,{start + 1})")
+            else:
+                terms.append(f"{durations[start]:g}*clip(N-{start},0,{end - start})")
+            start = end
+        return '+'.join(terms) or '0'
+
+    def encode_stills(self, durations: List[float], frames: Iterable[np.ndarray], output_path: str,
+                      keyframes: Optional[List[float]] = None, on_progress=None) -> str:
+        """Encode still frames, each held for its duration
+
+        Frames are consumed lazily so only one is held in memory at a time.
+
+        In 'vfr' mode each still is sent once and stamped with its scene's start
+        time, followed by a copy of the last still that marks the end of the
+        video, so encode time and file size depend on the number of scenes
+        rather than on seconds of video. Animated transitions are simply short
+        runs of frames with a duration of 1/fps each.
+
+        In 'cfr' mode the input frame rate is lowered to the largest common step
+        between scene boundaries, so each still is written a handful of times
+        and ffmpeg duplicates it up to the output frame rate.
+
+        keyframes lists the times (seconds) that start a scene; by default
+        every frame starts one. on_progress, if given, is called with the
+        number of frames piped to ffmpeg so far and the total.
+        """
+        if self.frame_mode == 'vfr':
+            # PTS of frame N is the sum of the durations of the frames before it
+            pts = self._vfr_pts(durations)
+            repeats = [1] * len(durations)
+            input_rate = '1'
+            timing = [
+                '-vf', f"settb=1/1000,setpts='round(({pts})/TB)'",
+                '-fps_mode', 'vfr',
+                # The closing frame only sets the duration; B-frames would reorder it
+                '-bf', '0',
+            ]
+        else:
+            frame_counts = [max(1, round(duration * self.fps)) for duration in durations]
+            step = self._input_step(frame_counts)
+            repeats = [count // step for count in frame_counts]
+            input_rate = f"{self.fps}/{step}"
+            timing = ['-r', str(self.fps)]
+
+        command = [
+            self.ffmpeg_binary, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            '-s', f"{self.width}x{self.height}",
+            '-framerate', input_rate,
+            '-i', '-',
+            '-an',
+            *timing,
+            '-c:v', self.codec,
+            '-preset', self.preset,
+            *self.ffmpeg_params,
+            # Keyframes exactly at scene starts; the profile's long GOP avoids any in between
+            '-force_key_frames', self._keyframe_times(durations, keyframes),
+            output_path
+        ]
+
+        closing = 1 if self.frame_mode == 'vfr' else 0
+        total = sum(repeats) + closing
+        # stderr goes to a file so a chatty ffmpeg can never block our writes
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                written = 0
+                piped = 0
+                data = None
+                for frame, count in zip(frames, repeats):
+                    if frame.shape != (self.height, self.width, 3):
+                        raise ValueError(f"Frame shape {frame.shape} does not match {self.height}x{self.width}x3")
+                    data = memoryview(np.ascontiguousarray(frame, dtype=np.uint8)).cast('B')
+                    for _ in range(count):
+                        process.stdin.write(data)
+                    written += 1
+                    piped += count
+                    if on_progress and piped < total:
+                        on_progress(piped, total)
+                if closing and data is not None:
+                    process.stdin.write(data)
+                    piped += 1
+                process.stdin.close()
+                if on_progress:
+                    on_progress(piped, total)
+            except BrokenPipeError:
+                pass
+            except Exception:
+                process.kill()
+                process.wait()
+                raise
+            returncode = process.wait()
+            if returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', errors='replace').strip()
+                raise Exception(f"ffmpeg exited with code {returncode}: {message[-500:]}")
+
+        if written != len(durations):
+            raise Exception(f"Expected {len(durations)} frames, got {written}")
+
+        logger.info(f"Encoded {written} stills with ffmpeg ({self.frame_mode}): {output_path}")
+        return output_path
+
+    def concat_segments(self, segment_paths: List[str], output_path: str,
+                        durations: Optional[List[float]] = None) -> str:
+        """Join encoded segments with ffmpeg's concat demuxer without re-encoding
+
+        With durations each segment is cut at its nominal length, which drops
+        the closing frame a 'vfr' segment ends with instead of showing it.
+        """
+        list_fd, list_path = tempfile.mkstemp(suffix='.txt', prefix='concat_')
+        try:
+            with os.fdopen(list_fd, 'w') as list_file:
+                for i, path in enumerate(segment_paths):
+                    escaped = os.path.abspath(path).replace("'", "'\\''")
+                    list_file.write(f"file '{escaped}'\n")
+                    if durations is not None:
+                        list_file.write(f"outpoint {durations[i]:.6f}\n")
+
+            command = [
+                self.ffmpeg_binary, '-y', '-loglevel', 'error',
+                '-f', 'concat', '-safe', '0',
+                '-i', list_path,
+                '-c', 'copy',
+                '-movflags', '+faststart',
+                output_path
+            ]
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                message = result.stderr.decode('utf-8', errors='replace').strip()
+                raise Exception(f"ffmpeg concat exited with code {result.returncode}: {message[-500:]}")
+        finally:
+            os.remove(list_path)
+
+        logger.info(f"Joined {len(segment_paths)} segments: {output_path}")
+        return output_path
+
+    def mux_audio(self, video_path: str, audio_path: str, bitrate: str = '96k') -> str:
+        """Add an audio track to a finished video in place, copying the video stream as is"""
+        tmp_path = f"{video_path}.mux.tmp"
+        command = [
+            self.ffmpeg_binary, '-y', '-loglevel', 'error',
+            '-i', video_path,
+            '-i', audio_path,
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy',
+            '-c:a', 'aac', '-b:a', bitrate,
+            '-movflags', '+faststart',
+            '-f', 'mp4',
+            tmp_path
+        ]
+        try:
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                message = result.stderr.decode('utf-8', errors='replace').strip()
+                raise Exception(f"ffmpeg mux exited with code {result.returncode}: {message[-500:]}")
+            os.replace(tmp_path, video_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        logger.info(f"Added narration track: {video_path}")
+        return video_path
@@ -0,0 +1,148 @@
+import json
+import time
+import queue
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+from services.job_queue import JobStore, COMPLETED, FAILED
+
+logger = logging.getLogger(__name__)
+
+# Events after which a session's stream ends
+TERMINAL_EVENTS = (COMPLETED, FAILED)
+
+
+def format_sse(kind: str, data: Dict, event_id: Optional[int] = None) -> str:
+    """One server-sent event in text/event-stream framing"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {kind}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventHub:
+    """Fans the job store's event log out to the event streams open in this process
+
+    A single thread reads new events for all sessions and hands each one to
+    the streams subscribed to its session. The store sees one query per poll
+    interval however many clients are connected, and none while no stream is
+    open. Events are written by render workers in any process or container.
+    """
+
+    def __init__(self, store: JobStore, poll_interval: float = 0.5, batch_size: int = 1000):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = 0
+
+    def subscribe(self, session_id: str) -> queue.Queue:
+        """Queue that receives the session's events from now on"""
+        # Bounded so a stalled client cannot hold memory; it resumes from Last-Event-ID
+        events = queue.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.setdefault(session_id, []).append(events)
+            if self._thread is None:
+                self._last_id = self.store.last_event_id()
+                self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+                self._thread.start()
+        return events
+
+    def unsubscribe(self, session_id: str, events: queue.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(session_id, [])
+            if events in subscribers:
+                subscribers.remove(events)
+            if not subscribers:
+                self._subscribers.pop(session_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Stopped under the lock, so subscribe() starts a new thread
+                    self._thread = None
+                    return
+            try:
+                events = self.store.events(after=self._last_id, limit=self.batch_size)
+            except Exception as e:
+                logger.warning(f"Reading progress events failed: {str(e)}")
+                events = []
+            for event in events:
+                self._last_id = event['id']
+                with self._lock:
+                    subscribers = list(self._subscribers.get(event['session_id'], ()))
+                for subscriber in subscribers:
+                    try:
+                        subscriber.put_nowait(event)
+                    except queue.Full:
+                        pass
+            if len(events) < self.batch_size:
+                time.sleep(self.poll_interval)
+
+    def stream(self, session_id: str, last_event_id: Optional[int] = None, snapshot: Optional[Dict] = None,
+               keepalive: float = 15, max_seconds: float = 300) -> Iterator[str]:
+        """Yield a session's events as SSE text until it completes or fails
+
+        A new client gets a 'status' snapshot of the job first; a reconnecting
+        client (Last-Event-ID) does not. Either way the events after
+        last_event_id are then replayed from the store. Callers building a
+        snapshot pass the store's last event id from before they built it, and
+        the stream subscribes before replaying, so no event written in between
+        is lost. The stream closes after max_seconds so that long renders do
+        not pin a web worker thread; EventSource reconnects with Last-Event-ID
+        by itself.
+        """
+        events = self.subscribe(session_id)
+        try:
+            if snapshot is not None:
+                yield format_sse('status', snapshot)
+                if snapshot.get('state') in TERMINAL_EVENTS:
+                    return
+            seen = last_event_id or 0
+            while last_event_id is not None:
+                # Read in pages, as a client that was away for a long render may have missed many
+                replay = self.store.events(session_id, after=seen, limit=self.batch_size)
+                for event in replay:
+                    seen = event['id']
+                    yield format_sse(event['kind'], event['data'], event['id'])
+                    if event['kind'] in TERMINAL_EVENTS:
+                        return
+                if len(replay) < self.batch_size:
+                    break
+
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=min(keepalive, max(deadline - time.monotonic(), 0.01)))
+                except queue.Empty:
+                    # Comment line that keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                if event['id'] <= seen:
+                    continue
+                seen = event['id']
+                yield format_sse(event['kind'], event['data'], event['id'])
+                if event['kind'] in TERMINAL_EVENTS:
+                    return
+        finally:
+            self.unsubscribe(session_id, events)
+
+
+_hub = None
+
+
+def get_event_hub(store: JobStore) -> EventHub:
+    """Return this process's event hub"""
+    global _hub
+    if _hub is None:
+        _hub = EventHub(store)
+    return _hub
@@ -0,0 +1,822 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import importlib
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from services.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+STALE_ERROR = 'Render worker stopped responding'
+
+
+class JobStore:
+    """Interface for job state shared between the API and the render workers"""
+
+    # Whether workers for this store can live in separate processes
+    shared_across_processes = False
+
+    def enqueue(self, session_id: str, payload: dict, batch_id: str = None) -> Optional[Dict]:
+        """Atomically queue a job unless the session already has one queued or running,
+        returning the new job, or None when one is pending"""
+        raise NotImplementedError
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running and return it"""
+        raise NotImplementedError
+
+    def update(self, session_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def finish(self, session_id: str, worker: str, attempt: int, **fields) -> bool:
+        """Record a job's outcome only if it is still running under this worker's claim
+
+        A job requeued while its worker looked dead may already be running
+        elsewhere; the original worker's late result is then dropped and
+        False returned.
+        """
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def queue_position(self, session_id: str) -> int:
+        raise NotImplementedError
+
+    def average_duration(self) -> Optional[float]:
+        """Average wall-clock time of recently completed jobs"""
+        raise NotImplementedError
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        raise NotImplementedError
+
+    def active_sessions(self) -> List[str]:
+        """Session ids of queued and running jobs"""
+        raise NotImplementedError
+
+    def batch(self, batch_id: str) -> List[Dict]:
+        """Jobs submitted together as one batch, in submission order"""
+        raise NotImplementedError
+
+    def heartbeat(self, session_id: str, worker: str) -> None:
+        """Record that the worker running a job is still alive"""
+        raise NotImplementedError
+
+    def requeue_stale(self, timeout: float, max_attempts: int = 2) -> int:
+        """Requeue running jobs without a heartbeat for timeout seconds (or fail them
+        after max_attempts claims), returning how many were requeued"""
+        raise NotImplementedError
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew a named lease, so one process in a deployment runs a chore"""
+        raise NotImplementedError
+
+    def release_lease(self, name: str, owner: str) -> None:
+        raise NotImplementedError
+
+    def add_event(self, session_id: str, kind: str, data: dict) -> int:
+        """Append a progress event for a session and return its id, which increases monotonically"""
+        raise NotImplementedError
+
+    def events(self, session_id: str = None, after: int = 0, limit: int = 500) -> List[Dict]:
+        """Events with an id above after, for one session or (session_id None) for all"""
+        raise NotImplementedError
+
+    def last_event_id(self) -> int:
+        """Id of the newest event, or 0"""
+        raise NotImplementedError
+
+    def prune_events(self, before: float) -> int:
+        """Delete events created before a timestamp"""
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """In-process job store, usable only with thread workers"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._leases = {}
+        self._events = []
+        self._last_event_id = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, session_id: str, payload: dict, batch_id: str = None) -> Dict:
+        now = time.time()
+        job = {
+            'session_id': session_id,
+            'status': QUEUED,
+            'stage': QUEUED,
+            'percent': 0.0,
+            'payload': payload,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'started_at': None,
+            'updated_at': now,
+            'finished_at': None,
+            'worker': None,
+            'heartbeat_at': None,
+            'attempts': 0,
+            'batch_id': batch_id,
+        }
+        with self._lock:
+            existing = self._jobs.get(session_id)
+            if existing is not None and existing['status'] in (QUEUED, RUNNING):
+                return None
+            self._jobs[session_id] = job
+            return dict(job)
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j['status'] == QUEUED]
+            if not queued:
+                return None
+            job = min(queued, key=lambda j: j['created_at'])
+            now = time.time()
+            job.update(status=RUNNING, started_at=now, updated_at=now, heartbeat_at=now, worker=worker,
+                       attempts=job['attempts'] + 1)
+            return dict(job)
+
+    def update(self, session_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def finish(self, session_id: str, worker: str, attempt: int, **fields) -> bool:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None or job['status'] != RUNNING or job['worker'] != worker or job['attempts'] != attempt:
+                return False
+            job.update(fields, updated_at=time.time())
+            return True
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            return dict(job) if job else None
+
+    def queue_position(self, session_id: str) -> int:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if not job or job['status'] != QUEUED:
+                return 0
+            return sum(1 for j in self._jobs.values()
+                       if j['status'] == QUEUED and j['created_at'] <= job['created_at'])
+
+    def average_duration(self) -> Optional[float]:
+        with self._lock:
+            durations = [j['finished_at'] - j['started_at'] for j in self._jobs.values()
+                         if j['status'] == COMPLETED and j['started_at'] and j['finished_at']]
+        if not durations:
+            return None
+        return sum(durations[-20:]) / len(durations[-20:])
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts = {}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+    def active_sessions(self) -> List[str]:
+        with self._lock:
+            return [j['session_id'] for j in self._jobs.values() if j['status'] in (QUEUED, RUNNING)]
+
+    def batch(self, batch_id: str) -> List[Dict]:
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if j['batch_id'] == batch_id]
+        return sorted(jobs, key=lambda j: j['created_at'])
+
+    def heartbeat(self, session_id: str, worker: str) -> None:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None and job['worker'] == worker:
+                job['heartbeat_at'] = time.time()
+
+    def requeue_stale(self, timeout: float, max_attempts: int = 2) -> int:
+        now = time.time()
+        requeued = 0
+        with self._lock:
+            for job in self._jobs.values():
+                if job['status'] != RUNNING or now - (job['heartbeat_at'] or job['updated_at']) < timeout:
+                    continue
+                if job['attempts'] >= max_attempts:
+                    job.update(status=FAILED, stage=FAILED, error=STALE_ERROR, finished_at=now, updated_at=now)
+                else:
+                    job.update(status=QUEUED, stage=QUEUED, percent=0.0, started_at=None, worker=None,
+                               heartbeat_at=None, updated_at=now)
+                    requeued += 1
+        return requeued
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder and holder[0] != owner and holder[1] > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+    def add_event(self, session_id: str, kind: str, data: dict) -> int:
+        with self._lock:
+            self._last_event_id += 1
+            self._events.append({'id': self._last_event_id, 'session_id': session_id, 'kind': kind,
+                                 'data': dict(data), 'created_at': time.time()})
+            return self._last_event_id
+
+    def events(self, session_id: str = None, after: int = 0, limit: int = 500) -> List[Dict]:
+        with self._lock:
+            matching = [e for e in self._events if e['id'] > after
+                        and (session_id is None or e['session_id'] == session_id)]
+        return [dict(e) for e in matching[:limit]]
+
+    def last_event_id(self) -> int:
+        with self._lock:
+            return self._last_event_id
+
+    def prune_events(self, before: float) -> int:
+        with self._lock:
+            kept = [e for e in self._events if e['created_at'] >= before]
+            pruned = len(self._events) - len(kept)
+            self._events = kept
+        return pruned
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite-backed job store that render worker processes can share"""
+
+    shared_across_processes = True
+
+    _JSON_FIELDS = ('payload', 'result')
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    session_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    percent REAL DEFAULT 0,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    updated_at REAL,
+                    finished_at REAL,
+                    worker TEXT,
+                    heartbeat_at REAL,
+                    attempts INTEGER DEFAULT 0,
+                    batch_id TEXT
+                )
+            """)
+            # Databases created before heartbeats lack the newer columns
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, definition in (('heartbeat_at', 'REAL'), ('attempts', 'INTEGER DEFAULT 0'),
+                                       ('batch_id', 'TEXT')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, created_at)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    data TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS events_session ON events (session_id, id)')
+
+    @contextmanager
+    def _connect(self):
+        # A fresh connection per call keeps the store safe to pickle into workers
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _to_job(self, row) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        for field in self._JSON_FIELDS:
+            if job.get(field):
+                job[field] = json.loads(job[field])
+        return job
+
+    def enqueue(self, session_id: str, payload: dict, batch_id: str = None) -> Optional[Dict]:
+        now = time.time()
+        with self._connect() as conn:
+            # A finished job is replaced in the same statement; a pending one is left alone
+            cursor = conn.execute(
+                """INSERT INTO jobs
+                   (session_id, status, stage, percent, payload, result, error,
+                    created_at, started_at, updated_at, finished_at, worker, heartbeat_at, attempts, batch_id)
+                   VALUES (?, ?, ?, 0, ?, NULL, NULL, ?, NULL, ?, NULL, NULL, NULL, 0, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET
+                    status = excluded.status, stage = excluded.stage, percent = 0, payload = excluded.payload,
+                    result = NULL, error = NULL, created_at = excluded.created_at, started_at = NULL,
+                    updated_at = excluded.updated_at, finished_at = NULL, worker = NULL, heartbeat_at = NULL,
+                    attempts = 0, batch_id = excluded.batch_id
+                   WHERE jobs.status IN (?, ?)""",
+                (session_id, QUEUED, QUEUED, json.dumps(payload), now, now, batch_id, COMPLETED, FAILED)
+            )
+            if cursor.rowcount == 0:
+                return None
+        return self.get(session_id)
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    'SELECT session_id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1',
+                    (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                now = time.time()
+                conn.execute(
+                    """UPDATE jobs SET status = ?, started_at = ?, updated_at = ?, heartbeat_at = ?, worker = ?,
+                       attempts = COALESCE(attempts, 0) + 1 WHERE session_id = ?""",
+                    (RUNNING, now, now, now, worker, row['session_id'])
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            job = conn.execute('SELECT * FROM jobs WHERE session_id = ?', (row['session_id'],)).fetchone()
+        return self._to_job(job)
+
+    def update(self, session_id: str, **fields) -> None:
+        fields['updated_at'] = time.time()
+        for field in self._JSON_FIELDS:
+            if field in fields and fields[field] is not None:
+                fields[field] = json.dumps(fields[field])
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE session_id = ?",
+                (*fields.values(), session_id)
+            )
+
+    def finish(self, session_id: str, worker: str, attempt: int, **fields) -> bool:
+        fields['updated_at'] = time.time()
+        for field in self._JSON_FIELDS:
+            if field in fields and fields[field] is not None:
+                fields[field] = json.dumps(fields[field])
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"""UPDATE jobs SET {assignments}
+                    WHERE session_id = ? AND status = ? AND worker = ? AND attempts = ?""",
+                (*fields.values(), session_id, RUNNING, worker, attempt)
+            )
+            return cursor.rowcount > 0
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE session_id = ?', (session_id,)).fetchone()
+        return self._to_job(row)
+
+    def queue_position(self, session_id: str) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                """SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at <=
+                   (SELECT created_at FROM jobs WHERE session_id = ? AND status = ?)""",
+                (QUEUED, session_id, QUEUED)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def average_duration(self) -> Optional[float]:
+        with self._connect() as conn:
+            row = conn.execute(
+                """SELECT AVG(finished_at - started_at) FROM (
+                       SELECT finished_at, started_at FROM jobs
+                       WHERE status = ? AND started_at IS NOT NULL
+                       ORDER BY finished_at DESC LIMIT 20)""",
+                (COMPLETED,)
+            ).fetchone()
+        return row[0] if row and row[0] is not None else None
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def active_sessions(self) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT session_id FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)).fetchall()
+        return [row[0] for row in rows]
+
+    def batch(self, batch_id: str) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at', (batch_id,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def heartbeat(self, session_id: str, worker: str) -> None:
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET heartbeat_at = ? WHERE session_id = ? AND worker = ?',
+                         (time.time(), session_id, worker))
+
+    def requeue_stale(self, timeout: float, max_attempts: int = 2) -> int:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                stale = conn.execute(
+                    """SELECT session_id, COALESCE(attempts, 0) AS attempts FROM jobs
+                       WHERE status = ? AND COALESCE(heartbeat_at, updated_at) < ?""",
+                    (RUNNING, now - timeout)
+                ).fetchall()
+                requeued = 0
+                for row in stale:
+                    if row['attempts'] >= max_attempts:
+                        conn.execute(
+                            """UPDATE jobs SET status = ?, stage = ?, error = ?, finished_at = ?, updated_at = ?
+                               WHERE session_id = ?""",
+                            (FAILED, FAILED, STALE_ERROR, now, now, row['session_id'])
+                        )
+                    else:
+                        conn.execute(
+                            """UPDATE jobs SET status = ?, stage = ?, percent = 0, started_at = NULL, worker = NULL,
+                               heartbeat_at = NULL, updated_at = ? WHERE session_id = ?""",
+                            (QUEUED, QUEUED, now, row['session_id'])
+                        )
+                        requeued += 1
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return requeued
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+                   ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                   WHERE leases.owner = excluded.owner OR leases.expires_at < ?""",
+                (name, owner, now + ttl, now)
+            )
+        return cursor.rowcount > 0
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+
+    def add_event(self, session_id: str, kind: str, data: dict) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO events (session_id, kind, data, created_at) VALUES (?, ?, ?, ?)',
+                (session_id, kind, json.dumps(data), time.time())
+            )
+        return cursor.lastrowid
+
+    def events(self, session_id: str = None, after: int = 0, limit: int = 500) -> List[Dict]:
+        with self._connect() as conn:
+            if session_id is None:
+                rows = conn.execute('SELECT * FROM events WHERE id > ? ORDER BY id LIMIT ?',
+                                    (after, limit)).fetchall()
+            else:
+                rows = conn.execute('SELECT * FROM events WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?',
+                                    (session_id, after, limit)).fetchall()
+        return [dict(row, data=json.loads(row['data']) if row['data'] else {}) for row in rows]
+
+    def last_event_id(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()
+        return row[0]
+
+    def prune_events(self, before: float) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM events WHERE created_at < ?', (before,))
+        return cursor.rowcount
+
+
+def create_job_store(backend: str = 'sqlite', path: str = 'data/jobs.db', url: str = None) -> JobStore:
+    """Create a job store for the configured queue backend
+
+    backend is 'memory', 'sqlite', or 'package.module:ClassName' for an
+    external store (e.g. one backed by Redis or Postgres), which is
+    constructed with url.
+    """
+    if backend == 'memory':
+        return MemoryJobStore()
+    if backend == 'sqlite':
+        return SQLiteJobStore(path)
+    if ':' in backend:
+        module_name, _, class_name = backend.partition(':')
+        store_class = getattr(importlib.import_module(module_name), class_name, None)
+        if not isinstance(store_class, type) or not issubclass(store_class, JobStore):
+            raise ValueError(f"Job queue backend {backend} is not a JobStore")
+        return store_class(url)
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+
+def process_identity() -> str:
+    """Name of this process that is unique across hosts, used as a lease owner"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobProgress:
+    """Progress reporter handed to job handlers
+
+    Calling it records a stage and percent on the job; event() records finer
+    detail (scenes rendered, frames encoded, chunks summarized). Both go to
+    the store's event log, which /events streams to clients. Repeats of a
+    detail event within min_interval are dropped, so a tight loop may report
+    on every iteration. Without a store every call is a no-op.
+    """
+
+    def __init__(self, store: Optional[JobStore], session_id: str, min_interval: float = 0.25):
+        self.store = store
+        self.session_id = session_id
+        self.min_interval = min_interval
+        self._last_sent = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, percent: float) -> None:
+        if self.store is None:
+            return
+        self.store.update(self.session_id, stage=stage, percent=float(percent))
+        self.emit('progress', {'stage': stage, 'percent': float(percent)})
+
+    def event(self, kind: str, force: bool = False, **data) -> None:
+        if self.store is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_sent.get(kind, float('-inf')) < self.min_interval:
+                return
+            self._last_sent[kind] = now
+        self.emit(kind, data)
+
+    def emit(self, kind: str, data: dict) -> None:
+        try:
+            self.store.add_event(self.session_id, kind, data)
+        except Exception as e:
+            # Progress reporting never fails a job
+            logger.warning(f"Failed to record {kind} event for {self.session_id}: {str(e)}")
+
+
+def _heartbeat_loop(store: JobStore, session_id: str, worker: str, done, interval: float) -> None:
+    while not done.wait(interval):
+        try:
+            store.heartbeat(session_id, worker)
+        except Exception as e:
+            logger.warning(f"Heartbeat for job {session_id} failed: {str(e)}")
+
+
+def _worker_loop(store: JobStore, handler, stop_event, poll_interval: float, parent_pid: int,
+                 heartbeat_interval: float = 10, stale_after: float = 60, max_attempts: int = 2,
+                 initializer=None, event_retention: float = 24 * 3600) -> None:
+    """Claim and run jobs until stopped or the parent process goes away"""
+    worker = f"{process_identity()}:{threading.current_thread().name}"
+    if initializer:
+        # Load models, fonts and clients once so that no job pays for them
+        try:
+            initializer()
+        except Exception as e:
+            logger.warning(f"Render worker {worker} warm-up failed: {str(e)}")
+    last_sweep = 0.0
+    while not stop_event.is_set():
+        if parent_pid and os.getppid() != parent_pid:
+            logger.warning(f"Render worker {worker} lost its parent, exiting")
+            return
+        if time.time() - last_sweep >= heartbeat_interval:
+            # Any worker may return the jobs of a worker that died (on any host) to the queue
+            last_sweep = time.time()
+            try:
+                requeued = store.requeue_stale(stale_after, max_attempts)
+                if requeued:
+                    logger.warning(f"Requeued {requeued} job(s) whose render worker stopped responding")
+                    get_metrics().inc('pdfvideo_jobs_requeued_total', requeued)
+                store.prune_events(time.time() - event_retention)
+            except Exception as e:
+                logger.error(f"Failed to requeue stale jobs: {str(e)}")
+        try:
+            job = store.claim(worker)
+        except Exception as e:
+            logger.error(f"Failed to claim job: {str(e)}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        session_id = job['session_id']
+        progress = JobProgress(store, session_id)
+
+        logger.info(f"Worker {worker} running job {session_id}")
+        started = time.perf_counter()
+        # Long render steps report no progress, so liveness comes from a separate thread
+        done = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat_loop, args=(store, session_id, worker, done, heartbeat_interval),
+                                     name=f"heartbeat-{session_id[:8]}", daemon=True)
+        heartbeat.start()
+        # The outcome is written only while this claim still owns the job
+        attempt = job.get('attempts') or 0
+        try:
+            result = handler(session_id, job.get('payload') or {}, progress)
+            status = COMPLETED
+            if store.finish(session_id, worker, attempt, status=COMPLETED, stage=COMPLETED, percent=100.0,
+                            result=result, finished_at=time.time()):
+                summary = result if isinstance(result, dict) else {}
+                progress.emit(COMPLETED, {'stage': COMPLETED, 'percent': 100.0,
+                                          'cached': bool(summary.get('cached')),
+                                          'draft': bool(summary.get('draft_path')),
+                                          'timings': summary.get('timings')})
+            else:
+                logger.warning(f"Job {session_id} was requeued while {worker} ran it; discarding its result")
+        except Exception as e:
+            logger.error(f"Job {session_id} failed: {str(e)}", exc_info=True)
+            status = FAILED
+            if store.finish(session_id, worker, attempt, status=FAILED, stage=FAILED, error=str(e),
+                            finished_at=time.time()):
+                progress.emit(FAILED, {'stage': FAILED, 'error': str(e)})
+            else:
+                logger.warning(f"Job {session_id} was requeued while {worker} ran it; discarding its failure")
+        finally:
+            done.set()
+
+        metrics = get_metrics()
+        metrics.inc('pdfvideo_jobs_total', status=status)
+        metrics.observe('pdfvideo_job_seconds', time.perf_counter() - started, status=status)
+        metrics.flush()
+
+
+class JobQueue:
+    """Dispatches processing jobs to a pool of render workers"""
+
+    def __init__(self, store: JobStore, handler, workers: int = 1, poll_interval: float = 0.5,
+                 start_method: str = 'spawn', capacity: int = None, heartbeat_interval: float = 10,
+                 stale_after: float = 60, max_attempts: int = 2, initializer=None):
+        self.store = store
+        self.handler = handler
+        # Runs once in each worker before it claims jobs
+        self.initializer = initializer
+        # 0 makes this process enqueue only, for web workers in front of separate render workers
+        self.workers = max(0, workers)
+        # Render workers across the whole deployment, used for ETAs
+        self.capacity = max(1, capacity or self.workers)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        # Worker processes need a store they can share; otherwise fall back to threads
+        self.use_processes = store.shared_across_processes
+        self._context = multiprocessing.get_context(start_method)
+        self._stop_event = None
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker pool if it is not already running, replacing workers that died"""
+        if self.workers == 0:
+            return
+        with self._lock:
+            self._pool = [w for w in self._pool if w.is_alive()]
+            missing = self.workers - len(self._pool)
+            if missing <= 0:
+                return
+            if self._stop_event is None:
+                self._stop_event = self._context.Event() if self.use_processes else threading.Event()
+            liveness = (self.heartbeat_interval, self.stale_after, self.max_attempts, self.initializer)
+            for index in range(missing):
+                if self.use_processes:
+                    # Non-daemonic so that workers may run their own process pools
+                    worker = self._context.Process(
+                        target=_worker_loop,
+                        args=(self.store, self.handler, self._stop_event, self.poll_interval, os.getpid(),
+                              *liveness),
+                        name=f"render-worker-{index}",
+                    )
+                else:
+                    worker = threading.Thread(
+                        target=_worker_loop,
+                        args=(self.store, self.handler, self._stop_event, self.poll_interval, 0, *liveness),
+                        name=f"render-worker-{index}",
+                        daemon=True,
+                    )
+                worker.start()
+                self._pool.append(worker)
+            logger.info(f"Started {missing} render worker(s) ({'process' if self.use_processes else 'thread'} mode)")
+
+    def stop(self, timeout: float = 5) -> None:
+        """Ask workers to finish their current job and exit"""
+        with self._lock:
+            if self._stop_event is not None:
+                self._stop_event.set()
+            for worker in self._pool:
+                worker.join(timeout)
+                if self.use_processes and worker.is_alive():
+                    worker.terminate()
+            self._pool = []
+            self._stop_event = None
+
+    def submit(self, session_id: str, payload: dict, batch_id: str = None) -> Dict:
+        """Queue a job, returning the existing one if it is still pending"""
+        # Started lazily so that importing the app never spawns processes
+        self.start()
+        job = self.store.enqueue(session_id, payload, batch_id)
+        if job is None:
+            # Already pending; if it finished since, its record is still the answer
+            return self.store.get(session_id)
+        JobProgress(self.store, session_id).emit('progress', {'stage': QUEUED, 'percent': 0.0})
+        return job
+
+    def status(self, session_id: str) -> Optional[Dict]:
+        """Return queue state, stage, percent and ETA for a session's job"""
+        job = self.store.get(session_id)
+        if job is None:
+            return None
+
+        now = time.time()
+        eta = None
+        position = 0
+        if job['status'] == RUNNING and job['started_at']:
+            elapsed = now - job['started_at']
+            if job['percent'] > 0:
+                eta = elapsed * (100 - job['percent']) / job['percent']
+            else:
+                average = self.store.average_duration()
+                eta = max(average - elapsed, 0) if average else None
+        elif job['status'] == QUEUED:
+            position = self.store.queue_position(session_id)
+            average = self.store.average_duration()
+            if average:
+                # Jobs ahead of us are spread across the worker pool
+                eta = average * (1 + (position - 1) // self.capacity)
+
+        return {
+            'state': job['status'],
+            'stage': job['stage'],
+            'percent': round(job['percent'] or 0, 1),
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+            'queue_position': position,
+            'error': job['error'],
+            'result': job['result'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+        }
+
+
+def create_job_queue(handler, workers: int = None, initializer=None) -> JobQueue:
+    """Build the job queue from environment settings
+
+    workers overrides RENDER_WORKERS, e.g. with 0 for a web tier whose jobs
+    are rendered by separate `python worker.py` processes.
+    """
+    backend = os.getenv('JOB_QUEUE_BACKEND', 'sqlite')
+    if workers is None:
+        workers = int(os.getenv('RENDER_WORKERS', '1'))
+    if backend == 'memory' and int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+        raise ValueError("JOB_QUEUE_BACKEND=memory cannot be shared by several web workers; use sqlite")
+    return JobQueue(
+        create_job_store(backend, os.getenv('JOB_DB_PATH', 'data/jobs.db'), os.getenv('JOB_STORE_URL')),
+        handler,
+        workers=workers,
+        start_method=os.getenv('RENDER_START_METHOD', 'spawn'),
+        capacity=int(os.getenv('RENDER_CAPACITY', '0')) or None,
+        heartbeat_interval=float(os.getenv('JOB_HEARTBEAT_SECONDS', '10')),
+        stale_after=float(os.getenv('JOB_STALE_SECONDS', '60')),
+        max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '2')),
+        initializer=initializer,
+    )
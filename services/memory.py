@@ -0,0 +1,197 @@
+import os
+import glob
+import logging
+import threading
+from typing import Dict, List, Optional
+from services.render_profiles import RENDER_PROFILES
+
+logger = logging.getLogger(__name__)
+
+# RSS is read from /proc, so peak tracking reports nothing where there is no sysconf (Windows)
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else None
+
+# Limits at or above this mean "no limit" in cgroup files
+_UNLIMITED = 1 << 60
+
+# Rough cost model of a render, fitted to peak RSS of 480p-1080p renders with ffmpeg 7:
+# a render worker with its imports, fonts and caches loaded...
+WORKER_BASE_BYTES = 90 * 1024 * 1024
+# ...full RGB frames alive at once (still, background, previous, work buffers, cached backgrounds)...
+FRAME_BUFFERS = 8
+# ...and ffmpeg, whose frame queues, x264 lookahead and B-frames grow with the picture
+ENCODER_BASE_BYTES = 45 * 1024 * 1024
+ENCODER_BYTES_PER_PIXEL = {'ultrafast': 90, 'superfast': 110, 'veryfast': 130}
+SLOW_PRESET_BYTES_PER_PIXEL = 160
+# Without lookahead and B-frames (the low_memory profile flag) x264 needs about as little as ultrafast
+LOW_MEMORY_BYTES_PER_PIXEL = 100
+# A scene worker process and its ffmpeg; segments are short, so their encoders stay small
+SEGMENT_WORKER_BYTES = 95 * 1024 * 1024
+SEGMENT_BYTES_PER_PIXEL = 85
+
+
+def process_rss(pid='self') -> int:
+    """Resident set size of a process in bytes, or 0 if it has gone or cannot be read"""
+    if PAGE_SIZE is None:
+        return 0
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _children(pid) -> List[int]:
+    children = []
+    for path in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(path) as file:
+                children.extend(int(child) for child in file.read().split())
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def tree_rss(pid=None) -> int:
+    """RSS of a process plus all its descendants (ffmpeg encoders, scene workers)"""
+    pid = pid or os.getpid()
+    total = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        total += process_rss(current)
+        pending.extend(_children(current))
+    return total
+
+
+def container_limit() -> Optional[int]:
+    """Memory limit of this container's cgroup (v2 or v1) in bytes, or None when unlimited"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as file:
+                value = file.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < _UNLIMITED:
+            return int(value)
+        return None
+    return None
+
+
+def memory_budget() -> Optional[int]:
+    """Bytes one render may use, or None for no budget
+
+    RENDER_MEMORY_BUDGET_MB is a number of megabytes, 0 for no budget, or
+    'auto' for a share of the container's memory limit split across the
+    render workers sharing it.
+    """
+    setting = os.getenv('RENDER_MEMORY_BUDGET_MB', 'auto').lower()
+    if setting != 'auto':
+        megabytes = float(setting)
+        if megabytes < 0:
+            raise ValueError(f"RENDER_MEMORY_BUDGET_MB must be 'auto' or at least 0, got {setting}")
+        return int(megabytes * 1024 * 1024) or None
+    limit = container_limit()
+    if limit is None:
+        return None
+    # The web tier and page cache need some of the container too
+    share = float(os.getenv('RENDER_MEMORY_SHARE', '0.8'))
+    return int(limit * share / max(1, int(os.getenv('RENDER_WORKERS', '1'))))
+
+
+def estimate_render(profile: Dict, scene_workers: int = 1) -> int:
+    """Expected peak RSS of one render, including its encoders and scene workers"""
+    pixels = profile['width'] * profile['height']
+    if scene_workers > 1:
+        # Segments are rendered in spawned processes, each with its own imports, buffers and ffmpeg
+        return WORKER_BASE_BYTES + scene_workers * (SEGMENT_WORKER_BYTES + pixels * SEGMENT_BYTES_PER_PIXEL)
+    if profile.get('low_memory'):
+        per_pixel = LOW_MEMORY_BYTES_PER_PIXEL
+    else:
+        per_pixel = ENCODER_BYTES_PER_PIXEL.get(profile.get('preset'), SLOW_PRESET_BYTES_PER_PIXEL)
+    return WORKER_BASE_BYTES + pixels * FRAME_BUFFERS * 3 + ENCODER_BASE_BYTES + pixels * per_pixel
+
+
+def _smaller_size(width: int, height: int) -> Optional[tuple]:
+    """The next smaller standard picture size with the same aspect ratio, or None at the floor"""
+    heights = sorted({profile['height'] for profile in RENDER_PROFILES.values() if profile['height'] < height},
+                     reverse=True)
+    if not heights:
+        return None
+    smaller = heights[0]
+    # x264 needs even dimensions
+    return int(round(width * smaller / height / 2)) * 2, smaller
+
+
+def fit_render(profile: Dict, scene_workers: int, budget: Optional[int]) -> tuple:
+    """Downgrade a render until its estimate fits the budget
+
+    Scene workers go first, then x264's lookahead and B-frames (the
+    low_memory profile flag), then the picture steps down through the
+    standard sizes. Returns the profile and scene worker count to render with
+    and a dict of what was downgraded. When even the smallest serial render
+    does not fit, that is what is returned; it is the render most likely to
+    survive.
+    """
+    fitted = dict(profile)
+    workers = max(1, scene_workers)
+    changes = {}
+    if not budget or estimate_render(fitted, workers) <= budget:
+        return fitted, workers, changes
+    while workers > 1 and estimate_render(fitted, workers) > budget:
+        workers -= 1
+    if workers != max(1, scene_workers):
+        changes['scene_workers'] = f"{scene_workers} -> {workers}"
+    if estimate_render(fitted, workers) > budget and not fitted.get('low_memory'):
+        fitted['low_memory'] = True
+        changes['encoder'] = 'low_memory'
+    size = f"{fitted['width']}x{fitted['height']}"
+    while estimate_render(fitted, workers) > budget:
+        smaller = _smaller_size(fitted['width'], fitted['height'])
+        if smaller is None:
+            logger.warning(f"A {fitted['width']}x{fitted['height']} render is estimated to exceed the "
+                           f"{budget // (1024 * 1024)}MB memory budget")
+            break
+        fitted['width'], fitted['height'] = smaller
+    if f"{fitted['width']}x{fitted['height']}" != size:
+        changes['resolution'] = f"{size} -> {fitted['width']}x{fitted['height']}"
+    return fitted, workers, changes
+
+
+class PeakMemory:
+    """Samples the RSS of this process and its children while a block runs
+
+    Child processes (ffmpeg, scene workers) are included, which
+    getrusage(RUSAGE_SELF) does not see, and the peak covers only the block,
+    not the life of a long-running render worker. Spikes shorter than the
+    interval can be missed. peak stays 0 where RSS cannot be read.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self) -> int:
+        rss = tree_rss()
+        self.peak = max(self.peak, rss)
+        return rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self) -> 'PeakMemory':
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name='peak-memory', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Help text for the metrics the pipeline records
+METRIC_HELP = {
+    'pdfvideo_stage_seconds': ('histogram', 'Time spent in each pipeline stage and sub-step'),
+    'pdfvideo_job_seconds': ('histogram', 'Wall-clock time of processing jobs'),
+    'pdfvideo_jobs_total': ('counter', 'Processing jobs by final status'),
+    'pdfvideo_jobs_requeued_total': ('counter', 'Jobs returned to the queue after their render worker stopped responding'),
+    'pdfvideo_pages_processed_total': ('counter', 'PDF pages extracted'),
+    'pdfvideo_bytes_processed_total': ('counter', 'PDF bytes processed'),
+    'pdfvideo_frames_rendered_total': ('counter', 'Video frames encoded'),
+    'pdfvideo_scenes_rendered_total': ('counter', 'Scene frames built'),
+    'pdfvideo_renders_downgraded_total': ('counter', 'Renders downgraded to fit the memory budget, by what was changed'),
+    'pdfvideo_tts_requests_total': ('counter', 'Narration clips synthesized (cache misses) by backend'),
+    'pdfvideo_cache_requests_total': ('counter', 'Result cache lookups by stage and result'),
+    'pdfvideo_jobs_in_queue': ('gauge', 'Jobs currently queued or running'),
+    'pdfvideo_storage_bytes': ('gauge', 'Bytes of uploads and outputs in the storage index'),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Samples of processes that have exited, folded together so their files can be removed
+RETIRED_FILE = '_retired.json'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class MetricsRegistry:
+    """Counters, histograms and gauges rendered in Prometheus text format
+
+    Render workers run in separate processes, so each process flushes its
+    samples to a JSON file in a shared directory and the web process merges
+    them when /metrics is scraped. Files are named by host, PID and a random
+    token, so a reused PID never overwrites an older file. Files of processes
+    on this host that have exited are added to a retired total and deleted
+    at scrape time, so the directory does not grow with short-lived pool
+    workers and counters never go backwards.
+    """
+
+    def __init__(self, directory: Optional[str] = None, buckets: tuple = DEFAULT_BUCKETS):
+        self.directory = directory
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Dict] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+        self._file_pid = None
+        self._file_name = None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Gauges are local to the process that renders them"""
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._histograms[key] = histogram
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of a block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """JSON-serializable copy of counters and histograms"""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), dict(h, buckets=list(h['buckets']))]
+                               for (name, labels), h in self._histograms.items()],
+            }
+
+    def flush(self) -> None:
+        """Write this process's samples where the web process can merge them"""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, self._own_file())
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to flush metrics: {str(e)}")
+
+    def _own_file(self) -> str:
+        """Name of this process's sample file, renewed when a fork changes the PID"""
+        if self._file_pid != os.getpid():
+            self._file_pid = os.getpid()
+            self._file_name = f"{socket.gethostname()}-{self._file_pid}-{uuid.uuid4().hex[:8]}.json"
+        return self._file_name
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _retire_exited(self) -> None:
+        """Fold the files of exited processes on this host into the retired total and delete them
+
+        PIDs are only meaningful on this host, so other hosts' files are left
+        to their own web processes. Runs under a file lock so two web workers
+        never fold the same file twice.
+        """
+        if fcntl is None:
+            # Without flock (and with os.kill terminating processes on Windows) files are kept
+            return
+        prefix = f"{socket.gethostname()}-"
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        with open(os.path.join(self.directory, '_retired.lock'), 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                retired = self._read(retired_path) or {}
+                names = os.listdir(self.directory)
+                # Files folded in before a crash could delete them are deleted now, not folded again
+                folded = set(retired.get('files', [])) & set(names)
+                exited = []
+                for name in names:
+                    if not name.endswith('.json') or name == RETIRED_FILE or name in folded:
+                        continue
+                    # Files from before names carried the host are plain {pid}.json
+                    if name.startswith(prefix):
+                        pid = name[len(prefix):].split('-')[0]
+                    else:
+                        pid = name[:-len('.json')]
+                    if not pid.isdigit():
+                        continue
+                    try:
+                        os.kill(int(pid), 0)
+                    except ProcessLookupError:
+                        exited.append(name)
+                    except PermissionError:
+                        # Alive under another user
+                        continue
+                snapshots = [retired]
+                snapshots += [snapshot for snapshot in (self._read(os.path.join(self.directory, name))
+                                                        for name in exited) if snapshot]
+                if exited:
+                    counters, histograms = self._combine(snapshots)
+                    tmp_path = f"{retired_path}.tmp"
+                    with open(tmp_path, 'w') as file:
+                        json.dump({
+                            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                            'histograms': [[name, list(labels), h] for (name, labels), h in histograms.items()],
+                            'files': sorted(folded | set(exited)),
+                        }, file)
+                    os.replace(tmp_path, retired_path)
+                    logger.info(f"Retired metrics of {len(exited)} exited processes")
+                for name in folded | set(exited):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _merged(self) -> Tuple[Dict, Dict]:
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            try:
+                self._retire_exited()
+            except Exception as e:
+                logger.warning(f"Failed to retire metrics files: {str(e)}")
+            own = self._own_file()
+            retired = self._read(os.path.join(self.directory, RETIRED_FILE)) or {}
+            # Already counted in the retired total
+            skip = set(retired.get('files', [])) | {own}
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json') or name in skip:
+                    continue
+                snapshot = self._read(os.path.join(self.directory, name))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return self._combine(snapshots)
+
+    def _combine(self, snapshots: list) -> Tuple[Dict, Dict]:
+        counters: Dict[Tuple[str, LabelKey], float] = {}
+        histograms: Dict[Tuple[str, LabelKey], Dict] = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot.get('counters', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, sample in snapshot.get('histograms', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], sample['buckets'])]
+                merged['sum'] += sample['sum']
+                merged['count'] += sample['count']
+        return counters, histograms
+
+    def render_prometheus(self) -> str:
+        """All metrics from every process in Prometheus text exposition format"""
+        counters, histograms = self._merged()
+        with self._lock:
+            gauges = dict(self._gauges)
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            help_text = METRIC_HELP.get(name, (kind, name))[1]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, 'counter')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), value in sorted(gauges.items()):
+            describe(name, 'gauge')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            describe(name, 'histogram')
+            # Bucket counts are already cumulative (every bucket with value <= bound)
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class Trace:
+    """Per-job stage timings that also feed the stage histogram"""
+
+    def __init__(self, registry: 'MetricsRegistry' = None):
+        self.registry = registry or get_metrics()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage: str, seconds: float, observe: bool = True) -> None:
+        """Record time for a stage; observe=False for time already in the histogram"""
+        self.timings[stage] = round(self.timings.get(stage, 0) + seconds, 4)
+        if observe:
+            self.registry.observe('pdfvideo_stage_seconds', seconds, stage=stage)
+
+
+_metrics = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry(os.getenv('METRICS_DIR', 'data/metrics'))
+    return _metrics
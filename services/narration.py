@@ -0,0 +1,227 @@
+import os
+import wave
+import shutil
+import logging
+import subprocess
+from xml.sax.saxutils import escape
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from services.result_cache import ResultCache
+from services.metrics import get_metrics
+from services.script import Scene
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('auto', 'espeak', 'azure', 'silent', 'none')
+
+# Silence around each scene's narration, so speech does not start on the cut
+SCENE_LEAD_SECONDS = 0.3
+SCENE_TAIL_SECONDS = 0.5
+
+
+class TTSBackend:
+    """Turns one piece of text into a WAV file"""
+
+    name = 'base'
+
+    def __init__(self, voice: str = None):
+        self.voice = voice
+
+    def settings(self) -> Dict:
+        """Everything that changes the synthesized audio"""
+        return {'backend': self.name, 'voice': self.voice}
+
+    def synthesize(self, text: str, wav_path: str) -> None:
+        raise NotImplementedError
+
+
+class EspeakBackend(TTSBackend):
+    """Offline synthesis with the local espeak-ng (or espeak) binary"""
+
+    name = 'espeak'
+
+    def __init__(self, voice: str = None, rate: int = 160, binary: str = None):
+        super().__init__(voice or 'en-us')
+        self.rate = rate
+        self.binary = binary or find_espeak()
+        if not self.binary:
+            raise Exception("espeak-ng is not installed")
+
+    def settings(self) -> Dict:
+        return dict(super().settings(), rate=self.rate)
+
+    def synthesize(self, text: str, wav_path: str) -> None:
+        # Text goes through stdin so it is never parsed as options
+        result = subprocess.run(
+            [self.binary, '-v', self.voice, '-s', str(self.rate), '-w', wav_path, '--stdin'],
+            input=text.encode('utf-8'), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60
+        )
+        if result.returncode != 0:
+            message = result.stderr.decode('utf-8', errors='replace').strip()
+            raise Exception(f"espeak exited with code {result.returncode}: {message[-300:]}")
+
+
+class AzureSpeechBackend(TTSBackend):
+    """Azure Cognitive Services text-to-speech over its REST API"""
+
+    name = 'azure'
+
+    def __init__(self, voice: str = None, key: str = None, region: str = None):
+        super().__init__(voice or 'en-US-JennyNeural')
+        self.key = key or os.getenv('AZURE_SPEECH_KEY')
+        self.region = region or os.getenv('AZURE_SPEECH_REGION')
+        if not self.key or not self.region:
+            raise Exception("AZURE_SPEECH_KEY and AZURE_SPEECH_REGION are required")
+
+    def synthesize(self, text: str, wav_path: str) -> None:
+        import requests
+        ssml = (f"<speak version='1.0' xml:lang='en-US'><voice name='{escape(self.voice)}'>"
+                f"{escape(text)}</voice></speak>")
+        response = requests.post(
+            f"https://{self.region}.tts.speech.microsoft.com/cognitiveservices/v1",
+            headers={
+                'Ocp-Apim-Subscription-Key': self.key,
+                'Content-Type': 'application/ssml+xml',
+                'X-Microsoft-OutputFormat': 'riff-24khz-16bit-mono-pcm',
+                'User-Agent': 'pdf-video-generator',
+            },
+            data=ssml.encode('utf-8'),
+            timeout=60
+        )
+        response.raise_for_status()
+        with open(wav_path, 'wb') as file:
+            file.write(response.content)
+
+
+class SilentBackend(TTSBackend):
+    """Silence as long as the text would take to read, for tests and benchmarks"""
+
+    name = 'silent'
+
+    def __init__(self, voice: str = None, words_per_minute: int = 150, sample_rate: int = 16000):
+        super().__init__(voice or 'silent')
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+
+    def settings(self) -> Dict:
+        return dict(super().settings(), words_per_minute=self.words_per_minute)
+
+    def synthesize(self, text: str, wav_path: str) -> None:
+        seconds = max(len(text.split()), 1) * 60 / self.words_per_minute
+        with wave.open(wav_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b'\0\0' * int(seconds * self.sample_rate))
+
+
+def find_espeak() -> Optional[str]:
+    return shutil.which('espeak-ng') or shutil.which('espeak')
+
+
+def wav_seconds(path: str) -> float:
+    """Length of a WAV file, read from its header"""
+    with wave.open(path, 'rb') as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def scene_seconds(clip: Dict) -> float:
+    """Scene length that fits a narration clip"""
+    return SCENE_LEAD_SECONDS + clip['seconds'] + SCENE_TAIL_SECONDS
+
+
+class Narrator:
+    """Synthesizes one narration clip per scene, concurrently and through the result cache"""
+
+    def __init__(self, backend: TTSBackend, cache: Optional[ResultCache] = None, concurrency: int = 4):
+        self.backend = backend
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+
+    def settings(self) -> Dict:
+        return self.backend.settings()
+
+    def narrate(self, scenes: List[Scene], work_dir: str) -> List[Optional[Dict]]:
+        """Return a clip (path, seconds, key) per scene, or None for scenes without narration"""
+        os.makedirs(work_dir, exist_ok=True)
+        texts = [ResultCache.normalize_text(scene.narration) for scene in scenes]
+        # Subprocesses and HTTP requests release the GIL, so threads are enough
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, max(len(scenes), 1))) as executor:
+            futures = [
+                executor.submit(self._clip, text, os.path.join(work_dir, f"scene_{i:03d}.wav")) if text else None
+                for i, text in enumerate(texts)
+            ]
+            return [future.result() if future else None for future in futures]
+
+    def _clip(self, text: str, wav_path: str) -> Dict:
+        # Keyed by text and voice settings, so repeated scenes are synthesized once
+        key = ResultCache.make_key('audio', text, self.backend.settings())
+        if not (self.cache and self.cache.get_file('audio', key, wav_path, '.wav')):
+            self.backend.synthesize(text, wav_path)
+            get_metrics().inc('pdfvideo_tts_requests_total', backend=self.backend.name)
+            if self.cache:
+                self.cache.put_file('audio', key, wav_path, '.wav')
+        return {'path': wav_path, 'seconds': round(wav_seconds(wav_path), 3), 'key': key}
+
+
+def write_track(clips: List[Optional[Dict]], durations: List[float], wav_path: str) -> Optional[str]:
+    """Lay the clips out on one WAV track, each starting just after its scene starts
+
+    Scenes without a clip are silent. Returns None when there is no audio at all.
+    """
+    params = None
+    for clip in clips:
+        if clip:
+            with wave.open(clip['path'], 'rb') as wav:
+                params = wav.getparams()
+            break
+    if params is None:
+        return None
+
+    rate = params.framerate
+    frame_bytes = params.nchannels * params.sampwidth
+    with wave.open(wav_path, 'wb') as out:
+        out.setnchannels(params.nchannels)
+        out.setsampwidth(params.sampwidth)
+        out.setframerate(rate)
+        written = 0
+        scene_start = 0.0
+        for clip, duration in zip(clips, durations):
+            scene_end = scene_start + duration
+            # Positions come from cumulative times, so rounding never drifts
+            end_frame = round(scene_end * rate)
+            if clip:
+                lead = round((scene_start + SCENE_LEAD_SECONDS) * rate) - written
+                out.writeframes(b'\0' * frame_bytes * max(lead, 0))
+                written += max(lead, 0)
+                with wave.open(clip['path'], 'rb') as wav:
+                    if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) != \
+                            (params.nchannels, params.sampwidth, rate):
+                        raise Exception(f"Narration clip {clip['path']} has a different audio format")
+                    count = min(wav.getnframes(), max(end_frame - written, 0))
+                    out.writeframes(wav.readframes(count))
+                    written += count
+            out.writeframes(b'\0' * frame_bytes * max(end_frame - written, 0))
+            written = max(written, end_frame)
+            scene_start = scene_end
+    return wav_path
+
+
+def create_narrator(cache: Optional[ResultCache] = None) -> Optional[Narrator]:
+    """Build the narrator from environment settings, or None when narration is off"""
+    choice = os.getenv('NARRATION_BACKEND', 'auto').lower()
+    if choice not in BACKENDS:
+        raise ValueError(f"Unknown narration backend: {choice}")
+    voice = os.getenv('NARRATION_VOICE') or None
+    backend = None
+    if choice == 'espeak' or (choice == 'auto' and find_espeak()):
+        backend = EspeakBackend(voice, rate=int(os.getenv('NARRATION_RATE', '160')))
+    elif choice == 'azure' or (choice == 'auto' and os.getenv('AZURE_SPEECH_KEY')):
+        backend = AzureSpeechBackend(voice)
+    elif choice == 'silent':
+        backend = SilentBackend(voice)
+    if backend is None:
+        logger.info("No text-to-speech backend available, videos will have no narration")
+        return None
+    logger.info(f"Narration enabled with the {backend.name} backend")
+    return Narrator(backend, cache, concurrency=int(os.getenv('NARRATION_CONCURRENCY', '4')))
@@ -1,43 +1,249 @@
 import PyPDF2
 import os
-from typing import Dict, List
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional
 import logging
+from services.result_cache import ResultCache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 logger = logging.getLogger(__name__)
 
+
+def _limit_memory(limit_bytes: int) -> None:
+    """Cap the address space of a raster worker; poppler inherits the limit"""
+    if resource is not None and limit_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+
+
+def _rasterize_page(pdf_path: str, page: int, dpi: int, max_pixels: int, output_path: str) -> str:
+    """Render one page to a PNG file in a worker process, lowering the DPI for oversized pages"""
+    from pdf2image import convert_from_path
+    with open(pdf_path, 'rb') as file:
+        box = PyPDF2.PdfReader(file).pages[page - 1].mediabox
+        width_in, height_in = float(box.width) / 72, float(box.height) / 72
+    if width_in * height_in * dpi * dpi > max_pixels:
+        dpi = max(int((max_pixels / (width_in * height_in)) ** 0.5), 1)
+    tmp_dir = tempfile.mkdtemp(prefix='raster_', dir=os.path.dirname(output_path))
+    try:
+        # poppler writes straight to disk; the image is never decoded in Python
+        paths = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page, fmt='png',
+                                  output_folder=tmp_dir, single_file=True, output_file='page',
+                                  paths_only=True, timeout=120)
+        if not paths:
+            raise Exception(f"poppler produced no image for page {page}")
+        os.replace(paths[0], output_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return output_path
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[Dict]:
+    """Extract pages [start, end) in a worker process"""
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return list(_iter_reader_pages(pdf_reader, start, end))
+
+
+def _iter_reader_pages(pdf_reader, start: int, end: int) -> Iterator[Dict]:
+    """Yield non-empty pages with their extraction time"""
+    for page_num in range(start, end):
+        started = time.perf_counter()
+        text = pdf_reader.pages[page_num].extract_text() or ''
+        elapsed = time.perf_counter() - started
+        if text.strip():
+            yield {
+                'page': page_num + 1,
+                'text': text.strip(),
+                'seconds': round(elapsed, 4)
+            }
+
+
 class PDFProcessor:
     """Handles PDF content extraction"""
-    
-    def extract_content(self, pdf_path: str) -> Dict:
-        """Extract text and metadata from PDF"""
+
+    def __init__(self):
+        self.max_pages = int(os.getenv('PDF_MAX_PAGES', '0')) or None
+        self.workers = int(os.getenv('PDF_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+        # Documents shorter than this are extracted in-process
+        self.parallel_min_pages = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '64'))
+        self.pages_per_task = int(os.getenv('PDF_PAGES_PER_TASK', '16'))
+        # Rasterize the title page and figure pages as scene backgrounds
+        self.page_backgrounds = os.getenv('PDF_PAGE_BACKGROUNDS', 'false').lower() == 'true'
+        self.raster_dpi = int(os.getenv('PDF_RASTER_DPI', '100'))
+        self.raster_max_pixels = int(float(os.getenv('PDF_RASTER_MAX_MEGAPIXELS', '4')) * 1000 * 1000)
+        self.raster_workers = int(os.getenv('PDF_RASTER_WORKERS', '2'))
+        self.raster_memory_limit = int(os.getenv('PDF_RASTER_MEMORY_MB', '1024')) * 1024 * 1024
+
+    def iter_pages(self, pdf_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict]:
+        """Lazily yield non-empty pages as they are extracted"""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            num_pages = len(pdf_reader.pages)
+            end = num_pages if end is None else min(end, num_pages)
+            yield from _iter_reader_pages(pdf_reader, start, end)
+
+    def _iter_pages_parallel(self, pdf_path: str, num_pages: int) -> Iterator[Dict]:
+        """Yield pages in order while page ranges are extracted across a process pool"""
+        ranges = [(start, min(start + self.pages_per_task, num_pages))
+                  for start in range(0, num_pages, self.pages_per_task)]
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(ranges)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
+            try:
+                for future in futures:
+                    yield from future.result()
+            finally:
+                # Stop queued ranges once the caller has enough text
+                for future in futures:
+                    future.cancel()
+
+    def extract_content(self, pdf_path: str, max_chars: Optional[int] = None,
+                        max_pages: Optional[int] = None) -> Dict:
+        """Extract text and metadata from PDF
+
+        Extraction stops as soon as max_chars of text or max_pages pages have
+        been read, so callers that only need the start of a document never pay
+        for the rest of it.
+        """
         try:
+            started = time.perf_counter()
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                
+
                 # Extract metadata
                 metadata = {
                     'num_pages': len(pdf_reader.pages),
                     'title': pdf_reader.metadata.title if pdf_reader.metadata else 'Untitled',
                 }
-                
-                # Extract text from all pages
-                text_content = []
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        text_content.append({
-                            'page': page_num + 1,
-                            'text': text.strip()
-                        })
-                
-                logger.info(f"Extracted {len(text_content)} pages from PDF")
-                
-                return {
-                    'metadata': metadata,
-                    'content': text_content,
-                    'total_text': ' '.join([p['text'] for p in text_content])
-                }
-        
+
+            page_limit = metadata['num_pages']
+            for limit in (max_pages, self.max_pages):
+                if limit:
+                    page_limit = min(page_limit, limit)
+
+            # Budgeted reads stop early and stay serial; full reads of big documents fan out
+            parallel = (max_chars is None and self.workers > 1
+                        and page_limit >= self.parallel_min_pages)
+            if parallel:
+                pages = self._iter_pages_parallel(pdf_path, page_limit)
+            else:
+                pages = self.iter_pages(pdf_path, 0, page_limit)
+
+            text_content = []
+            total_chars = 0
+            truncated = False
+            try:
+                for page in pages:
+                    text_content.append(page)
+                    total_chars += len(page['text']) + 1
+                    if max_chars is not None and total_chars >= max_chars:
+                        truncated = page['page'] < page_limit
+                        break
+            finally:
+                pages.close()
+
+            metadata['pages_read'] = text_content[-1]['page'] if truncated else page_limit
+            metadata['truncated'] = truncated or page_limit < metadata['num_pages']
+            metadata['extract_seconds'] = round(time.perf_counter() - started, 4)
+
+            logger.info(f"Extracted {len(text_content)} pages from PDF"
+                        f"{' (stopped at text budget)' if truncated else ''}")
+
+            return {
+                'metadata': metadata,
+                'content': text_content,
+                'total_text': ' '.join([p['text'] for p in text_content])
+            }
+
         except Exception as e:
             logger.error(f"PDF extraction error: {str(e)}")
             raise Exception(f"Failed to extract PDF content: {str(e)}")
+
+    def select_pages(self, pdf_path: str, count: int) -> List[int]:
+        """Pages worth showing, in order: the title page, then pages that contain images"""
+        pages = [1]
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            num_pages = len(pdf_reader.pages)
+            if self.max_pages:
+                num_pages = min(num_pages, self.max_pages)
+            for page_num in range(1, num_pages):
+                if len(pages) >= count:
+                    break
+                try:
+                    # Only the resource dictionary is read, not the page content
+                    resources = pdf_reader.pages[page_num].get('/Resources')
+                    xobjects = resources.get_object().get('/XObject') if resources is not None else None
+                    if xobjects is None:
+                        continue
+                    xobjects = xobjects.get_object()
+                    if any(xobjects[name].get_object().get('/Subtype') == '/Image' for name in xobjects):
+                        pages.append(page_num + 1)
+                except Exception:
+                    continue
+        return pages[:count]
+
+    def rasterize_pages(self, pdf_path: str, pages: List[int], output_dir: str, pdf_hash: str = None,
+                        cache: Optional[ResultCache] = None) -> Dict[int, str]:
+        """Render pages to PNG files, returning the path of each page that succeeded
+
+        Pages are rendered one per task in a small process pool whose workers
+        have a capped address space, with no more tasks in flight than workers,
+        so a large document or an oversized page cannot exhaust memory. Rasters
+        are cached by (pdf hash, page, dpi).
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        results = {}
+        pending = []
+        for page in pages:
+            path = os.path.join(output_dir, f"page_{page:04d}.png")
+            key = ResultCache.make_key('raster', pdf_hash, page, self.raster_dpi, self.raster_max_pixels)
+            if cache and pdf_hash and cache.get_file('raster', key, path, '.png'):
+                results[page] = path
+            else:
+                pending.append((page, path, key))
+        if not pending:
+            return results
+
+        try:
+            import pdf2image  # noqa: F401
+        except ImportError:
+            logger.warning("pdf2image is not installed, skipping page backgrounds")
+            return results
+
+        started = time.perf_counter()
+        workers = max(1, min(self.raster_workers, len(pending)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_limit_memory, initargs=(self.raster_memory_limit,)) as executor:
+            in_flight = {}
+            queue = list(pending)
+            while queue or in_flight:
+                # Stream pages through the pool instead of queueing the whole document
+                while queue and len(in_flight) < workers:
+                    page, path, key = queue.pop(0)
+                    future = executor.submit(_rasterize_page, pdf_path, page, self.raster_dpi,
+                                             self.raster_max_pixels, path)
+                    in_flight[future] = (page, path, key)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page, path, key = in_flight.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.warning(f"Rasterizing page {page} failed: {str(e)}")
+                        continue
+                    results[page] = path
+                    if cache and pdf_hash:
+                        cache.put_file('raster', key, path, '.png')
+
+        logger.info(f"Rasterized {len(results)} of {len(pages)} pages at {self.raster_dpi} dpi "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return results
@@ -0,0 +1,333 @@
+import os
+import shutil
+import logging
+from functools import partial
+from multiprocessing import util
+from services.render_profiles import DRAFT_PROFILE, get_render_profile
+from services.result_cache import ResultCache, create_result_cache
+from services.upload_manager import read_pdf_hash
+from services.metrics import Trace, get_metrics
+from services.storage import DRAFT, OUTPUT, get_storage
+from services.narration import create_narrator
+from services.script import Script, ScriptError
+from services.memory import PeakMemory
+
+logger = logging.getLogger(__name__)
+
+# PDF, AI and video modules (PyPDF2, openai, numpy, PIL, moviepy) are imported
+# on first use, so the web tier can import run_job without loading them
+
+# Services are created once per worker process and reused across jobs
+_services = None
+
+
+def get_services() -> dict:
+    """Return the processing services for this process, creating them on first use"""
+    global _services
+    if _services is None:
+        from services.pdf_processor import PDFProcessor
+        from services.ai_transformer import AITransformer
+        cache = create_result_cache()
+        _services = {
+            'pdf_processor': PDFProcessor(),
+            'ai_transformer': AITransformer(),
+            'video_generators': {},
+            'result_cache': cache,
+            'narrator': create_narrator(cache),
+        }
+        # Render worker processes skip atexit; this finalizer runs before the pool queues close
+        util.Finalize(None, close_services, exitpriority=100)
+    return _services
+
+
+def close_services() -> None:
+    """Release worker pools held by this process's services"""
+    global _services
+    from services.video_generator import close_segment_pool
+    close_segment_pool()
+    _services = None
+
+
+def get_video_generator(profile_name: str = None):
+    """Return this process's generator for a render profile"""
+    from services.video_generator import VideoGenerator
+    generators = get_services()['video_generators']
+    profile = get_render_profile(profile_name)
+    if profile['name'] not in generators:
+        generators[profile['name']] = VideoGenerator(profile=profile)
+    return generators[profile['name']]
+
+
+def warm_up() -> None:
+    """Create this process's services and default generator before the first job
+
+    Render workers call this once at start, so fonts, API clients and imports
+    are loaded while the worker is idle rather than inside a job.
+    """
+    get_services()
+    get_video_generator()
+
+
+def draft_output_name(session_id: str) -> str:
+    """Output name of the quick draft rendered ahead of the requested profile"""
+    return f"{session_id}_draft"
+
+
+def _noop_progress(stage: str, percent: float) -> None:
+    pass
+
+
+def run_job(session_id: str, payload: dict, progress=None) -> dict:
+    """Run extraction, AI transformation and video generation for one session"""
+    # Peak RSS of this worker and its ffmpeg and scene worker children during the job
+    with PeakMemory() as memory:
+        result = _run_job(session_id, payload, progress)
+    # None where RSS cannot be read (no /proc)
+    result['peak_rss_mb'] = round(memory.peak / (1024 * 1024), 1) if memory.peak else None
+    if memory.peak:
+        logger.info(f"Peak memory for session {session_id}: {result['peak_rss_mb']}MB")
+    return result
+
+
+def _run_job(session_id: str, payload: dict, progress=None) -> dict:
+    from services.video_generator import script_scenes
+    progress = progress or _noop_progress
+    # Job workers pass a JobProgress, whose detail events stream to /events
+    on_event = getattr(progress, 'event', None)
+    services = get_services()
+
+    storage = get_storage()
+    pdf_path = storage.upload_path(session_id, create=False)
+    if not os.path.exists(pdf_path):
+        raise Exception("PDF not found. Please upload again.")
+
+    requirements = payload.get('requirements') or 'Create an engaging video'
+    cache = services['result_cache']
+    metrics = get_metrics()
+    trace = Trace(metrics)
+    pdf_hash = None
+    if cache:
+        # Uploads record their hash as they stream in; older files are hashed here
+        with trace.span('hash'):
+            pdf_hash = read_pdf_hash(pdf_path) or ResultCache.hash_file(pdf_path)
+    metrics.inc('pdfvideo_bytes_processed_total', os.path.getsize(pdf_path))
+
+    logger.info(f"Starting processing for session: {session_id}")
+
+    edited_script = payload.get('script')
+    if edited_script is not None:
+        # A script edited by the client replaces extraction and the AI transform
+        logger.info(f"Rendering an edited script for session: {session_id}")
+        progress('transforming', 20)
+        transformed_content = {'script': Script.from_dict(edited_script).to_dict(), 'edited': True}
+    else:
+        transformed_content = _generate_script(session_id, pdf_path, pdf_hash, requirements, cache, trace,
+                                               progress, on_event)
+
+    # Step 3: Synthesize narration; scene lengths follow the audio
+    narration = None
+    narrator = services['narrator']
+    audio_dir = os.path.join(storage.output_dir, 'audio', session_id)
+    if narrator:
+        logger.info(f"Step 3/4: Synthesizing narration")
+        progress('narrating', 28)
+        try:
+            with trace.span('narrate'):
+                narration = narrator.narrate(script_scenes(transformed_content), audio_dir)
+        except Exception as e:
+            # Narration is an extra; the video is still rendered without it
+            logger.error(f"Narration failed: {str(e)}")
+
+    # Optionally rasterize the title page and figure pages as scene backgrounds
+    backgrounds = None
+    pdf_processor = services['pdf_processor']
+    pages_dir = os.path.join(storage.output_dir, 'pages', session_id)
+    if pdf_processor.page_backgrounds:
+        progress('rasterizing', 30)
+        try:
+            with trace.span('rasterize'):
+                scene_count = len(script_scenes(transformed_content))
+                pages = pdf_processor.select_pages(pdf_path, scene_count)
+                images = pdf_processor.rasterize_pages(pdf_path, pages, pages_dir, pdf_hash, cache)
+            # Scenes take the rendered pages in document order; the rest keep their gradient
+            backgrounds = [
+                {'path': images[page], 'page': page, 'dpi': pdf_processor.raster_dpi, 'pdf_hash': pdf_hash}
+                for page in pages if page in images
+            ] or None
+        except Exception as e:
+            # Backgrounds are an extra; the video is still rendered on gradients
+            logger.warning(f"Page rasterization failed: {str(e)}")
+
+    try:
+        result = _render_videos(session_id, payload, transformed_content, narration, cache, trace, progress,
+                                backgrounds, on_event)
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+        shutil.rmtree(pages_dir, ignore_errors=True)
+
+    # The script is returned so a client can edit it and re-render (POST /script)
+    try:
+        result['script'] = Script.from_content(transformed_content).to_dict()
+    except ScriptError:
+        pass
+    progress('completed', 100)
+    metrics.flush()
+    return result
+
+
+def extract_key(pdf_hash: str, max_chars, pdf_processor) -> str:
+    """Cache key of an extraction, which depends on how much text and how many pages are read"""
+    return ResultCache.make_key('extract', pdf_hash, max_chars, pdf_processor.max_pages)
+
+
+def _generate_script(session_id: str, pdf_path: str, pdf_hash: str, requirements: str, cache, trace: Trace,
+                     progress, on_event=None) -> dict:
+    """Steps 1 and 2: extract the PDF and transform it into a script"""
+    services = get_services()
+    metrics = get_metrics()
+
+    # Step 1: Extract content from PDF
+    logger.info(f"Step 1/4: Extracting content from PDF")
+    progress('extracting', 5)
+    # Only as much text as the transformer will use is extracted
+    max_chars = services['ai_transformer'].text_budget
+    extract_cache_key = extract_key(pdf_hash, max_chars, services['pdf_processor']) if cache else None
+    extracted_content = cache.get_json('extract', extract_cache_key) if cache else None
+    if extracted_content is not None:
+        logger.info(f"Using cached extraction for session: {session_id}")
+    else:
+        try:
+            with trace.span('extract'):
+                extracted_content = services['pdf_processor'].extract_content(pdf_path, max_chars=max_chars)
+            metrics.inc('pdfvideo_pages_processed_total', extracted_content['metadata'].get('pages_read', 0))
+            logger.info(f"Extracted {len(extracted_content.get('content', []))} pages")
+        except Exception as e:
+            logger.error(f"PDF extraction failed: {str(e)}")
+            raise Exception(f"Failed to extract PDF content: {str(e)}")
+        if cache:
+            cache.put_json('extract', extract_cache_key, extracted_content)
+
+    # Step 2: Transform content using AI
+    logger.info(f"Step 2/4: Transforming content with AI")
+    progress('transforming', 20)
+    transform_key = None
+    transformed_content = None
+    if cache:
+        transform_key = ResultCache.make_key(
+            'transform', pdf_hash, ResultCache.normalize_text(requirements),
+            services['ai_transformer'].cache_settings()
+        )
+        transformed_content = cache.get_json('transform', transform_key)
+    if transformed_content is not None:
+        logger.info(f"Using cached script for session: {session_id}")
+    else:
+        try:
+            with trace.span('transform'):
+                transformed_content = services['ai_transformer'].transform_content(
+                    extracted_content,
+                    requirements,
+                    on_event=on_event
+                )
+            logger.info("AI transformation completed")
+            # Fallback scripts come from transient AI failures and are not cached
+            if cache and not transformed_content.get('fallback'):
+                cache.put_json('transform', transform_key, transformed_content)
+        except Exception as e:
+            logger.error(f"AI transformation failed: {str(e)}")
+            # Continue with fallback even if AI fails
+            transformed_content = {
+                'script': 'Generated video from PDF',
+                'source_pages': extracted_content.get('metadata', {}).get('num_pages', 0)
+            }
+    return transformed_content
+
+
+def _render_videos(session_id: str, payload: dict, transformed_content: dict, narration: list,
+                   cache, trace: Trace, progress, backgrounds: list = None, on_event=None) -> dict:
+    """Step 4: render the optional draft and the requested profile"""
+    storage = get_storage()
+    profile = get_render_profile(payload.get('profile'))
+    draft_first = payload.get('draft', os.getenv('RENDER_DRAFT_FIRST', 'true').lower() == 'true')
+    draft_first = draft_first and profile['name'] != DRAFT_PROFILE
+    result = {'profile': profile['name']}
+
+    if draft_first:
+        # A cheap low-resolution render the client can watch while the final one is made
+        logger.info(f"Step 4/4: Generating draft video")
+        progress('rendering_draft', 35)
+        draft_path, _ = _render_video(transformed_content, session_id, DRAFT, DRAFT_PROFILE,
+                                      cache, trace, prefix='draft_', narration=narration,
+                                      backgrounds=backgrounds, on_event=on_event)
+        result['draft_path'] = draft_path
+        progress('draft_ready', 50)
+    else:
+        # A draft left over from an earlier run would not match this script
+        storage.forget(session_id, DRAFT)
+
+    logger.info(f"Step 4/4: Generating {profile['name']} video")
+    progress('rendering', 55 if draft_first else 45)
+    report = {}
+    video_path, cached = _render_video(transformed_content, session_id, OUTPUT, profile['name'], cache, trace,
+                                       narration=narration, backgrounds=backgrounds, on_event=on_event,
+                                       report=report)
+
+    result.update(video_path=video_path, timings=trace.timings)
+    if cached:
+        result['cached'] = True
+    if report.get('downgraded'):
+        result['downgraded'] = report['downgraded']
+    return result
+
+
+def _render_video(transformed_content: dict, session_id: str, kind: str, profile_name: str,
+                  cache, trace: Trace, prefix: str = '', narration: list = None,
+                  backgrounds: list = None, on_event=None, report: dict = None) -> tuple:
+    """Render (or fetch from the cache) one video, index it and return (path, cached)
+
+    report, if given, is filled with the video generator's render report.
+    """
+    storage = get_storage()
+    generator = get_video_generator(profile_name)
+    output_name = draft_output_name(session_id) if kind == DRAFT else session_id
+    video_path = storage.output_path(output_name)
+    video_key = None
+    if cache:
+        video_key = ResultCache.make_key(
+            'video', transformed_content.get('script'), generator.render_settings(),
+            [clip['key'] if clip else None for clip in narration] if narration else None,
+            [[background['pdf_hash'], background['page'], background['dpi']] for background in backgrounds] if backgrounds else None
+        )
+        if cache.get_file('video', video_key, video_path, '.mp4'):
+            logger.info(f"Using cached {profile_name} video: {video_path}")
+            storage.register(session_id, kind, video_path)
+            return video_path, True
+    try:
+        report = report if report is not None else {}
+        with trace.span(f"{prefix}render"):
+            video_path = generator.create_video(
+                transformed_content,
+                output_name,
+                report=report,
+                narration=narration,
+                backgrounds=backgrounds,
+                segment_cache=cache,
+                # Events name the profile, so a client can tell the draft from the final render
+                on_event=partial(on_event, profile=profile_name) if on_event else None
+            )
+        logger.info(f"Video generated successfully: {video_path}")
+    except Exception as e:
+        logger.error(f"Video generation failed: {str(e)}")
+        raise Exception(f"Failed to generate video: {str(e)}")
+
+    # Sub-step times were already observed by the video generator
+    for stage, seconds in report.get('timings', {}).items():
+        trace.add(f"{prefix}{stage}", seconds, observe=False)
+
+    # A video whose narration could not be added is not cached as the narrated one,
+    # nor one rendered smaller to fit the memory budget as the full-size one
+    if cache and not report['fallback'] and video_path.endswith('.mp4') and (report['narrated'] or not narration) \
+            and 'resolution' not in report.get('downgraded', {}):
+        cache.put_file('video', video_key, video_path, '.mp4')
+
+    storage.register(session_id, kind, video_path)
+    return video_path, False
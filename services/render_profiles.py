@@ -0,0 +1,52 @@
+import os
+from typing import Dict
+
+# Named output presets. Scenes are still frames, so x264 is tuned for stills,
+# keyframes are spaced far apart and quality is held by CRF with a bitrate cap.
+RENDER_PROFILES = {
+    'draft': {
+        'width': 854,
+        'height': 480,
+        'fps': 15,
+        'crf': 30,
+        'preset': 'ultrafast',
+        'maxrate': '600k',
+        'bufsize': '1200k',
+        'keyframe_seconds': 10,
+    },
+    'preview': {
+        'width': 1280,
+        'height': 720,
+        'fps': 20,
+        'crf': 26,
+        'preset': 'veryfast',
+        'maxrate': '1500k',
+        'bufsize': '3M',
+        'keyframe_seconds': 10,
+    },
+    'final': {
+        'width': 1920,
+        'height': 1080,
+        'fps': 30,
+        'crf': 21,
+        'preset': 'veryfast',
+        'maxrate': '5M',
+        'bufsize': '10M',
+        'keyframe_seconds': 10,
+    },
+}
+
+DRAFT_PROFILE = 'draft'
+
+
+def default_profile_name() -> str:
+    """Profile used when a request does not name one"""
+    return os.getenv('DEFAULT_RENDER_PROFILE', 'preview')
+
+
+def get_render_profile(name: str = None) -> Dict:
+    """Return a copy of the named profile with its name included"""
+    name = name or default_profile_name()
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {name}. Choose one of {', '.join(RENDER_PROFILES)}")
+    return dict(RENDER_PROFILES[name], name=name)
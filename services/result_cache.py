@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+from services.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """On-disk, content-addressed cache for pipeline stage results"""
+
+    def __init__(self, root: str = 'cache', max_bytes: int = 2 * 1024 ** 3,
+                 max_age_seconds: float = 7 * 24 * 3600, evict_interval: float = 60):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+        """SHA-256 of a file's contents"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Collapse whitespace so trivially different inputs share a key"""
+        return ' '.join((text or '').split())
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable key from JSON-serializable stage inputs"""
+        encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, stage: str, key: str, ext: str) -> str:
+        return os.path.join(self.root, stage, key[:2], f"{key}{ext}")
+
+    def _record(self, stage: str, hit: bool) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(stage, {'hits': 0, 'misses': 0})
+            counters['hits' if hit else 'misses'] += 1
+        get_metrics().inc('pdfvideo_cache_requests_total', stage=stage, result='hit' if hit else 'miss')
+
+    def _touch(self, path: str) -> None:
+        # mtime doubles as the last-access time for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _write_atomic(self, path: str, write) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get_json(self, stage: str, key: str) -> Optional[Any]:
+        """Return a cached JSON value, or None on a miss"""
+        path = self._path(stage, key, '.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                value = json.load(file)
+        except (OSError, ValueError):
+            self._record(stage, False)
+            return None
+        self._touch(path)
+        self._record(stage, True)
+        return value
+
+    def put_json(self, stage: str, key: str, value: Any) -> None:
+        """Store a JSON-serializable value"""
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(value, file)
+        self._write_atomic(self._path(stage, key, '.json'), write)
+        self._maybe_evict()
+
+    def get_file(self, stage: str, key: str, dest_path: str, ext: str = '') -> bool:
+        """Materialize a cached file at dest_path; returns False on a miss"""
+        path = self._path(stage, key, ext)
+        if not os.path.exists(path):
+            self._record(stage, False)
+            return False
+        try:
+            # A copy rather than a hard link, since outputs get rewritten in place
+            shutil.copyfile(path, dest_path)
+        except OSError as e:
+            logger.warning(f"Cache read failed for {stage}/{key}: {str(e)}")
+            self._record(stage, False)
+            return False
+        self._touch(path)
+        self._record(stage, True)
+        return True
+
+    def put_file(self, stage: str, key: str, src_path: str, ext: str = '') -> None:
+        """Store a copy of a file"""
+        self._write_atomic(self._path(stage, key, ext), lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+        self._maybe_evict()
+
+    def _maybe_evict(self) -> None:
+        now = time.time()
+        if now - self._last_evict >= self.evict_interval:
+            self._last_evict = now
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop entries past max age, then least recently used ones until under max size"""
+        entries = []
+        now = time.time()
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age_seconds:
+                    removed += self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+
+        if removed:
+            logger.info(f"Evicted {removed} cache entries")
+        return removed
+
+    def _remove(self, path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters per stage for this process"""
+        with self._lock:
+            return {stage: dict(counters) for stage, counters in self._stats.items()}
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """Build the result cache from environment settings, or None if disabled"""
+    if os.getenv('CACHE_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    return ResultCache(
+        root=os.getenv('CACHE_DIR', 'cache'),
+        max_bytes=int(float(os.getenv('CACHE_MAX_MB', '2048')) * 1024 * 1024),
+        max_age_seconds=float(os.getenv('CACHE_MAX_AGE_HOURS', '168')) * 3600
+    )
@@ -0,0 +1,224 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bounds that keep a model's script renderable
+MAX_SCENES = 12
+MIN_SCENE_SECONDS = 1.0
+MAX_SCENE_SECONDS = 30.0
+DEFAULT_SCENE_SECONDS = 4.0
+MAX_NARRATION_CHARS = 1000
+
+# JSON schema of a script, used for OpenAI function calling
+SCRIPT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string'},
+        'scenes': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'scene_number': {'type': 'integer'},
+                    'narration': {'type': 'string'},
+                    'visual_description': {'type': 'string'},
+                    'duration_seconds': {'type': 'number'},
+                },
+                'required': ['narration'],
+            },
+        },
+    },
+    'required': ['title', 'scenes'],
+}
+
+_FENCE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.DOTALL)
+
+
+class ScriptError(ValueError):
+    """A script that cannot be rendered"""
+
+
+class Scene:
+    """One scene of a video script"""
+
+    __slots__ = ('scene_number', 'narration', 'visual_description', 'duration_seconds', 'audio_seconds')
+
+    def __init__(self, scene_number: int, narration: str, visual_description: str = '',
+                 duration_seconds: float = DEFAULT_SCENE_SECONDS, audio_seconds: Optional[float] = None):
+        self.scene_number = scene_number
+        self.narration = narration
+        self.visual_description = visual_description
+        self.duration_seconds = duration_seconds
+        # Length of the scene's narration clip (lead and pause included), which overrides duration_seconds
+        self.audio_seconds = audio_seconds
+
+    @classmethod
+    def from_dict(cls, data: Any, scene_number: int) -> Optional['Scene']:
+        """Coerce one scene from model output; None when it has nothing to show"""
+        if isinstance(data, str):
+            data = {'narration': data}
+        if not isinstance(data, dict):
+            return None
+        narration = ' '.join(str(data.get('narration') or '').split())[:MAX_NARRATION_CHARS]
+        if not narration:
+            return None
+        try:
+            duration = float(data.get('duration_seconds', DEFAULT_SCENE_SECONDS))
+        except (TypeError, ValueError):
+            duration = DEFAULT_SCENE_SECONDS
+        if duration != duration:  # NaN
+            duration = DEFAULT_SCENE_SECONDS
+        return cls(
+            scene_number=scene_number,
+            narration=narration,
+            visual_description=' '.join(str(data.get('visual_description') or '').split()),
+            duration_seconds=min(max(duration, MIN_SCENE_SECONDS), MAX_SCENE_SECONDS),
+        )
+
+    def to_dict(self) -> Dict:
+        data = {
+            'scene_number': self.scene_number,
+            'narration': self.narration,
+            'visual_description': self.visual_description,
+            'duration_seconds': self.duration_seconds,
+        }
+        if self.audio_seconds is not None:
+            data['audio_seconds'] = self.audio_seconds
+        return data
+
+    def with_audio(self, seconds: float) -> 'Scene':
+        """Copy of the scene timed to a narration clip"""
+        return Scene(self.scene_number, self.narration, self.visual_description, self.duration_seconds, seconds)
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+    def __eq__(self, other):
+        return isinstance(other, Scene) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Scene({self.scene_number}, {self.narration[:30]!r}, {self.duration_seconds}s)"
+
+
+class Script:
+    """A validated video script: a title and one or more scenes"""
+
+    __slots__ = ('title', 'scenes')
+
+    def __init__(self, title: str, scenes: List[Scene]):
+        self.title = title
+        self.scenes = scenes
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Script':
+        """Validate a decoded script, dropping unusable scenes and renumbering the rest"""
+        if isinstance(data, list):
+            data = {'scenes': data}
+        if not isinstance(data, dict):
+            raise ScriptError(f"Expected a JSON object, got {type(data).__name__}")
+        raw_scenes = data.get('scenes')
+        if not isinstance(raw_scenes, list):
+            raise ScriptError("Script has no 'scenes' list")
+        scenes = []
+        for raw in raw_scenes[:MAX_SCENES]:
+            scene = Scene.from_dict(raw, len(scenes) + 1)
+            if scene is not None:
+                scenes.append(scene)
+        if not scenes:
+            raise ScriptError("Script has no scenes with narration")
+        title = ' '.join(str(data.get('title') or '').split()) or 'Video'
+        return cls(title, scenes)
+
+    @classmethod
+    def parse(cls, text: str) -> 'Script':
+        """Validate a script from raw model output"""
+        return cls.from_dict(extract_json(text))
+
+    @classmethod
+    def from_content(cls, transformed_content: Dict) -> 'Script':
+        """Script of a transform result, which holds a dict or (from older caches) raw text"""
+        script = transformed_content.get('script')
+        if isinstance(script, str):
+            return cls.parse(script)
+        return cls.from_dict(script)
+
+    def to_dict(self) -> Dict:
+        return {'title': self.title, 'scenes': [scene.to_dict() for scene in self.scenes]}
+
+
+def _candidates(text: str) -> List[str]:
+    """The text inside code fences first, then the text itself"""
+    fenced = [match.group(1) for match in _FENCE.finditer(text) if match.group(1).strip()]
+    return fenced + [text]
+
+
+def _salvage(text: str) -> Optional[Dict]:
+    """Recover the complete scenes of a script cut off mid-way, e.g. by max_tokens"""
+    match = re.search(r'"scenes"\s*:\s*\[', text)
+    if not match:
+        return None
+    decoder = json.JSONDecoder()
+    scenes = []
+    position = match.end()
+    while True:
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(text) or text[position] == ']':
+            break
+        try:
+            scene, position = decoder.raw_decode(text, position)
+        except ValueError:
+            # The first incomplete element ends what can be used
+            break
+        scenes.append(scene)
+    if not scenes:
+        return None
+    title = None
+    title_match = re.search(r'"title"\s*:\s*', text)
+    if title_match:
+        try:
+            title, _ = decoder.raw_decode(text, title_match.end())
+        except ValueError:
+            pass
+    logger.warning(f"Recovered {len(scenes)} scenes from an incomplete script")
+    return {'title': title if isinstance(title, str) else None, 'scenes': scenes}
+
+
+def extract_json(text: str) -> Any:
+    """Find the script JSON in model output
+
+    Accepts bare JSON, JSON in code fences or surrounded by prose, and output
+    truncated part way through the scene list. Objects are decoded in place
+    from each opening brace, so surrounding text never needs cleaning up.
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise ScriptError("Empty response")
+    decoder = json.JSONDecoder()
+    first = None
+    for candidate in _candidates(text):
+        position = candidate.find('{')
+        while position != -1:
+            try:
+                value, _ = decoder.raw_decode(candidate, position)
+            except ValueError:
+                value = None
+            if isinstance(value, dict):
+                if 'scenes' in value:
+                    return value
+                if first is None:
+                    first = value
+            position = candidate.find('{', position + 1)
+    for candidate in _candidates(text):
+        salvaged = _salvage(candidate)
+        if salvaged is not None:
+            return salvaged
+    if first is not None:
+        return first
+    raise ScriptError("No JSON object found in the response")
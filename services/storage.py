@@ -0,0 +1,323 @@
+import os
+import re
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+UPLOAD = 'upload'
+OUTPUT = 'output'
+DRAFT = 'draft'
+
+# Per-session working directories under outputs/ that jobs remove when they finish
+SCRATCH_DIRS = ('segments', 'audio', 'pages')
+
+# Session files written by older versions directly into uploads/ and outputs/
+_LEGACY_NAME = re.compile(r'^([0-9a-f-]{36})(_draft)?\.(pdf|mp4|png)$')
+
+
+class StorageManager:
+    """Sharded layout and SQLite index for session uploads and outputs
+
+    Files live under uploads/<ab>/ and outputs/<ab>/, where ab is the first two
+    characters of the session id, so no directory grows past a few hundred
+    entries. The index records size, creation and last access per file, which
+    lets /status answer without touching the filesystem and lets the reaper
+    evict whole sessions by age and by least recent use.
+    """
+
+    def __init__(self, db_path: str = 'data/storage.db', upload_dir: str = 'uploads',
+                 output_dir: str = 'outputs', ttl_seconds: Optional[float] = 72 * 3600,
+                 max_bytes: Optional[int] = 20 * 1024 ** 3, min_age_seconds: float = 900,
+                 touch_interval: float = 60, scratch_ttl_seconds: Optional[float] = 6 * 3600):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.output_dir = output_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # Sessions used this recently are never evicted, so in-flight jobs keep their files
+        self.min_age_seconds = min_age_seconds
+        # Access times are only rewritten this often to keep polling cheap
+        self.touch_interval = touch_interval
+        # Scratch directories left behind by killed jobs are not indexed and are swept by age alone
+        self.scratch_ttl_seconds = scratch_ttl_seconds
+        self._reaper = None
+        self._stop_event = None
+
+        for directory in (upload_dir, output_dir, os.path.dirname(db_path)):
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS files_session ON files (session_id, kind)')
+            conn.execute('CREATE INDEX IF NOT EXISTS files_accessed ON files (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        # A fresh connection per call keeps the manager safe to use from any process or thread
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def shard(name: str) -> str:
+        return name[:2] or '_'
+
+    def upload_path(self, session_id: str, create: bool = True) -> str:
+        """Location of a session's PDF"""
+        return self._sharded(self.upload_dir, f"{session_id}.pdf", create)
+
+    def output_path(self, name: str, ext: str = 'mp4', create: bool = True) -> str:
+        """Location of an output file; name is the session id, optionally with a suffix"""
+        return self._sharded(self.output_dir, f"{name}.{ext}", create)
+
+    def _sharded(self, root: str, filename: str, create: bool) -> str:
+        directory = os.path.join(root, self.shard(filename))
+        if create:
+            os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def register(self, session_id: str, kind: str, path: str) -> None:
+        """Record a finished file in the index, replacing an earlier file of the same kind"""
+        now = time.time()
+        size = os.path.getsize(path)
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            replaced = conn.execute('SELECT path FROM files WHERE session_id = ? AND kind = ? AND path != ?',
+                                    (session_id, kind, path)).fetchall()
+            for row in replaced:
+                # e.g. a PNG fallback superseded by an MP4
+                self._remove_file(row['path'])
+            conn.execute('DELETE FROM files WHERE session_id = ? AND kind = ?', (session_id, kind))
+            conn.execute(
+                'INSERT INTO files (path, session_id, kind, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, session_id, kind, size, now, now)
+            )
+            conn.execute('COMMIT')
+
+    def forget(self, session_id: str, kind: str, remove: bool = True) -> None:
+        """Drop one file of a session from the index (and the disk)"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT path FROM files WHERE session_id = ? AND kind = ?',
+                                (session_id, kind)).fetchall()
+            conn.execute('DELETE FROM files WHERE session_id = ? AND kind = ?', (session_id, kind))
+        if remove:
+            for row in rows:
+                self._remove_file(row['path'])
+
+    def lookup(self, session_id: str) -> Dict[str, Dict]:
+        """Indexed files of a session keyed by kind, without touching the filesystem"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT * FROM files WHERE session_id = ?', (session_id,)).fetchall()
+        return {row['kind']: dict(row) for row in rows}
+
+    def touch(self, session_id: str) -> None:
+        """Mark a session as used so the reaper keeps it"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('UPDATE files SET accessed_at = ? WHERE session_id = ? AND accessed_at < ?',
+                         (now, session_id, now - self.touch_interval))
+
+    def usage(self) -> Dict:
+        """Total indexed bytes, files and sessions"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT COALESCE(SUM(size), 0), COUNT(*), COUNT(DISTINCT session_id) FROM files'
+            ).fetchone()
+        return {'bytes': row[0], 'files': row[1], 'sessions': row[2]}
+
+    def delete_session(self, session_id: str) -> int:
+        """Remove every file of a session and return the bytes freed"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT path, size FROM files WHERE session_id = ?', (session_id,)).fetchall()
+            conn.execute('DELETE FROM files WHERE session_id = ?', (session_id,))
+            conn.execute('COMMIT')
+        for row in rows:
+            self._remove_file(row['path'])
+        return sum(row['size'] for row in rows)
+
+    def _remove_file(self, path: str) -> None:
+        # PDFs carry a hash sidecar written during upload
+        for candidate in (path, f"{path}.sha256"):
+            try:
+                os.remove(candidate)
+            except OSError:
+                pass
+
+    def _tree_size(self, path: str) -> int:
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return size
+
+    def sweep_scratch(self, protected: Iterable[str] = ()) -> int:
+        """Remove scratch directories not modified within the scratch TTL and return the bytes freed
+
+        Segments, narration audio and rasterized pages live in
+        outputs/<segments|audio|pages>/<session_id> only while a job runs and
+        are not counted against the quota; a job that is killed before its
+        cleanup leaves them behind, and this is what removes them.
+        """
+        if not self.scratch_ttl_seconds:
+            return 0
+        protected = set(protected)
+        now = time.time()
+        freed = 0
+        for name in SCRATCH_DIRS:
+            try:
+                entries = list(os.scandir(os.path.join(self.output_dir, name)))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if (entry.name in protected or not entry.is_dir()
+                            or now - entry.stat().st_mtime < self.scratch_ttl_seconds):
+                        continue
+                except OSError:
+                    continue
+                freed += self._tree_size(entry.path)
+                shutil.rmtree(entry.path, ignore_errors=True)
+        if freed:
+            logger.info(f"Storage reaper removed {freed} bytes of abandoned scratch files")
+        return freed
+
+    def reap(self, protected: Iterable[str] = ()) -> Dict:
+        """Evict sessions past their TTL, then least recently used sessions until under quota
+
+        Only indexed uploads and outputs count against the quota; abandoned
+        scratch directories are swept by sweep_scratch, and the result cache
+        enforces its own size and age limits.
+        """
+        protected = set(protected)
+        scratch_freed = self.sweep_scratch(protected)
+        now = time.time()
+        expired = []
+        evicted = []
+
+        with self._connect() as conn:
+            sessions = conn.execute(
+                """SELECT session_id, MAX(accessed_at) AS accessed_at, SUM(size) AS size
+                   FROM files GROUP BY session_id ORDER BY accessed_at"""
+            ).fetchall()
+
+        total = sum(row['size'] for row in sessions)
+        freed = 0
+        for row in sessions:
+            session_id = row['session_id']
+            if session_id in protected or now - row['accessed_at'] < self.min_age_seconds:
+                continue
+            if self.ttl_seconds and now - row['accessed_at'] > self.ttl_seconds:
+                expired.append(session_id)
+            elif self.max_bytes and total - freed > self.max_bytes:
+                evicted.append(session_id)
+            else:
+                continue
+            freed += self.delete_session(session_id)
+
+        if expired or evicted:
+            logger.info(f"Storage reaper removed {len(expired)} expired and {len(evicted)} "
+                        f"least recently used sessions, freeing {freed} bytes")
+        return {'expired': len(expired), 'evicted': len(evicted), 'freed_bytes': freed,
+                'scratch_freed_bytes': scratch_freed, 'total_bytes': total - freed}
+
+    def adopt_legacy(self) -> int:
+        """Move session files from the old flat layout into shards and index them"""
+        adopted = 0
+        for root in (self.upload_dir, self.output_dir):
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                match = _LEGACY_NAME.match(entry.name)
+                if not match or not entry.is_file():
+                    continue
+                session_id, draft, ext = match.groups()
+                if ext == 'pdf':
+                    kind, path = UPLOAD, self.upload_path(session_id)
+                else:
+                    kind = DRAFT if draft else OUTPUT
+                    path = self.output_path(f"{session_id}{draft or ''}", ext)
+                try:
+                    os.replace(entry.path, path)
+                except FileNotFoundError:
+                    # Another web worker starting at the same time moved it first
+                    continue
+                if os.path.exists(f"{entry.path}.sha256"):
+                    os.replace(f"{entry.path}.sha256", f"{path}.sha256")
+                self.register(session_id, kind, path)
+                adopted += 1
+        if adopted:
+            logger.info(f"Moved {adopted} files into the sharded storage layout")
+        return adopted
+
+    def start_reaper(self, interval: float = 300, protected: Callable[[], List[str]] = None,
+                     leader: Callable[[], bool] = None) -> None:
+        """Run reap() every interval seconds on a background thread
+
+        With several processes sharing the storage, leader() decides on each
+        round whether this process is the one that reaps.
+        """
+        if self._reaper is not None:
+            return
+        self._stop_event = threading.Event()
+
+        def loop(stop_event):
+            while not stop_event.wait(interval):
+                try:
+                    if leader and not leader():
+                        continue
+                    self.reap(protected() if protected else ())
+                except Exception as e:
+                    logger.error(f"Storage reaper failed: {str(e)}")
+
+        self._reaper = threading.Thread(target=loop, args=(self._stop_event,), name='storage-reaper', daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self._reaper = None
+        self._stop_event = None
+
+
+_storage = None
+
+
+def get_storage() -> StorageManager:
+    """Return the process-wide storage manager"""
+    global _storage
+    if _storage is None:
+        ttl_hours = float(os.getenv('STORAGE_TTL_HOURS', '72'))
+        max_gb = float(os.getenv('STORAGE_MAX_GB', '20'))
+        scratch_hours = float(os.getenv('STORAGE_SCRATCH_TTL_HOURS', '6'))
+        _storage = StorageManager(
+            db_path=os.getenv('STORAGE_DB_PATH', 'data/storage.db'),
+            ttl_seconds=ttl_hours * 3600 if ttl_hours > 0 else None,
+            max_bytes=int(max_gb * 1024 ** 3) if max_gb > 0 else None,
+            scratch_ttl_seconds=scratch_hours * 3600 if scratch_hours > 0 else None,
+        )
+    return _storage
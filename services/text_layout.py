@@ -0,0 +1,128 @@
+import threading
+import functools
+import logging
+from PIL import ImageFont
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Try different font paths for different systems
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/System/Library/Fonts/Arial.ttf",
+    "arial.ttf",
+    "C:/Windows/Fonts/arial.ttf"
+]
+
+
+class FontRegistry:
+    """Process-wide cache of loaded fonts, probed once per size"""
+
+    def __init__(self, font_paths: List[str] = None):
+        self.font_paths = font_paths or FONT_PATHS
+        self._path = None
+        self._resolved = False
+        self._fonts: Dict[int, ImageFont.ImageFont] = {}
+        self._lock = threading.Lock()
+
+    def _resolve_path(self) -> Optional[str]:
+        """Find the first usable font file"""
+        if not self._resolved:
+            for font_path in self.font_paths:
+                try:
+                    ImageFont.truetype(font_path, 12)
+                    self._path = font_path
+                    break
+                except Exception:
+                    continue
+            if self._path is None:
+                logger.warning("No TrueType font found, using PIL default font")
+            self._resolved = True
+        return self._path
+
+    def get(self, size: int) -> ImageFont.ImageFont:
+        """Return the font at the given size, loading it on first use"""
+        font = self._fonts.get(size)
+        if font is None:
+            with self._lock:
+                font = self._fonts.get(size)
+                if font is None:
+                    path = self._resolve_path()
+                    try:
+                        font = ImageFont.truetype(path, size) if path else ImageFont.load_default()
+                    except Exception:
+                        font = ImageFont.load_default()
+                    self._fonts[size] = font
+        return font
+
+    def key(self, size: int) -> Tuple[Optional[str], int]:
+        """Hashable identity of a font for layout caching"""
+        return (self._resolve_path(), size)
+
+    def preload(self, sizes: List[int]) -> None:
+        """Load fonts ahead of the first frame"""
+        for size in sizes:
+            self.get(size)
+
+
+_font_registry = None
+
+
+def get_font_registry() -> FontRegistry:
+    """Return the process-wide font registry"""
+    global _font_registry
+    if _font_registry is None:
+        _font_registry = FontRegistry()
+    return _font_registry
+
+
+class TextLayout:
+    """Word-wraps text using memoized word widths and caches finished layouts"""
+
+    def __init__(self, registry: FontRegistry = None, cache_size: int = 1024, word_cache_size: int = 16384):
+        self.registry = registry or get_font_registry()
+        # Bounded like the layouts: long-lived workers see an open-ended vocabulary
+        self._measure_cached = functools.lru_cache(maxsize=word_cache_size)(self._measure)
+        self._wrap_cached = functools.lru_cache(maxsize=cache_size)(self._wrap)
+
+    def measure(self, word: str, size: int) -> float:
+        """Advance width of a word, measured once per font"""
+        return self._measure_cached(word, self.registry.key(size), size)
+
+    def _measure(self, word: str, font_key: tuple, size: int) -> float:
+        # font_key is unused here but keeps cached widths distinct per font file
+        return self.registry.get(size).getlength(word)
+
+    def wrap(self, text: str, size: int, max_width: int, max_lines: Optional[int] = None) -> Tuple[Tuple[str, float], ...]:
+        """Wrapped lines of text as (line, width) pairs, cached by (text, font, size, width)"""
+        return self._wrap_cached(text, self.registry.key(size), size, max_width, max_lines)
+
+    def _wrap(self, text: str, font_key: tuple, size: int, max_width: int,
+              max_lines: Optional[int]) -> Tuple[Tuple[str, float], ...]:
+        # font_key is unused here but keeps cached layouts distinct per font file
+        space = self.measure(' ', size)
+        lines = []
+        current_line = []
+        current_width = 0.0
+
+        for word in text.split():
+            word_width = self.measure(word, size)
+            # Grow the line by one word instead of re-measuring the whole line
+            test_width = current_width + space + word_width if current_line else word_width
+            if test_width < max_width:
+                current_line.append(word)
+                current_width = test_width
+            else:
+                if current_line:
+                    lines.append((' '.join(current_line), current_width))
+                    current_line = [word]
+                    current_width = word_width
+                else:
+                    lines.append((word, word_width))
+            if max_lines is not None and len(lines) >= max_lines:
+                return tuple(lines[:max_lines])
+
+        if current_line:
+            lines.append((' '.join(current_line), current_width))
+
+        return tuple(lines[:max_lines] if max_lines is not None else lines)
@@ -0,0 +1,161 @@
+import os
+import logging
+import numpy as np
+from typing import Dict, Iterator, List, Optional
+from services.compositor import FrameCompositor
+
+logger = logging.getLogger(__name__)
+
+TRANSITIONS = ('crossfade', 'cut')
+TEXT_REVEALS = ('fade', 'wipe', 'none')
+
+# Width of the soft edge of a wipe, as a fraction of the frame width
+WIPE_SOFTNESS = 0.15
+
+
+class SceneMotion:
+    """Expands a scene still into timed frames, animating only the transition window
+
+    A scene opens with a short window in which the previous scene crossfades
+    into this scene's background and the text is revealed over it. Only the
+    frames of that window are composited, as vectorized blends of frames that
+    already exist; the rest of the scene is the finished still, yielded once
+    with the remaining duration. Ken Burns pan/zoom changes every frame, so
+    its cost does scale with fps x duration and it is off unless enabled.
+    """
+
+    def __init__(self, compositor: FrameCompositor, fps: int, transition: str = 'crossfade',
+                 transition_seconds: float = 0.5, text_reveal: str = 'fade', ken_burns: bool = False,
+                 ken_burns_zoom: float = 0.08):
+        if transition not in TRANSITIONS:
+            raise ValueError(f"Unknown transition: {transition}")
+        if text_reveal not in TEXT_REVEALS:
+            raise ValueError(f"Unknown text reveal: {text_reveal}")
+        self.compositor = compositor
+        self.fps = fps
+        self.transition = transition
+        self.transition_seconds = max(transition_seconds, 0.0)
+        self.text_reveal = text_reveal
+        self.ken_burns = ken_burns
+        self.ken_burns_zoom = ken_burns_zoom
+        # Horizontal position of every column, for the wipe edge
+        self._columns = (np.arange(compositor.width, dtype=np.float32) / compositor.width)[None, :, None]
+
+    @classmethod
+    def from_env(cls, compositor: FrameCompositor, fps: int) -> 'SceneMotion':
+        return cls(
+            compositor, fps,
+            transition=os.getenv('VIDEO_TRANSITION', 'crossfade'),
+            transition_seconds=float(os.getenv('VIDEO_TRANSITION_SECONDS', '0.5')),
+            text_reveal=os.getenv('VIDEO_TEXT_REVEAL', 'fade'),
+            ken_burns=os.getenv('VIDEO_KEN_BURNS', 'false').lower() == 'true',
+        )
+
+    def settings(self) -> Dict:
+        """Settings that change the rendered frames"""
+        return {
+            'transition': self.transition,
+            'transition_seconds': self.transition_seconds,
+            'text_reveal': self.text_reveal,
+            'ken_burns': self.ken_burns,
+            'ken_burns_zoom': self.ken_burns_zoom,
+        }
+
+    def _window_frames(self, duration: float, has_previous: bool) -> int:
+        """Number of animated frames at the start of a scene"""
+        crossfade = has_previous and self.transition == 'crossfade'
+        if not crossfade and self.text_reveal == 'none':
+            return 0
+        window = min(self.transition_seconds, duration / 2)
+        return int(round(window * self.fps))
+
+    def frame_durations(self, duration: float, has_previous: bool) -> List[float]:
+        """Durations of the frames frames() yields for a scene, known before any pixels exist"""
+        if self.ken_burns:
+            count = max(1, int(round(duration * self.fps)))
+            return [duration / count] * count
+        count = self._window_frames(duration, has_previous)
+        if count == 0:
+            return [duration]
+        step = 1 / self.fps
+        return [step] * count + [duration - step * count]
+
+    def _scale_and_center(self, scene_index: int, progress: float) -> tuple:
+        """Ken Burns zoom and pan at a point of the scene, alternating direction per scene"""
+        if scene_index % 2:
+            progress = 1 - progress
+        scale = 1 + self.ken_burns_zoom * progress
+        center = (0.45 + 0.1 * progress, 0.5)
+        return scale, center
+
+    def final_frame(self, still: np.ndarray, scene_index: int) -> np.ndarray:
+        """The last frame shown for a scene, which the next scene crossfades from"""
+        if not self.ken_burns:
+            return still
+        scale, center = self._scale_and_center(scene_index, 1.0)
+        return self.compositor.zoom(still, scale, center)
+
+    def _reveal(self, background: np.ndarray, still: np.ndarray, progress: float, band: slice,
+                out: np.ndarray) -> np.ndarray:
+        # Outside the text band the still equals its background, so only the band is blended
+        np.copyto(out, still)
+        if self.text_reveal == 'wipe':
+            # Soft edge sweeping left to right across the columns
+            edge = progress * (1 + WIPE_SOFTNESS)
+            weight = np.clip((edge - self._columns) / WIPE_SOFTNESS, 0, 1)
+        else:
+            weight = progress
+        self.compositor.blend(background[band], still[band], weight, out[band])
+        return out
+
+    def frames(self, still: np.ndarray, background: np.ndarray, duration: float, scene_index: int,
+               previous: Optional[np.ndarray] = None, reuse_buffers: bool = True) -> Iterator[np.ndarray]:
+        """Yield the frames of one scene, matching frame_durations()
+
+        still is the finished scene frame and background the same frame without
+        text. previous is the final frame of the scene before, if any. With
+        reuse_buffers each composited frame overwrites the last one, so a
+        consumer must be done with a frame before asking for the next.
+        """
+        durations = self.frame_durations(duration, previous is not None)
+        window = self._window_frames(duration, previous is not None)
+        crossfade = previous is not None and self.transition == 'crossfade'
+        reveal = self.text_reveal != 'none'
+        band = self.compositor.changed_rows(background, still) if reveal and window else None
+        if crossfade and window:
+            # Cached gradients are broadcast views; blending is twice as fast from a real buffer
+            background = np.ascontiguousarray(background)
+        work = zoomed = None
+
+        for i in range(len(durations)):
+            if i >= window:
+                if not self.ken_burns:
+                    yield still
+                    continue
+                target, fade_in = still, 1.0
+            else:
+                if work is None or not reuse_buffers:
+                    work = self.compositor.new_buffer()
+                # Progress through the window, excluding both ends which equal the stills
+                progress = (i + 1) / (window + 1)
+                if crossfade and reveal:
+                    # First half fades to the bare background, second half reveals the text
+                    if progress < 0.5:
+                        target, fade_in = background, progress * 2
+                    else:
+                        target, fade_in = self._reveal(background, still, progress * 2 - 1, band, work), 1.0
+                elif crossfade:
+                    target, fade_in = still, progress
+                else:
+                    target, fade_in = self._reveal(background, still, progress, band, work), 1.0
+
+            if self.ken_burns:
+                if zoomed is None or not reuse_buffers:
+                    zoomed = self.compositor.new_buffer()
+                scale, center = self._scale_and_center(scene_index, (i + 1) / len(durations))
+                target = self.compositor.zoom(target, scale, center, zoomed)
+            if fade_in < 1.0:
+                if work is None or not reuse_buffers:
+                    work = self.compositor.new_buffer()
+                target = self.compositor.blend(previous, target, fade_in, work)
+            yield target
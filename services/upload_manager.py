@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NEED_DATA
+from services.storage import UPLOAD
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+
+
+class UploadError(Exception):
+    """Upload request that cannot be accepted; status is the HTTP status to return"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def read_pdf_hash(pdf_path: str) -> Optional[str]:
+    """SHA-256 recorded for an uploaded PDF, if one was computed during upload"""
+    try:
+        with open(f"{pdf_path}.sha256", 'r') as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+class MultipartReader:
+    """Reads a multipart/form-data body one part at a time, straight from the request stream
+
+    Unlike request.files, nothing is spooled to memory or a temporary file
+    first: parts() yields each part's (name, filename) and read() returns
+    that part's bytes as they arrive, so a file part can be handed to
+    UploadManager.save_stream like any other stream. A part that is not read
+    is skipped when the next one is requested.
+    """
+
+    def __init__(self, stream, boundary: bytes, block_size: int = 1024 * 1024):
+        self.stream = stream
+        self.block_size = block_size
+        self._decoder = MultipartDecoder(boundary)
+        # The decoder can take a line break for data when its buffer ends a few bytes after a
+        # boundary, so a line break this close to the end of what was read waits for more bytes
+        self._holdback = len(boundary) + 8
+        self._pending = b''
+        self._buffer = b''
+        self._part_done = True
+
+    def _next_event(self):
+        try:
+            while True:
+                event = self._decoder.next_event()
+                if event is not NEED_DATA:
+                    return event
+                self._feed()
+        except RequestEntityTooLarge:
+            raise UploadError("Request body is too large", 413)
+        except ValueError:
+            raise UploadError("Malformed multipart request")
+
+    def _feed(self) -> None:
+        block = self.stream.read(self.block_size)
+        if not block:
+            # An empty read marks the end of the body for the decoder
+            if self._pending:
+                self._decoder.receive_data(self._pending)
+                self._pending = b''
+            self._decoder.receive_data(None)
+            return
+        data = self._pending + block
+        cut = len(data)
+        for position in range(max(len(data) - self._holdback, 0), len(data)):
+            if data[position] in b'\r\n':
+                cut = position
+                break
+        self._pending = data[cut:]
+        if cut:
+            self._decoder.receive_data(data[:cut])
+
+    def parts(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """Yield (name, filename) for each part; filename is None for plain form fields"""
+        while True:
+            self.skip()
+            event = self._next_event()
+            if isinstance(event, (File, Field)):
+                self._buffer = b''
+                self._part_done = False
+                yield event.name, event.filename if isinstance(event, File) else None
+            elif isinstance(event, Epilogue):
+                return
+
+    def read(self, size: int = -1) -> bytes:
+        """Up to size bytes of the current part, or b'' at its end"""
+        while not self._part_done and (size < 0 or len(self._buffer) < size):
+            event = self._next_event()
+            if isinstance(event, Data):
+                self._buffer += event.data
+                self._part_done = not event.more_data
+        if size < 0:
+            size = len(self._buffer)
+        block, self._buffer = self._buffer[:size], self._buffer[size:]
+        return block
+
+    def skip(self) -> None:
+        """Discard the rest of the current part"""
+        while not self._part_done:
+            self.read(self.block_size)
+        self._buffer = b''
+
+
+class UploadManager:
+    """Streams uploads to disk in fixed-size blocks, hashing as bytes arrive
+
+    Chunked uploads are resumable: the partial file on disk is the source of
+    truth for the offset, so an interrupted client asks for the offset and
+    continues from there, even against a different worker process.
+    """
+
+    def __init__(self, upload_dir: str = 'uploads', block_size: int = 1024 * 1024,
+                 max_size: int = 50 * 1024 * 1024, stale_after: float = 24 * 3600, storage=None):
+        self.upload_dir = upload_dir
+        # Optional StorageManager that places finished PDFs and indexes them
+        self.storage = storage
+        self.partial_dir = os.path.join(upload_dir, 'partial')
+        self.block_size = block_size
+        self.max_size = max_size
+        self.stale_after = stale_after
+        # Running hashes for uploads this process has seen, keyed by upload_id
+        self._hashers: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.partial_dir, exist_ok=True)
+
+    def _pdf_path(self, session_id: str) -> str:
+        if self.storage:
+            return self.storage.upload_path(session_id)
+        return os.path.join(self.upload_dir, f"{session_id}.pdf")
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self.partial_dir, f"{upload_id}.part")
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.partial_dir, f"{upload_id}.json")
+
+    def _load_meta(self, upload_id: str) -> Dict:
+        try:
+            uuid.UUID(upload_id)
+            with open(self._meta_path(upload_id), 'r') as file:
+                return json.load(file)
+        except (ValueError, OSError):
+            raise UploadError("Upload not found", 404)
+
+    @contextmanager
+    def _locked(self, upload_id: str):
+        """Serialize writers to one upload across threads and processes"""
+        with open(self._data_path(upload_id), 'ab') as file:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield file
+            finally:
+                if fcntl:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def _hasher_at(self, upload_id: str, offset: int):
+        """Hash state for the first offset bytes, rebuilt from disk if this process lacks it"""
+        with self._lock:
+            state = self._hashers.get(upload_id)
+        if state is not None and state['offset'] == offset:
+            return state['hasher']
+
+        hasher = hashlib.sha256()
+        remaining = offset
+        with open(self._data_path(upload_id), 'rb') as file:
+            while remaining > 0:
+                block = file.read(min(self.block_size, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def _check_header(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            head = file.read(len(PDF_MAGIC))
+        if len(head) == len(PDF_MAGIC) and head != PDF_MAGIC:
+            raise UploadError("File is not a PDF")
+
+    def create(self, filename: str = '', total_size: Optional[int] = None) -> Dict:
+        """Start a chunked upload"""
+        if total_size is not None and total_size > self.max_size:
+            raise UploadError(f"File exceeds maximum size of {self.max_size} bytes", 413)
+        self.expire_stale()
+
+        upload_id = str(uuid.uuid4())
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'total_size': total_size,
+            'created_at': time.time(),
+        }
+        with open(self._meta_path(upload_id), 'w') as file:
+            json.dump(meta, file)
+        open(self._data_path(upload_id), 'wb').close()
+
+        logger.info(f"Chunked upload started: {upload_id}")
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> Dict:
+        """Current offset of an upload, used by clients to resume"""
+        meta = self._load_meta(upload_id)
+        offset = os.path.getsize(self._data_path(upload_id))
+        return {
+            'upload_id': upload_id,
+            'offset': offset,
+            'total_size': meta.get('total_size'),
+            'block_size': self.block_size,
+            'complete': meta.get('total_size') is not None and offset >= meta['total_size'],
+        }
+
+    def append(self, upload_id: str, stream, offset: int) -> Dict:
+        """Append bytes read from stream at offset, which must match the stored size"""
+        meta = self._load_meta(upload_id)
+        limit = meta.get('total_size') or self.max_size
+
+        with self._locked(upload_id) as file:
+            current = os.path.getsize(self._data_path(upload_id))
+            if offset != current:
+                raise UploadError(f"Offset mismatch: upload is at {current}", 409)
+
+            hasher = self._hasher_at(upload_id, current)
+            written = current
+            try:
+                while True:
+                    block = stream.read(self.block_size)
+                    if not block:
+                        break
+                    if written + len(block) > limit:
+                        raise UploadError(f"Upload exceeds declared size of {limit} bytes", 413)
+                    file.write(block)
+                    hasher.update(block)
+                    written += len(block)
+            finally:
+                file.flush()
+                with self._lock:
+                    self._hashers[upload_id] = {'hasher': hasher, 'offset': written}
+
+        # Reject non-PDF data as soon as the header has arrived
+        if current < len(PDF_MAGIC) <= written:
+            try:
+                self._check_header(self._data_path(upload_id))
+            except UploadError:
+                self.abort(upload_id)
+                raise
+
+        return self.status(upload_id)
+
+    def complete(self, upload_id: str, session_id: Optional[str] = None) -> Dict:
+        """Finish a chunked upload and move it into place as a session PDF"""
+        meta = self._load_meta(upload_id)
+        data_path = self._data_path(upload_id)
+
+        with self._locked(upload_id):
+            size = os.path.getsize(data_path)
+            if meta.get('total_size') is not None and size != meta['total_size']:
+                raise UploadError(f"Upload incomplete: {size} of {meta['total_size']} bytes", 409)
+            if size < len(PDF_MAGIC):
+                raise UploadError("File is not a PDF")
+            self._check_header(data_path)
+
+            sha256 = self._hasher_at(upload_id, size).hexdigest()
+            session_id = session_id or str(uuid.uuid4())
+            pdf_path = self._pdf_path(session_id)
+            os.replace(data_path, pdf_path)
+
+        self._write_hash(pdf_path, sha256)
+        self._register(session_id, pdf_path)
+        self._forget(upload_id)
+
+        logger.info(f"Chunked upload completed: {upload_id} -> {session_id}")
+        return {'session_id': session_id, 'sha256': sha256, 'size': size, 'filename': meta.get('filename')}
+
+    def save_stream(self, stream, session_id: str) -> Dict:
+        """Save a complete upload stream in blocks, validating and hashing on the way
+
+        The PDF header is checked against every byte received until all of it
+        has arrived, however the stream splits it across reads.
+        """
+        pdf_path = self._pdf_path(session_id)
+        tmp_path = f"{pdf_path}.tmp"
+        hasher = hashlib.sha256()
+        size = 0
+        head = b''
+        try:
+            with open(tmp_path, 'wb') as file:
+                while True:
+                    block = stream.read(self.block_size)
+                    if not block:
+                        break
+                    if len(head) < len(PDF_MAGIC):
+                        head = (head + block)[:len(PDF_MAGIC)]
+                        if not PDF_MAGIC.startswith(head):
+                            raise UploadError("File is not a PDF")
+                    size += len(block)
+                    if size > self.max_size:
+                        raise UploadError(f"File exceeds maximum size of {self.max_size} bytes", 413)
+                    file.write(block)
+                    hasher.update(block)
+            if size < len(PDF_MAGIC):
+                raise UploadError("File is not a PDF")
+            os.replace(tmp_path, pdf_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        sha256 = hasher.hexdigest()
+        self._write_hash(pdf_path, sha256)
+        self._register(session_id, pdf_path)
+        return {'session_id': session_id, 'sha256': sha256, 'size': size}
+
+    def abort(self, upload_id: str) -> None:
+        """Discard a chunked upload"""
+        for path in (self._data_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._forget(upload_id)
+
+    def expire_stale(self) -> int:
+        """Remove chunked uploads that have not been touched for stale_after seconds"""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.partial_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            data_path = self._data_path(upload_id)
+            try:
+                last_touched = os.path.getmtime(data_path if os.path.exists(data_path) else self._meta_path(upload_id))
+            except OSError:
+                continue
+            if now - last_touched > self.stale_after:
+                self.abort(upload_id)
+                removed += 1
+        return removed
+
+    def _write_hash(self, pdf_path: str, sha256: str) -> None:
+        with open(f"{pdf_path}.sha256", 'w') as file:
+            file.write(sha256)
+
+    def _register(self, session_id: str, pdf_path: str) -> None:
+        if self.storage:
+            self.storage.register(session_id, UPLOAD, pdf_path)
+
+    def _forget(self, upload_id: str) -> None:
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        try:
+            os.remove(self._meta_path(upload_id))
+        except OSError:
+            pass
@@ -1,20 +1,146 @@
 import os
-from moviepy.editor import *
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import numpy as np
 import logging
-import json
 import random
+import time
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from services.compositor import FrameCompositor
+from services.encoder import FFmpegEncoder, profile_params
+from services.render_profiles import get_render_profile
+from services.text_layout import TextLayout, get_font_registry
+from services.transitions import SceneMotion
+from services.narration import scene_seconds, write_track
+from services.script import Scene, Script, ScriptError
+from services.metrics import Trace, get_metrics
+from services.storage import get_storage
+from services.result_cache import ResultCache
+from services.memory import fit_render, memory_budget
 
 logger = logging.getLogger(__name__)
 
+# Scene worker pool shared by every generator in this process
+_segment_pool = None
+_segment_pool_workers = 0
+
+# Generators reused by scene segment worker processes, keyed by profile
+_segment_generators = {}
+
+
+def _get_segment_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the scene worker pool, kept warm across videos"""
+    global _segment_pool, _segment_pool_workers
+    if _segment_pool is None or _segment_pool_workers != workers:
+        close_segment_pool()
+        _segment_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        _segment_pool_workers = workers
+    return _segment_pool
+
+
+def close_segment_pool(wait: bool = True) -> None:
+    """Shut down the scene worker pool"""
+    global _segment_pool
+    if _segment_pool is not None:
+        _segment_pool.shutdown(wait=wait, cancel_futures=True)
+        _segment_pool = None
+
+
+def _render_segment(scene: Scene, scene_index: int, duration: float, segment_path: str, profile: dict,
+                    frame_mode: str = 'cfr', motion: dict = None, previous_scene: Scene = None,
+                    image: str = None, previous_image: str = None) -> tuple:
+    """Render and encode one scene as a standalone segment (runs in a worker process)
+
+    The previous scene's still is rebuilt here so the opening crossfade can
+    start from it. Returns the segment path and the time spent in each sub-step.
+    """
+    key = tuple(sorted(profile.items()))
+    generator = _segment_generators.get(key)
+    if generator is None:
+        generator = VideoGenerator(encoder='ffmpeg', profile=profile)
+        _segment_generators[key] = generator
+    if motion is not None:
+        generator.motion = SceneMotion(generator.compositor, generator.fps, **motion)
+    trace = Trace()
+    with trace.span('scene_frame'):
+        frame = generator._create_scene_frame(scene, scene_index, image=image)
+        previous = None
+        if previous_scene is not None and generator.motion.transition != 'cut':
+            previous = generator.motion.final_frame(
+                generator._create_scene_frame(previous_scene, scene_index - 1, image=previous_image),
+                scene_index - 1)
+    durations = generator.motion.frame_durations(duration, previous is not None)
+    background = generator._scene_background(scene_index, image)
+    frames = generator._timed(
+        generator.motion.frames(frame, background, duration, scene_index, previous),
+        trace
+    )
+    encoder = FFmpegEncoder.from_profile(generator.profile, frame_mode=frame_mode)
+    started = time.perf_counter()
+    encoder.encode_stills(durations, frames, segment_path, keyframes=[0.0])
+    trace.add('encode', time.perf_counter() - started - trace.timings.get('transition', 0.0))
+    trace.registry.flush()
+    return segment_path, trace.timings
+
+
+def script_scenes(transformed_content: dict) -> list:
+    """Validated scenes of a transformed script, with a default scene when it has none"""
+    try:
+        return Script.from_content(transformed_content).scenes
+    except ScriptError as e:
+        logger.warning(f"Script is not usable, rendering a default scene: {str(e)}")
+        # Create default scene from content
+        content_text = str(transformed_content).replace('{', '').replace('}', '')[:100]
+        return [Scene(1, content_text or 'Generated video from PDF content', 'Title scene', 5)]
+
+
 class VideoGenerator:
     """Generates videos from transformed content"""
     
-    def __init__(self):
-        self.width = 1920
-        self.height = 1080
-        self.fps = 30
+    def __init__(self, encoder: str = None, profile=None, width: int = None, height: int = None):
+        # Resolution, frame rate and x264 settings come from a named render profile
+        self.profile = dict(profile) if isinstance(profile, dict) else get_render_profile(profile)
+        if width and height:
+            self.profile.update(width=width, height=height)
+        self.width = self.profile['width']
+        self.height = self.profile['height']
+        self.fps = self.profile['fps']
+        self.compositor = FrameCompositor(self.width, self.height)
+        
+        # Text is laid out for 1080p and scaled to the profile's height
+        scale = self.height / 1080
+        self.text_size = round(60 * scale)
+        self.title_size = round(80 * scale)
+        self.line_height = round(80 * scale)
+        self.text_margin = round(200 * scale)
+        
+        # Fonts are loaded once per process; wrapped layouts are memoized
+        self.fonts = get_font_registry()
+        self.fonts.preload([self.text_size, self.title_size])
+        self.layout = TextLayout(self.fonts)
+        
+        # 'ffmpeg' streams stills straight into ffmpeg, 'moviepy' uses ImageClip
+        self.encoder = encoder or os.getenv('VIDEO_ENCODER', 'ffmpeg')
+        # 'vfr' encodes each scene still once; 'cfr' repeats it at the profile's fps
+        self.frame_mode = os.getenv('VIDEO_FRAME_MODE', 'vfr')
+        # Crossfades, text reveal and optional Ken Burns motion at scene starts
+        self.motion = SceneMotion.from_env(self.compositor, self.fps)
+        
+        # Scenes are encoded as independent segments across this many processes
+        self.scene_workers = int(os.getenv('RENDER_SCENE_WORKERS', str(os.cpu_count() or 1)))
+        # Cache encoded segments by scene fingerprint so re-renders only encode changed scenes
+        self.reuse_segments = os.getenv('RENDER_REUSE_SEGMENTS', 'true').lower() == 'true'
+        
+        # Renders that would exceed the memory budget run on a downgraded copy of this generator
+        self.memory_budget = memory_budget()
+        self._downgrades = {}
+        if self.profile.get('low_memory'):
+            self.compositor.max_images = 2
         
         # Creative color schemes
         self.color_schemes = [
@@ -25,258 +151,461 @@ class VideoGenerator:
             {'bg': (255, 69, 0), 'accent': (138, 43, 226)},    # Red Orange + Blue Violet
         ]
     
-    def create_video(self, transformed_content: dict, session_id: str) -> str:
-        """Create video from transformed content with robust error handling"""
+    def render_settings(self) -> dict:
+        """Settings that change the rendered output for a given script"""
+        return {
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'profile': self.profile,
+            'encoder': self.encoder,
+            'frame_mode': self.frame_mode,
+            'motion': self.motion.settings(),
+            'color_schemes': self.color_schemes,
+        }
+    
+    def create_video(self, transformed_content: dict, session_id: str, report: dict = None,
+                     narration: list = None, backgrounds: list = None, on_event=None,
+                     segment_cache: ResultCache = None) -> str:
+        """Create video from transformed content with robust error handling
+        
+        If a report dict is given it is filled with details of the render,
+        including whether the generic fallback video was produced. narration
+        holds one audio clip (or None) per scene; scenes then last as long as
+        their clip and the clips are muxed in as the audio track. backgrounds
+        holds one rasterized page (or None) per scene to show behind the text.
+        on_event, if given, is called as on_event('scene', scene=, scenes=) as
+        scenes finish and on_event('encoder', frames=, total=) as frames reach
+        ffmpeg. With a segment_cache, scenes are encoded as segments and those
+        unchanged since an earlier render are reused instead of rendered.
+        A render estimated to exceed the memory budget is downgraded and
+        report['downgraded'] says how.
+        """
+        report = report if report is not None else {}
+        generator = self._fit_memory(report)
+        if generator is not self:
+            return generator.create_video(transformed_content, session_id, report, narration, backgrounds,
+                                          on_event, segment_cache)
+        report['fallback'] = False
+        report['narrated'] = False
+        trace = Trace()
+        report['timings'] = trace.timings
         try:
-            output_path = f"outputs/{session_id}.mp4"
+            output_path = get_storage().output_path(session_id)
             
-            # Parse script
-            script = transformed_content.get('script', {})
-            if isinstance(script, str):
-                try:
-                    script = json.loads(script)
-                except:
-                    script = {'title': 'Video', 'scenes': []}
-            
-            scenes = script.get('scenes', [])
-            if not scenes:
-                # Create default scene from content
-                content_text = str(transformed_content).replace('{', '').replace('}', '')[:100]
-                scenes = [{
-                    'scene_number': 1,
-                    'narration': content_text or 'Generated video from PDF content',
-                    'visual_description': 'Title scene',
-                    'duration_seconds': 5
-                }]
+            scenes = script_scenes(transformed_content)
+            if narration:
+                scenes = [scene.with_audio(scene_seconds(clip)) if clip else scene
+                          for scene, clip in zip(scenes, narration)]
             
             logger.info(f"Creating video with {len(scenes)} scenes")
+            report['scenes'] = len(scenes)
+            images = [(background or {}).get('path') for background in (backgrounds or [])]
+            images += [None] * (len(scenes) - len(images))
+            # Rasterized pages are temporary files; segments are keyed by what they show
+            image_ids = [[background['pdf_hash'], background['page'], background['dpi']]
+                         if background and 'pdf_hash' in background else (background or {}).get('path')
+                         for background in (backgrounds or [])]
+            image_ids += [None] * (len(scenes) - len(image_ids))
+            reuse = segment_cache is not None and self.reuse_segments
             
             # Try simple approach first
             try:
-                return self._create_simple_video(scenes, session_id)
+                if self.encoder == 'ffmpeg':
+                    if (self.scene_workers > 1 or reuse) and len(scenes) > 1:
+                        try:
+                            output_path = self._create_segmented_video(
+                                scenes, session_id, trace, images, on_event,
+                                segment_cache=segment_cache if reuse else None, image_ids=image_ids, report=report)
+                        except (BrokenProcessPool, MemoryError) as memory_error:
+                            # Usually a scene worker killed for memory; one serial encoder needs far less
+                            logger.warning(f"Segmented render failed, rendering serially: {str(memory_error)}")
+                            report['downgraded'] = dict(report.get('downgraded') or {},
+                                                        scene_workers=f"{self.scene_workers} -> 1")
+                            get_metrics().inc('pdfvideo_renders_downgraded_total', change='scene_workers')
+                            output_path = self._create_streamed_video(scenes, session_id, trace, images, on_event)
+                    else:
+                        output_path = self._create_streamed_video(scenes, session_id, trace, images, on_event)
+                else:
+                    output_path = self._create_simple_video(scenes, session_id, trace, images, on_event)
+                if narration and output_path.endswith('.mp4'):
+                    try:
+                        with trace.span('mux'):
+                            report['narrated'] = self._add_narration(scenes, narration, output_path)
+                    except Exception as mux_error:
+                        # A silent video is still better than the fallback
+                        logger.warning(f"Adding narration failed: {str(mux_error)}")
+                self._record_output(scenes)
+                return output_path
             except Exception as simple_error:
                 logger.warning(f"Simple video creation failed: {str(simple_error)}")
                 # Try fallback approach
+                report['fallback'] = True
                 return self._create_fallback_video(session_id)
         
         except Exception as e:
             logger.error(f"Video generation error: {str(e)}")
+            report['fallback'] = True
             return self._create_fallback_video(session_id)
     
-    def _create_simple_video(self, scenes: list, session_id: str) -> str:
-        """Create video with minimal MoviePy usage"""
-        output_path = f"outputs/{session_id}.mp4"
+    def _fit_memory(self, report: dict) -> 'VideoGenerator':
+        """This generator, or a downgraded copy whose render fits the memory budget"""
+        if not self.memory_budget:
+            return self
+        profile, scene_workers, changes = fit_render(self.profile, self.scene_workers, self.memory_budget)
+        if not changes:
+            return self
+        report['downgraded'] = changes
+        logger.warning(f"Render downgraded to fit the {self.memory_budget // (1024 * 1024)}MB memory budget: "
+                       f"{', '.join(f'{change} {detail}' for change, detail in changes.items())}")
+        for change in changes:
+            get_metrics().inc('pdfvideo_renders_downgraded_total', change=change)
+        key = (profile['width'], profile['height'], bool(profile.get('low_memory')), scene_workers)
+        generator = self._downgrades.get(key)
+        if generator is None:
+            generator = VideoGenerator(self.encoder, profile=profile)
+            generator.scene_workers = scene_workers
+            generator.memory_budget = None
+            self._downgrades[key] = generator
+        return generator
+    
+    def _record_output(self, scenes: list) -> None:
+        """Count the scenes and frames of a finished render"""
+        metrics = get_metrics()
+        metrics.inc('pdfvideo_scenes_rendered_total', len(scenes))
+        durations, _ = self._timeline([(scene, self._scene_duration(scene)) for scene in scenes])
+        if self.encoder == 'ffmpeg':
+            frames = FFmpegEncoder.from_profile(self.profile, frame_mode=self.frame_mode).frames_encoded(durations)
+        else:
+            frames = sum(round(duration * self.fps) for duration in durations)
+        metrics.inc('pdfvideo_frames_rendered_total', frames)
+    
+    def _scene_duration(self, scene: Scene) -> float:
+        """Scene duration in seconds, capped to keep videos short unless narration sets it"""
+        if scene.audio_seconds:
+            return scene.audio_seconds
+        return min(scene.duration_seconds, 6)  # Max 6 seconds
+    
+    def _add_narration(self, scenes: list, narration: list, output_path: str) -> bool:
+        """Lay the narration clips out to the scene timing and mux them into the video"""
+        track_path = f"{output_path}.narration.wav"
+        try:
+            if not write_track(narration, [self._scene_duration(scene) for scene in scenes], track_path):
+                return False
+            FFmpegEncoder.from_profile(self.profile).mux_audio(output_path, track_path)
+            return True
+        finally:
+            if os.path.exists(track_path):
+                os.remove(track_path)
+    
+    def _timeline(self, planned: list) -> tuple:
+        """Durations of every frame of the video and the start time of each scene"""
+        durations = []
+        keyframes = []
+        elapsed = 0.0
+        for i, (scene, duration) in enumerate(planned):
+            keyframes.append(elapsed)
+            if scene is None:
+                durations.append(duration)
+            else:
+                durations.extend(self.motion.frame_durations(duration, i > 0 and self.motion.transition != 'cut'))
+            elapsed += duration
+        return durations, keyframes
+    
+    def _scene_background(self, scene_index: int, image: str = None) -> np.ndarray:
+        """A scene's background without text, which the text reveal starts from"""
+        colors = self.color_schemes[scene_index % len(self.color_schemes)]
+        if image:
+            try:
+                return self.compositor.image_background(image, colors['bg'], colors['accent'])
+            except Exception as e:
+                logger.warning(f"Page background {image} could not be used: {str(e)}")
+        return self.compositor.gradient(colors['bg'], colors['accent'])
+    
+    def _timed(self, frames, trace: Trace):
+        """Pass a scene's frames through, adding the time spent producing them to the 'transition' stage"""
+        frames = iter(frames)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    frame = next(frames)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield frame
+        finally:
+            # One sample per scene, not per frame
+            trace.add('transition', elapsed)
+    
+    def _scene_frames(self, planned: list, trace: Trace, reuse_buffers: bool = True, images: list = None,
+                      on_event=None):
+        """Yield every frame of the video in order, matching _timeline()"""
+        previous = None
+        images = images or [None] * len(planned)
+        for i, (scene, duration) in enumerate(planned):
+            if scene is None:
+                with trace.span('scene_frame'):
+                    frame = self._create_default_frame()
+                yield frame
+                continue
+            with trace.span('scene_frame'):
+                still = self._create_scene_frame(scene, i, image=images[i])
+            if self.motion.transition == 'cut':
+                previous = None
+            background = self._scene_background(i, images[i])
+            frames = self.motion.frames(still, background, duration, i, previous, reuse_buffers)
+            yield from self._timed(frames, trace)
+            previous = self.motion.final_frame(still, i)
+            if on_event:
+                on_event('scene', force=i + 1 == len(planned), scene=i + 1, scenes=len(planned))
+    
+    def scene_fingerprint(self, scenes: list, index: int, image_ids: list = None) -> str:
+        """Key of everything that changes one scene's encoded segment
+        
+        A scene's segment depends on its own text, timing, color scheme and
+        background, on the render settings, and (through the opening
+        crossfade) on the scene before it.
+        """
+        image_ids = image_ids or [None] * len(scenes)
+        
+        def inputs(i):
+            scene = scenes[i]
+            # Ken Burns alternates its pan direction with the scene position
+            return [scene.narration, scene.visual_description, self._scene_duration(scene),
+                    i % len(self.color_schemes), i % 2 if self.motion.ken_burns else None, image_ids[i]]
+        
+        crossfades_in = index > 0 and self.motion.transition != 'cut'
+        return ResultCache.make_key('segment', self.render_settings(), inputs(index),
+                                    inputs(index - 1) if crossfades_in else None)
+    
+    def _create_segmented_video(self, scenes: list, session_id: str, trace: Trace = None, images: list = None,
+                                on_event=None, segment_cache: ResultCache = None, image_ids: list = None,
+                                report: dict = None) -> str:
+        """Render scenes as segments (in parallel) and join them without re-encoding
         
-        # Create frames for each scene
-        frames = []
-        total_duration = 0
+        With a segment_cache, segments whose fingerprint is unchanged since an
+        earlier render are copied from the cache, so an edited script only
+        renders the scenes that changed.
+        """
+        output_path = get_storage().output_path(session_id)
+        segment_dir = os.path.join(get_storage().output_dir, 'segments', session_id)
+        os.makedirs(segment_dir, exist_ok=True)
+        images = images or [None] * len(scenes)
+        segment_paths = [os.path.join(segment_dir, f"scene_{i:03d}.mp4") for i in range(len(scenes))]
+        keys = [self.scene_fingerprint(scenes, i, image_ids) for i in range(len(scenes))] if segment_cache else None
         
-        for i, scene in enumerate(scenes[:2]):  # Limit to 2 scenes for stability
-            duration = min(scene.get('duration_seconds', 4), 6)  # Max 6 seconds
-            total_duration += duration
+        def arguments(i):
+            return (scenes[i], i, self._scene_duration(scenes[i]), segment_paths[i], self.profile, self.frame_mode,
+                    self.motion.settings(), scenes[i - 1] if i > 0 else None,
+                    images[i], images[i - 1] if i > 0 else None)
+        
+        try:
+            pending = []
+            for i in range(len(scenes)):
+                if keys and segment_cache.get_file('segment', keys[i], segment_paths[i], '.mp4'):
+                    continue
+                pending.append(i)
+            reused = len(scenes) - len(pending)
+            if report is not None:
+                report['segments_reused'] = reused
+                report['segments_rendered'] = len(pending)
+            if reused:
+                logger.info(f"Reusing {reused} of {len(scenes)} unchanged scene segments")
             
-            # Create frame image
-            frame_img = self._create_scene_frame(scene, i)
-            frames.append((frame_img, duration))
-        
-        # Ensure we have at least one frame
-        if not frames:
-            frame_img = self._create_default_frame()
-            frames.append((frame_img, 3))
-            total_duration = 3
-        
-        # Create video clips
-        clips = []
-        for frame_img, duration in frames:
-            try:
-                # Convert PIL image to numpy array
-                frame_array = np.array(frame_img)
-                
-                # Create ImageClip
-                clip = ImageClip(frame_array).set_duration(duration)
-                clips.append(clip)
-            except Exception as clip_error:
-                logger.warning(f"Failed to create clip: {str(clip_error)}")
-                continue
+            done = reused
+            if self.scene_workers > 1 and len(pending) > 1:
+                pool = _get_segment_pool(self.scene_workers)
+                futures = [pool.submit(_render_segment, *arguments(i)) for i in pending]
+                try:
+                    # Segments finish out of order; report each as it lands
+                    for future in as_completed(futures):
+                        future.result()
+                        done += 1
+                        if on_event:
+                            on_event('scene', force=done == len(scenes), scene=done, scenes=len(scenes))
+                    results = [future.result() for future in futures]
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            else:
+                results = []
+                for i in pending:
+                    results.append(_render_segment(*arguments(i)))
+                    done += 1
+                    if on_event:
+                        on_event('scene', force=done == len(scenes), scene=done, scenes=len(scenes))
+            
+            for i, (segment_path, timings) in zip(pending, results):
+                if keys:
+                    segment_cache.put_file('segment', keys[i], segment_path, '.mp4')
+                if trace:
+                    # Workers observe their own histograms; only sum the per-job totals here
+                    for stage, seconds in timings.items():
+                        trace.add(stage, seconds, observe=False)
+            
+            started = time.perf_counter()
+            FFmpegEncoder.from_profile(self.profile).concat_segments(
+                segment_paths, output_path, [self._scene_duration(scene) for scene in scenes])
+            if trace:
+                trace.add('concat', time.perf_counter() - started)
+        except BrokenProcessPool:
+            # A crashed worker leaves the pool unusable; start fresh next time
+            close_segment_pool(wait=False)
+            raise
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
         
-        if not clips:
-            raise Exception("No clips created successfully")
+        logger.info(f"Segmented video created from {len(scenes)} scenes: {output_path}")
+        return output_path
+    
+    def _create_streamed_video(self, scenes: list, session_id: str, trace: Trace = None, images: list = None,
+                               on_event=None) -> str:
+        """Create video by piping scene stills and transition frames into ffmpeg"""
+        output_path = get_storage().output_path(session_id)
+        trace = trace or Trace()
         
-        # Concatenate clips
-        if len(clips) == 1:
-            final_video = clips[0]
-        else:
-            final_video = concatenate_videoclips(clips, method="compose")
+        planned = [(scene, self._scene_duration(scene)) for scene in scenes]
+        if not planned:
+            planned = [(None, 3)]
+        durations, keyframes = self._timeline(planned)
+        
+        # Built lazily so only the current frames are alive while ffmpeg consumes them
+        frames = self._scene_frames(planned, trace, images=images, on_event=on_event)
+        encoder = FFmpegEncoder.from_profile(self.profile, frame_mode=self.frame_mode)
+        built_before = trace.timings.get('scene_frame', 0.0) + trace.timings.get('transition', 0.0)
+        started = time.perf_counter()
+        on_progress = None
+        if on_event:
+            def on_progress(piped, total):
+                on_event('encoder', force=piped == total, frames=piped, total=total)
+        encoder.encode_stills(durations, frames, output_path, keyframes=keyframes, on_progress=on_progress)
+        # Frames are built while ffmpeg runs; encode time excludes them
+        built = trace.timings.get('scene_frame', 0.0) + trace.timings.get('transition', 0.0) - built_before
+        trace.add('encode', time.perf_counter() - started - built)
+        
+        logger.info(f"Streamed video created successfully: {output_path}")
+        return output_path
+    
+    def _create_simple_video(self, scenes: list, session_id: str, trace: Trace = None, images: list = None,
+                             on_event=None) -> str:
+        """Create video with minimal MoviePy usage"""
+        output_path = get_storage().output_path(session_id)
+        trace = trace or Trace()
+        
+        planned = [(scene, self._scene_duration(scene)) for scene in scenes]
+        if not planned:
+            # Ensure we have at least one frame
+            planned = [(None, 3)]
+        durations, _ = self._timeline(planned)
+        starts = np.cumsum([0.0] + durations[:-1])
+        
+        # Frames are built only when moviepy asks for them, so like the streamed path this holds
+        # one scene's buffers at a time instead of an array (and a clip) for every frame
+        state = {'frames': None, 'index': -1, 'frame': None}
+        
+        def make_frame(t):
+            index = max(int(np.searchsorted(starts, t + 1e-6, side='right')) - 1, 0)
+            if state['frames'] is None or index < state['index']:
+                # moviepy reads forward; a seek backwards starts the frames over
+                state['frames'] = self._scene_frames(planned, trace, images=images, on_event=on_event)
+                state['index'] = -1
+            while state['index'] < index:
+                state['frame'] = next(state['frames'])
+                state['index'] += 1
+            return state['frame']
+        
+        # Only this path and the fallback use moviepy, so it is not imported with the module
+        from moviepy.video.VideoClip import VideoClip
+        final_video = VideoClip(make_frame, duration=sum(durations))
         
         # Write video with very conservative settings
         try:
+            built_before = trace.timings.get('scene_frame', 0.0) + trace.timings.get('transition', 0.0)
+            started = time.perf_counter()
             final_video.write_videofile(
                 output_path,
-                fps=20,  # Lower FPS
+                fps=self.fps,
                 codec='libx264',
                 audio=False,  # No audio to avoid issues
                 verbose=False,
                 logger=None,
-                preset='ultrafast',
-                ffmpeg_params=[
-                    '-pix_fmt', 'yuv420p',  # Ensure compatibility
-                    '-movflags', '+faststart'  # Web optimization
-                ]
+                preset=self.profile['preset'],
+                ffmpeg_params=profile_params(self.profile)
             )
-            
-            # Clean up
-            for clip in clips:
-                clip.close()
-            final_video.close()
+            # Frames are built while moviepy writes; encode time excludes them
+            built = trace.timings.get('scene_frame', 0.0) + trace.timings.get('transition', 0.0) - built_before
+            trace.add('encode', time.perf_counter() - started - built)
             
             logger.info(f"Simple video created successfully: {output_path}")
             return output_path
             
         except Exception as write_error:
             logger.error(f"Video write failed: {str(write_error)}")
-            # Clean up clips
-            for clip in clips:
-                try:
-                    clip.close()
-                except:
-                    pass
-            try:
-                final_video.close()
-            except:
-                pass
             raise write_error
+        finally:
+            final_video.close()
+            state['frames'] = None
     
-    def _create_scene_frame(self, scene: dict, scene_index: int) -> Image.Image:
-        """Create a single scene frame as PIL Image"""
-        # Select color scheme
-        colors = self.color_schemes[scene_index % len(self.color_schemes)]
-        
-        # Create frame
-        img = Image.new('RGB', (self.width, self.height), colors['bg'])
-        draw = ImageDraw.Draw(img)
-        
-        # Add gradient effect
-        for y in range(0, self.height, 4):  # Skip lines for performance
-            alpha = y / self.height
-            r = int(colors['bg'][0] * (1 - alpha) + colors['accent'][0] * alpha)
-            g = int(colors['bg'][1] * (1 - alpha) + colors['accent'][1] * alpha)
-            b = int(colors['bg'][2] * (1 - alpha) + colors['accent'][2] * alpha)
-            draw.rectangle([(0, y), (self.width, y + 4)], fill=(r, g, b))
+    def _create_scene_frame(self, scene: Scene, scene_index: int, out: np.ndarray = None,
+                            image: str = None) -> np.ndarray:
+        """Create a single scene frame as an RGB uint8 array"""
+        # Gradient (or page image) background comes from the compositor cache
+        frame = out if out is not None else self.compositor.new_buffer()
+        np.copyto(frame, self._scene_background(scene_index, image))
         
         # Add text
-        narration = scene.get('narration', '')[:150]  # Limit text length
+        narration = scene.narration[:150]  # Limit text length
+        font = self.fonts.get(self.text_size)
         
-        try:
-            # Try different font paths for different systems
-            font_paths = [
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-                "/System/Library/Fonts/Arial.ttf",
-                "arial.ttf",
-                "C:/Windows/Fonts/arial.ttf"
-            ]
-            font = None
-            for font_path in font_paths:
-                try:
-                    font = ImageFont.truetype(font_path, 60)
-                    break
-                except:
-                    continue
-            
-            if font is None:
-                font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
-        
-        # Calculate text position with word wrapping
-        words = narration.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            bbox = draw.textbbox((0, 0), test_line, font=font)
-            if bbox[2] - bbox[0] < self.width - 200:  # Leave margin
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                else:
-                    lines.append(word)
-        
-        if current_line:
-            lines.append(' '.join(current_line))
-        
-        # Limit to 3 lines
-        lines = lines[:3]
+        # Word wrap with a margin, limited to 3 lines
+        lines = self.layout.wrap(narration, self.text_size, self.width - self.text_margin, max_lines=3)
         
         # Draw text lines
-        total_text_height = len(lines) * 80
+        total_text_height = len(lines) * self.line_height
         start_y = (self.height - total_text_height) // 2
         
-        for i, line in enumerate(lines):
-            bbox = draw.textbbox((0, 0), line, font=font)
-            text_width = bbox[2] - bbox[0]
-            x = (self.width - text_width) // 2
-            y = start_y + i * 80
+        for i, (line, text_width) in enumerate(lines):
+            x = int((self.width - text_width) // 2)
+            y = start_y + i * self.line_height
             
-            # Shadow
-            draw.text((x + 2, y + 2), line, fill=(0, 0, 0, 128), font=font)
-            # Main text
-            draw.text((x, y), line, fill=(255, 255, 255), font=font)
+            # Main text with drop shadow
+            self.compositor.draw_text(frame, line, font, (x, y), fill=(255, 255, 255), shadow=(0, 0, 0))
         
-        return img
+        return frame
     
-    def _create_default_frame(self) -> Image.Image:
-        """Create a default frame"""
-        img = Image.new('RGB', (self.width, self.height), (138, 43, 226))
-        draw = ImageDraw.Draw(img)
+    def _create_default_frame(self, out: np.ndarray = None) -> np.ndarray:
+        """Create a default frame as an RGB uint8 array"""
+        frame = self.compositor.fill_solid((138, 43, 226), out)
         
         text = "Video Generated Successfully"
-        try:
-            font_paths = [
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-                "/System/Library/Fonts/Arial.ttf",
-                "arial.ttf",
-                "C:/Windows/Fonts/arial.ttf"
-            ]
-            font = None
-            for font_path in font_paths:
-                try:
-                    font = ImageFont.truetype(font_path, 80)
-                    break
-                except:
-                    continue
-            
-            if font is None:
-                font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
+        font = self.fonts.get(self.title_size)
         
         # Calculate text position
-        bbox = draw.textbbox((0, 0), text, font=font)
+        bbox = font.getbbox(text)
         text_width = bbox[2] - bbox[0]
         text_height = bbox[3] - bbox[1]
         
         x = (self.width - text_width) // 2
         y = (self.height - text_height) // 2
         
-        draw.text((x, y), text, fill=(255, 255, 255), font=font)
+        self.compositor.draw_text(frame, text, font, (x, y), fill=(255, 255, 255))
         
-        return img
+        return frame
     
     def _create_fallback_video(self, session_id: str) -> str:
         """Create a simple fallback video or image"""
-        output_path = f"outputs/{session_id}.mp4"
+        output_path = get_storage().output_path(session_id)
         
         try:
             # Create simple frame
-            frame_img = self._create_default_frame()
-            
-            # Convert to numpy array
-            frame_array = np.array(frame_img)
+            frame_array = self._create_default_frame()
             
             # Create a simple 3-second video
+            from moviepy.video.VideoClip import ImageClip
             clip = ImageClip(frame_array).set_duration(3)
             
             # Write with absolute minimal settings
@@ -301,9 +630,9 @@ class VideoGenerator:
             
             # Last resort: create a PNG image
             try:
-                png_path = f"outputs/{session_id}.png"
-                frame_img = self._create_default_frame()
-                frame_img.save(png_path, 'PNG')
+                png_path = get_storage().output_path(session_id, 'png')
+                frame_array = self._create_default_frame()
+                Image.fromarray(frame_array).save(png_path, 'PNG')
                 
                 logger.info(f"Created PNG fallback: {png_path}")
                 return png_path
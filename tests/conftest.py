@@ -0,0 +1,18 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in its own directory with fresh process-wide singletons"""
+    import services.storage
+    import services.metrics
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path / 'metrics'))
+    monkeypatch.setattr(services.storage, '_storage', None)
+    monkeypatch.setattr(services.metrics, '_metrics', None)
+    return tmp_path
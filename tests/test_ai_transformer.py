@@ -0,0 +1,87 @@
+import json
+import threading
+from types import SimpleNamespace
+import pytest
+from services.script import Script
+
+SCRIPT = {'title': 'T', 'scenes': [{'narration': 'one'}, {'narration': 'two'}]}
+
+
+class FakeClient:
+    """Chat completions stand-in: summaries keep the first words of a part, scripts are fixed"""
+
+    def __init__(self, summary_words=20, fail_parts=()):
+        self.summary_words = summary_words
+        self.fail_parts = set(fail_parts)
+        self.calls = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, temperature, max_tokens, **options):
+        prompt = messages[-1]['content']
+        with self._lock:
+            self.calls.append(prompt)
+        if prompt.startswith('Summarize part'):
+            part = int(prompt.split()[2])
+            if part in self.fail_parts:
+                raise RuntimeError('summary failed')
+            content = ' '.join(prompt.split('Content:\n', 1)[1].split()[:self.summary_words])
+        else:
+            content = json.dumps(SCRIPT)
+        message = SimpleNamespace(content=content, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def transformer(monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setenv('AI_SUMMARY_MODE', 'map_reduce')
+    monkeypatch.setenv('AI_CHUNK_CHARS', '500')
+    from services.ai_transformer import AITransformer
+    transformer = AITransformer()
+    transformer.client = FakeClient()
+    transformer.prompt_chars = 300
+    return transformer
+
+
+def words(count, prefix='w'):
+    return ' '.join(f"{prefix}{i}" for i in range(count))
+
+
+def test_split_chunks_breaks_on_whitespace(transformer):
+    text = words(400)
+    chunks = transformer._split_chunks(text)
+    assert all(len(chunk) <= transformer.chunk_chars for chunk in chunks)
+    assert ' '.join(chunks).split() == text.split()
+
+
+def test_map_reduce_summarizes_until_it_fits_one_prompt(transformer):
+    transformer.client = FakeClient(summary_words=40)
+    summary = transformer._map_reduce(words(2000), 'short')
+    assert len(summary) <= transformer.prompt_chars
+    levels = [call for call in transformer.client.calls if call.startswith('Summarize part 1 of')]
+    # The first round's summaries are still too long for one prompt, so they are summarized again
+    assert len(levels) >= 2
+    assert summary.startswith('w0 ')
+
+
+def test_map_reduce_skips_failed_chunks(transformer):
+    transformer.client = FakeClient(summary_words=5, fail_parts={2})
+    events = []
+    summary = transformer._map_reduce(words(300), 'short', on_event=lambda kind, **data: events.append(data))
+    assert summary
+    assert events[-1]['chunk'] == events[-1]['chunks']
+
+
+def test_map_reduce_fails_when_every_chunk_fails(transformer):
+    transformer.client = FakeClient(fail_parts=range(1, 100))
+    with pytest.raises(Exception, match='All chunk summaries failed'):
+        transformer._map_reduce(words(300), 'short')
+
+
+def test_transform_content_scripts_the_summary(transformer):
+    result = transformer.transform_content({'total_text': words(2000), 'metadata': {'num_pages': 9}}, 'short')
+    assert result['script'] == Script.from_dict(SCRIPT).to_dict()
+    assert result['source_pages'] == 9 and 'fallback' not in result
+    assert transformer.client.calls[-1].count('Summary of the PDF content') == 1
+
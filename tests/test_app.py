@@ -0,0 +1,82 @@
+import os
+import pytest
+from services.job_queue import JobQueue, MemoryJobStore
+from services.storage import DRAFT, OUTPUT, get_storage
+
+VIDEO = bytes(range(256)) * 8
+
+
+@pytest.fixture
+def web(monkeypatch):
+    monkeypatch.setenv('JOB_QUEUE_BACKEND', 'memory')
+    monkeypatch.setenv('RENDER_WORKERS', '0')
+    # The first import happens in this test's directory; later tests swap in their own state
+    import app as web
+    monkeypatch.setattr(web, 'storage', get_storage())
+    monkeypatch.setattr(web, 'job_queue', JobQueue(MemoryJobStore(), handler=None, workers=0))
+    return web
+
+
+@pytest.fixture
+def client(web):
+    return web.app.test_client()
+
+
+def add_output(session_id, kind=OUTPUT, name=None, data=VIDEO):
+    storage = get_storage()
+    path = storage.output_path(name or session_id)
+    with open(path, 'wb') as file:
+        file.write(data)
+    storage.register(session_id, kind, path)
+    return path
+
+
+def test_download_serves_whole_file_with_validators(client):
+    add_output('abc')
+    response = client.get('/download/abc')
+    assert response.status_code == 200 and response.data == VIDEO
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+    assert response.headers['Content-Disposition'].startswith('attachment')
+    assert response.mimetype == 'video/mp4'
+
+
+def test_download_answers_byte_ranges(client):
+    add_output('abc')
+    response = client.get('/download/abc', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 100-199/{len(VIDEO)}"
+    assert response.data == VIDEO[100:200]
+    tail = client.get('/download/abc', headers={'Range': 'bytes=-10'})
+    assert tail.status_code == 206 and tail.data == VIDEO[-10:]
+    beyond = client.get('/download/abc', headers={'Range': f"bytes={len(VIDEO) + 10}-"})
+    assert beyond.status_code == 416
+    assert beyond.headers['Content-Range'] == f"bytes */{len(VIDEO)}"
+
+
+def test_download_revalidates(client):
+    add_output('abc')
+    first = client.get('/download/abc')
+    etag = first.headers['ETag']
+    assert client.get('/download/abc', headers={'If-None-Match': etag}).status_code == 304
+    modified = first.headers['Last-Modified']
+    assert client.get('/download/abc', headers={'If-Modified-Since': modified}).status_code == 304
+    # A stale validator still gets the range it asked for only if it matches
+    stale = client.get('/download/abc', headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert stale.status_code == 200 and stale.data == VIDEO
+
+
+def test_download_inline_and_draft_variant(client):
+    add_output('abc')
+    add_output('abc', DRAFT, 'abc_draft', data=b'draft')
+    inline = client.get('/download/abc?inline=1')
+    assert inline.headers['Content-Disposition'].startswith('inline')
+    assert client.get('/download/abc?variant=draft').data == b'draft'
+
+
+def test_download_missing_and_removed_files(client):
+    assert client.get('/download/nothing').status_code == 404
+    path = add_output('abc')
+    os.remove(path)
+    assert client.get('/download/abc').status_code == 404
+    assert OUTPUT not in get_storage().lookup('abc')
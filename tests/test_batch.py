@@ -0,0 +1,58 @@
+import io
+import zipfile
+import pytest
+from services.batch import batch_manifest, iter_archive, submit_batch, submit_sessions
+from services.job_queue import JobQueue, MemoryJobStore, QUEUED
+from services.storage import UPLOAD, get_storage
+from services.upload_manager import UploadManager
+
+PDF = b'%PDF-1.4\n' + b'x' * 100
+
+
+@pytest.fixture
+def job_queue():
+    return JobQueue(MemoryJobStore(), handler=None, workers=0)
+
+
+def upload(session_id):
+    storage = get_storage()
+    path = storage.upload_path(session_id)
+    with open(path, 'wb') as file:
+        file.write(PDF)
+    storage.register(session_id, UPLOAD, path)
+
+
+def test_iter_archive_yields_only_pdfs():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('a.pdf', PDF)
+        archive.writestr('notes.txt', b'text')
+        archive.writestr('__MACOSX/._a.pdf', b'fork')
+        archive.writestr('dir/B.PDF', PDF)
+    buffer.seek(0)
+    assert [(name, stream.read()) for name, stream in iter_archive(buffer)] == [('a.pdf', PDF), ('dir/B.PDF', PDF)]
+
+
+def test_submit_batch_saves_and_queues_documents(job_queue, tmp_path):
+    documents = [('bad.pdf', io.BytesIO(b'nope')), ('a.pdf', io.BytesIO(PDF)), ('c.pdf', io.BytesIO(PDF))]
+    batch = submit_batch(job_queue, UploadManager(str(tmp_path / 'uploads')), documents, {'length': 'short'},
+                         max_items=1)
+    assert (batch['submitted'], batch['rejected']) == (1, 2)
+    assert 'not a PDF' in batch['items'][0]['error'] and 'limited' in batch['items'][2]['error']
+    manifest = batch_manifest(job_queue, batch['batch_id'])
+    assert manifest['counts'] == {QUEUED: 1} and not manifest['done']
+    assert manifest['items'][0]['filename'] == 'a.pdf'
+
+
+def test_submit_sessions_rejects_jobs_pending_in_another_batch(job_queue):
+    for session_id in ('a', 'b', 'c'):
+        upload(session_id)
+    first = submit_sessions(job_queue, get_storage(), ['a'], {})
+    second = submit_sessions(job_queue, get_storage(), ['a', 'b', 'b', 'c', 'missing'], {})
+    assert (second['submitted'], second['rejected']) == (2, 3)
+    assert [item.get('error') for item in second['items']][:3] == [
+        'Document is already queued', None, 'Document is already queued']
+    # The pending job stays in the batch that queued it
+    assert [item['session_id'] for item in batch_manifest(job_queue, first['batch_id'])['items']] == ['a']
+    assert [item['session_id'] for item in batch_manifest(job_queue, second['batch_id'])['items']] == ['b', 'c']
+    assert batch_manifest(job_queue, 'unknown') is None
@@ -0,0 +1,88 @@
+import re
+import subprocess
+import numpy as np
+import pytest
+from services.encoder import FFmpegEncoder, find_ffmpeg
+
+WIDTH, HEIGHT, FPS = 64, 48, 10
+
+
+def probe(path):
+    """(duration in seconds, decoded frame count) of a video, read back with ffmpeg"""
+    result = subprocess.run([find_ffmpeg(), '-hide_banner', '-i', path, '-map', '0:v:0', '-f', 'null', '-'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    hours, minutes, seconds = re.search(r'Duration: (\d+):(\d+):([\d.]+)', result.stderr).groups()
+    frames = int(re.findall(r'frame=\s*(\d+)', result.stderr)[-1])
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds), frames
+
+
+def stills(count):
+    return (np.full((HEIGHT, WIDTH, 3), 40 * i, dtype=np.uint8) for i in range(count))
+
+
+def test_cfr_holds_each_still_for_its_duration(tmp_path):
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS, frame_mode='cfr')
+    durations = [1.0, 0.5, 1.5]
+    output = encoder.encode_stills(durations, stills(3), str(tmp_path / 'cfr.mp4'))
+    duration, frames = probe(output)
+    assert frames == 30
+    assert duration == pytest.approx(3.0, abs=0.05)
+
+
+def test_cfr_pipes_the_common_step_not_every_frame(tmp_path):
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS, frame_mode='cfr')
+    # 20, 10 and 30 output frames share a step of 10, so six stills are piped instead of sixty
+    assert encoder._input_step([20, 10, 30]) == 10
+    progress = []
+    encoder.encode_stills([2.0, 1.0, 3.0], stills(3), str(tmp_path / 'cfr.mp4'),
+                          on_progress=lambda piped, total: progress.append((piped, total)))
+    assert progress[-1] == (6, 6)
+    assert probe(str(tmp_path / 'cfr.mp4'))[1] == 60
+
+
+def test_rejects_frames_of_the_wrong_size(tmp_path):
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS)
+    with pytest.raises(ValueError):
+        encoder.encode_stills([1.0], [np.zeros((HEIGHT, WIDTH + 2, 3), dtype=np.uint8)],
+                              str(tmp_path / 'bad.mp4'))
+
+
+def test_vfr_sends_each_still_once_and_keeps_timing(tmp_path):
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS, frame_mode='vfr')
+    durations = [1.0, 0.5, 2.25]
+    progress = []
+    output = encoder.encode_stills(durations, stills(3), str(tmp_path / 'vfr.mp4'),
+                                   on_progress=lambda piped, total: progress.append((piped, total)))
+    # Three stills plus the closing copy that marks the end
+    assert progress[-1] == (4, 4) == (encoder.frames_encoded(durations),) * 2
+    duration, frames = probe(output)
+    # The closing copy only sets where the last still ends; it is not shown as a frame
+    assert frames == len(durations)
+    assert duration == pytest.approx(sum(durations), abs=0.05)
+
+
+def test_vfr_pts_collapses_runs_of_transition_frames():
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS, frame_mode='vfr')
+    durations = [2.0] + [0.1] * 5 + [3.0]
+    assert encoder._vfr_pts(durations) == '2*gte(N,1)+0.1*clip(N-1,0,5)+3*gte(N,7)'
+
+
+def test_vfr_with_transition_frames(tmp_path):
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS, frame_mode='vfr')
+    durations = [1.0] + [0.1] * 5 + [1.5]
+    output = encoder.encode_stills(durations, stills(7), str(tmp_path / 'fade.mp4'), keyframes=[0.0, 1.0])
+    duration, frames = probe(output)
+    assert frames == len(durations)
+    assert duration == pytest.approx(3.0, abs=0.05)
+
+
+def test_concat_cuts_vfr_segments_at_their_durations(tmp_path):
+    encoder = FFmpegEncoder(WIDTH, HEIGHT, fps=FPS, frame_mode='vfr')
+    segments = []
+    for i, duration in enumerate((1.0, 0.5, 1.5)):
+        segments.append(encoder.encode_stills([duration], stills(1), str(tmp_path / f"seg{i}.mp4")))
+    output = encoder.concat_segments(segments, str(tmp_path / 'joined.mp4'), durations=[1.0, 0.5, 1.5])
+    duration, frames = probe(output)
+    # The closing frame of each segment is dropped rather than shown
+    assert frames == 3
+    assert duration == pytest.approx(3.0, abs=0.1)
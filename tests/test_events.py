@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+import pytest
+from services.events import EventHub, format_sse
+from services.job_queue import COMPLETED, MemoryJobStore
+
+
+@pytest.fixture
+def store():
+    return MemoryJobStore()
+
+
+@pytest.fixture
+def hub(store):
+    return EventHub(store, poll_interval=0.01, batch_size=100)
+
+
+def parse(chunks):
+    """(id, kind, data) of each event in a stream, keepalives and snapshots without an id included"""
+    events = []
+    for chunk in chunks:
+        if chunk.startswith(':'):
+            events.append((None, 'keepalive', None))
+            continue
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        events.append((int(fields['id']) if 'id' in fields else None, fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_format_sse():
+    assert format_sse('progress', {'percent': 5}, 7) == 'id: 7\nevent: progress\ndata: {"percent":5}\n\n'
+    assert format_sse('status', {}) == 'event: status\ndata: {}\n\n'
+
+
+def test_reconnect_replays_every_missed_event(store, hub):
+    for i in range(1250):
+        store.add_event('s', 'progress', {'n': i})
+        store.add_event('other', 'progress', {'n': i})
+    store.add_event('s', COMPLETED, {})
+    events = parse(hub.stream('s', last_event_id=0, max_seconds=5))
+    # Far more than one page of the store's events, and the stream ends on the terminal event
+    assert [data['n'] for _, kind, data in events[:-1]] == list(range(1250))
+    assert events[-1][1] == COMPLETED
+    assert hub.subscriber_count() == 0
+
+
+def test_events_written_after_the_snapshot_are_replayed(store, hub):
+    store.add_event('s', 'progress', {'percent': 10})
+    # As the app does: take the cursor, then build the snapshot, and only then open the stream
+    cursor = store.last_event_id()
+    snapshot = {'state': 'running', 'percent': 10}
+    store.add_event('s', 'progress', {'percent': 60})
+    store.add_event('s', COMPLETED, {'percent': 100})
+    events = parse(hub.stream('s', cursor, snapshot, max_seconds=5))
+    assert [(kind, data) for _, kind, data in events] == [
+        ('status', snapshot), ('progress', {'percent': 60}), (COMPLETED, {'percent': 100})]
+
+
+def test_terminal_snapshot_ends_the_stream(hub):
+    events = parse(hub.stream('s', 0, {'state': COMPLETED}, max_seconds=5))
+    assert [kind for _, kind, _ in events] == ['status']
+
+
+def test_live_events_are_delivered_once(store, hub):
+    def write():
+        time.sleep(0.1)
+        store.add_event('s', 'progress', {'percent': 50})
+        store.add_event('other', 'progress', {'percent': 1})
+        store.add_event('s', COMPLETED, {})
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    events = parse(hub.stream('s', store.last_event_id(), keepalive=0.05, max_seconds=5))
+    writer.join()
+    assert [kind for _, kind, _ in events if kind != 'keepalive'] == ['progress', COMPLETED]
+    assert events[0][1] == 'keepalive'
+
+
+def test_stream_closes_after_max_seconds(hub):
+    started = time.monotonic()
+    events = parse(hub.stream('s', 0, keepalive=0.05, max_seconds=0.2))
+    assert time.monotonic() - started < 2
+    assert events and all(kind == 'keepalive' for _, kind, _ in events)
@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+import pytest
+from services.job_queue import (COMPLETED, FAILED, QUEUED, RUNNING, STALE_ERROR, JobQueue, MemoryJobStore,
+                                SQLiteJobStore)
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteJobStore(str(tmp_path / 'jobs.db'))
+    return MemoryJobStore()
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def make_stale(store, session_id):
+    # As if the worker's last heartbeat was a minute ago
+    if isinstance(store, SQLiteJobStore):
+        with store._connect() as conn:
+            conn.execute('UPDATE jobs SET heartbeat_at = ? WHERE session_id = ?', (time.time() - 60, session_id))
+    else:
+        store._jobs[session_id]['heartbeat_at'] = time.time() - 60
+
+
+def test_claim_takes_oldest_queued_job(store):
+    store.enqueue('first', {'n': 1})
+    time.sleep(0.01)
+    store.enqueue('second', {'n': 2})
+    job = store.claim('w1')
+    assert job['session_id'] == 'first' and job['status'] == RUNNING
+    assert job['worker'] == 'w1' and job['attempts'] == 1 and job['payload'] == {'n': 1}
+    assert store.claim('w2')['session_id'] == 'second'
+    assert store.claim('w3') is None
+
+
+def test_concurrent_claims_never_share_a_job(store):
+    for i in range(20):
+        store.enqueue(f"s{i}", {})
+    claimed = []
+
+    def worker(name):
+        while True:
+            job = store.claim(name)
+            if job is None:
+                return
+            claimed.append(job['session_id'])
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(f"s{i}" for i in range(20))
+
+
+def test_queue_position_counts_jobs_ahead(store):
+    for name in ('a', 'b', 'c'):
+        store.enqueue(name, {})
+        time.sleep(0.01)
+    assert [store.queue_position(name) for name in ('a', 'b', 'c')] == [1, 2, 3]
+    store.claim('w')
+    assert store.queue_position('a') == 0 and store.queue_position('c') == 2
+
+
+def test_enqueue_refuses_while_pending_and_replaces_finished(store):
+    assert store.enqueue('s', {'v': 1}) is not None
+    assert store.enqueue('s', {'v': 2}) is None
+    job = store.claim('w1')
+    assert store.enqueue('s', {'v': 3}) is None
+    assert store.finish('s', 'w1', job['attempts'], status=COMPLETED, result={'ok': True})
+    again = store.enqueue('s', {'v': 4})
+    assert again['status'] == QUEUED and again['payload'] == {'v': 4}
+    assert again['attempts'] == 0 and again['result'] is None
+
+
+def test_requeue_stale_returns_job_and_fences_old_worker(store):
+    store.enqueue('s', {})
+    first = store.claim('w1')
+    make_stale(store, 's')
+    assert store.requeue_stale(timeout=30) == 1
+    assert store.get('s')['status'] == QUEUED and store.get('s')['worker'] is None
+
+    second = store.claim('w2')
+    assert second['attempts'] == 2
+    # The first worker finishing late must not overwrite the run that replaced it
+    assert not store.finish('s', 'w1', first['attempts'], status=FAILED, error='late')
+    assert store.get('s')['status'] == RUNNING
+    assert store.finish('s', 'w2', second['attempts'], status=COMPLETED, result={'ok': True})
+    assert store.get('s')['result'] == {'ok': True}
+
+
+def test_requeue_stale_fails_after_max_attempts(store):
+    store.enqueue('s', {})
+    for attempt in range(2):
+        store.claim('w')
+        make_stale(store, 's')
+        store.requeue_stale(timeout=30, max_attempts=2)
+    job = store.get('s')
+    assert job['status'] == FAILED and job['error'] == STALE_ERROR
+
+
+def test_requeue_stale_ignores_live_jobs(store):
+    store.enqueue('s', {})
+    store.claim('w')
+    store.heartbeat('s', 'w')
+    assert store.requeue_stale(timeout=30) == 0
+    assert store.get('s')['status'] == RUNNING
+
+
+def test_submit_returns_pending_job(store):
+    queue = JobQueue(store, handler=None, workers=0)
+    job = queue.submit('s', {'v': 1})
+    assert queue.submit('s', {'v': 2})['payload'] == job['payload'] == {'v': 1}
+    status = queue.status('s')
+    assert status['state'] == QUEUED and status['queue_position'] == 1
+
+
+def render(session_id, payload, progress):
+    progress('rendering', 50)
+    # Hold the job until the test has seen the progress
+    while not os.path.exists(payload['release']):
+        time.sleep(0.01)
+    return {'video_path': f"{payload['name']}.mp4"}
+
+
+def explode(session_id, payload, progress):
+    raise RuntimeError('boom')
+
+
+# Handlers live at module level so that process workers, used with the SQLite store, can import them
+def test_worker_runs_job_and_reports_progress(store, tmp_path):
+    queue = JobQueue(store, render, workers=1, poll_interval=0.01)
+    try:
+        queue.submit('s', {'name': 'out', 'release': str(tmp_path / 'release')})
+        assert wait_for(lambda: store.get('s')['stage'] == 'rendering')
+        assert queue.status('s')['state'] == RUNNING
+        (tmp_path / 'release').touch()
+        assert wait_for(lambda: store.get('s')['status'] == COMPLETED)
+    finally:
+        queue.stop()
+    status = queue.status('s')
+    assert status['percent'] == 100.0 and status['result'] == {'video_path': 'out.mp4'}
+
+
+def test_worker_records_failures(store):
+    queue = JobQueue(store, explode, workers=1, poll_interval=0.01)
+    try:
+        queue.submit('s', {})
+        assert wait_for(lambda: store.get('s')['status'] == FAILED)
+    finally:
+        queue.stop()
+    assert queue.status('s')['error'] == 'boom'
@@ -0,0 +1,80 @@
+import os
+import pytest
+from services import memory
+from services.memory import PeakMemory, estimate_render, fit_render, memory_budget
+from services.render_profiles import RENDER_PROFILES
+
+FINAL = RENDER_PROFILES['final']
+
+
+def test_no_budget_or_enough_budget_changes_nothing():
+    assert fit_render(FINAL, 4, None) == (FINAL, 4, {})
+    assert fit_render(FINAL, 4, estimate_render(FINAL, 4)) == (FINAL, 4, {})
+
+
+def test_estimate_grows_with_workers_and_picture():
+    assert estimate_render(FINAL, 1) < estimate_render(FINAL, 2) < estimate_render(FINAL, 4)
+    assert estimate_render(RENDER_PROFILES['draft']) < estimate_render(RENDER_PROFILES['preview']) \
+        < estimate_render(FINAL)
+    assert estimate_render(dict(FINAL, low_memory=True)) < estimate_render(FINAL)
+
+
+def test_scene_workers_are_reduced_first():
+    profile, workers, changes = fit_render(FINAL, 4, estimate_render(FINAL, 2))
+    assert (profile, workers) == (FINAL, 2)
+    assert changes == {'scene_workers': '4 -> 2'}
+
+
+def test_then_the_encoder_saves_memory():
+    budget = estimate_render(dict(FINAL, low_memory=True))
+    profile, workers, changes = fit_render(FINAL, 4, budget)
+    assert workers == 1 and profile['low_memory'] and (profile['width'], profile['height']) == (1920, 1080)
+    assert changes == {'scene_workers': '4 -> 1', 'encoder': 'low_memory'}
+
+
+def test_then_the_picture_steps_down_through_standard_sizes():
+    budget = estimate_render(dict(RENDER_PROFILES['draft'], low_memory=True))
+    profile, workers, changes = fit_render(FINAL, 1, budget)
+    assert (profile['width'], profile['height'], workers) == (854, 480, 1)
+    assert changes == {'encoder': 'low_memory', 'resolution': '1920x1080 -> 854x480'}
+    assert estimate_render(profile) <= budget
+    # The caller's profile is left alone
+    assert 'low_memory' not in FINAL
+
+
+def test_smallest_render_is_returned_when_nothing_fits():
+    profile, workers, changes = fit_render(FINAL, 2, 1)
+    smallest = min(p['height'] for p in RENDER_PROFILES.values())
+    assert profile['height'] == smallest and workers == 1
+    assert set(changes) == {'scene_workers', 'encoder', 'resolution'}
+
+
+@pytest.mark.parametrize('setting, budget', [('0', None), ('256', 256 * 1024 * 1024), ('0.5', 512 * 1024)])
+def test_memory_budget_setting(monkeypatch, setting, budget):
+    monkeypatch.setenv('RENDER_MEMORY_BUDGET_MB', setting)
+    assert memory_budget() == budget
+
+
+def test_memory_budget_rejects_negative(monkeypatch):
+    monkeypatch.setenv('RENDER_MEMORY_BUDGET_MB', '-1')
+    with pytest.raises(ValueError):
+        memory_budget()
+
+
+def test_auto_budget_shares_the_container_limit(monkeypatch):
+    monkeypatch.setenv('RENDER_MEMORY_BUDGET_MB', 'auto')
+    monkeypatch.setenv('RENDER_WORKERS', '2')
+    monkeypatch.setattr(memory, 'container_limit', lambda: 1000 * 1024 * 1024)
+    assert memory_budget() == int(1000 * 1024 * 1024 * 0.8 / 2)
+    monkeypatch.setattr(memory, 'container_limit', lambda: None)
+    assert memory_budget() is None
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='needs /proc')
+def test_peak_memory_sees_this_process():
+    before = memory.process_rss()
+    with PeakMemory(interval=0.01) as peak:
+        data = b'x' * (32 * 1024 * 1024)
+        peak.sample()
+        del data
+    assert peak.peak >= before + 24 * 1024 * 1024
@@ -0,0 +1,109 @@
+import os
+import json
+import socket
+import subprocess
+import sys
+import threading
+import pytest
+from services import metrics as metrics_module
+from services.metrics import RETIRED_FILE, MetricsRegistry, Trace
+
+needs_flock = pytest.mark.skipif(metrics_module.fcntl is None, reason='retirement needs flock')
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_samples(directory, name, jobs):
+    registry = MetricsRegistry()
+    registry.inc('pdfvideo_jobs_total', jobs, status='completed')
+    registry.observe('pdfvideo_job_seconds', 1.5, status='completed')
+    with open(os.path.join(directory, name), 'w') as file:
+        json.dump(registry.snapshot(), file)
+
+
+def counter(registry, name='pdfvideo_jobs_total{status="completed"}'):
+    for line in registry.render_prometheus().splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split()[-1])
+    return 0.0
+
+
+def test_flush_writes_a_file_per_process(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    registry.inc('pdfvideo_jobs_total', status='completed')
+    registry.flush()
+    registry.flush()
+    names = os.listdir(tmp_path)
+    assert len(names) == 1 and names[0].startswith(f"{socket.gethostname()}-{os.getpid()}-")
+
+
+@needs_flock
+def test_exited_processes_are_retired_once(tmp_path):
+    directory = str(tmp_path)
+    host = socket.gethostname()
+    dead = exited_pid()
+    write_samples(directory, f"{host}-{dead}-aaaa1111.json", 2)
+    # Files from before names carried the host
+    write_samples(directory, f"{exited_pid()}.json", 3)
+    live = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        write_samples(directory, f"{host}-{live.pid}-bbbb2222.json", 5)
+        web = MetricsRegistry(directory)
+        web.inc('pdfvideo_jobs_total', status='completed')
+
+        assert counter(web) == 11
+        assert counter(web) == 11
+        assert counter(web, 'pdfvideo_job_seconds_count{status="completed"}') == 3
+        assert sorted(os.listdir(directory)) == sorted([RETIRED_FILE, '_retired.lock',
+                                                        f"{host}-{live.pid}-bbbb2222.json"])
+    finally:
+        live.kill()
+        live.wait()
+    # Once the live process exits its samples move into the retired total, still counted once
+    assert counter(web) == 11
+    assert counter(web) == 11
+
+
+@needs_flock
+def test_concurrent_scrapes_never_double_count(tmp_path):
+    directory = str(tmp_path)
+    for i in range(10):
+        write_samples(directory, f"{socket.gethostname()}-{exited_pid()}-{i:08x}.json", 1)
+    results = []
+    scrapers = [MetricsRegistry(directory) for _ in range(4)]
+    threads = [threading.Thread(target=lambda registry=registry: results.append(counter(registry)))
+               for registry in scrapers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [10] * 4
+    assert counter(scrapers[0]) == 10
+
+
+@needs_flock
+def test_files_folded_before_a_crash_are_not_counted_again(tmp_path):
+    directory = str(tmp_path)
+    name = f"{socket.gethostname()}-{exited_pid()}-cccc3333.json"
+    write_samples(directory, name, 4)
+    registry = MetricsRegistry(directory)
+    registry._retire_exited()
+    # As if the process died after writing the retired total but before deleting the file
+    write_samples(directory, name, 4)
+    assert counter(registry) == 4
+    assert name not in os.listdir(directory)
+
+
+def test_trace_records_timings_and_histogram():
+    registry = MetricsRegistry()
+    trace = Trace(registry)
+    with trace.span('extract'):
+        pass
+    trace.add('render', 2.0)
+    trace.add('render', 1.0, observe=False)
+    assert set(trace.timings) == {'extract', 'render'} and trace.timings['render'] == 3.0
+    assert counter(registry, 'pdfvideo_stage_seconds_count{stage="render"}') == 1
@@ -0,0 +1,105 @@
+import wave
+import pytest
+from services.narration import (SCENE_LEAD_SECONDS, SCENE_TAIL_SECONDS, Narrator, SilentBackend,
+                                create_narrator, scene_seconds, write_track)
+from services.result_cache import ResultCache
+from services.script import Scene
+
+RATE = 1000
+
+
+class CountingBackend(SilentBackend):
+    def __init__(self):
+        super().__init__(words_per_minute=60, sample_rate=RATE)
+        self.calls = 0
+
+    def synthesize(self, text, wav_path):
+        self.calls += 1
+        super().synthesize(text, wav_path)
+
+
+def tone(path, seconds, level=1000):
+    """Mono 16-bit WAV of a constant non-zero level, so it can be found in the track"""
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(level.to_bytes(2, 'little', signed=True) * round(seconds * RATE))
+    return {'path': str(path), 'seconds': seconds}
+
+
+def samples(path):
+    with wave.open(path, 'rb') as wav:
+        data = wav.readframes(wav.getnframes())
+    return [int.from_bytes(data[i:i + 2], 'little', signed=True) for i in range(0, len(data), 2)]
+
+
+def test_narrate_times_clips_and_skips_empty_scenes(tmp_path):
+    narrator = Narrator(CountingBackend())
+    scenes = [Scene(1, 'one two three'), Scene(2, '  '), Scene(3, 'four')]
+    clips = narrator.narrate(scenes, str(tmp_path / 'audio'))
+    assert clips[1] is None
+    assert [clip['seconds'] for clip in (clips[0], clips[2])] == [3.0, 1.0]
+    # Scenes narrated with audio last as long as the clip plus its lead and tail
+    timed = scenes[0].with_audio(scene_seconds(clips[0]))
+    assert timed.audio_seconds == pytest.approx(SCENE_LEAD_SECONDS + 3.0 + SCENE_TAIL_SECONDS)
+    assert timed.duration_seconds == scenes[0].duration_seconds
+
+
+def test_narrate_reuses_cached_clips(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    backend = CountingBackend()
+    narrator = Narrator(backend, cache)
+    narrator.narrate([Scene(1, 'same words'), Scene(2, 'other')], str(tmp_path / 'a'))
+    clips = Narrator(backend, cache).narrate([Scene(1, 'same   words')], str(tmp_path / 'b'))
+    assert backend.calls == 2
+    assert clips[0]['seconds'] == 2.0
+
+
+def test_write_track_places_clips_after_each_scene_start(tmp_path):
+    clips = [tone(tmp_path / 'a.wav', 1.0), None, tone(tmp_path / 'c.wav', 0.5)]
+    durations = [2.0, 1.5, 1.0]
+    track = write_track(clips, durations, str(tmp_path / 'track.wav'))
+    data = samples(track)
+    assert len(data) == round(sum(durations) * RATE)
+    lead = round(SCENE_LEAD_SECONDS * RATE)
+    voiced = [i for i, sample in enumerate(data) if sample]
+    assert voiced[0] == lead
+    assert data[lead:lead + RATE] == [1000] * RATE
+    third = round(3.5 * RATE)
+    assert not any(data[lead + RATE:third + lead])
+    assert data[third + lead:third + lead + 500] == [1000] * 500
+
+
+def test_write_track_cuts_clips_longer_than_their_scene(tmp_path):
+    clips = [tone(tmp_path / 'a.wav', 3.0), tone(tmp_path / 'b.wav', 0.2, level=-7)]
+    track = write_track(clips, [1.0, 1.0], str(tmp_path / 'track.wav'))
+    data = samples(track)
+    assert len(data) == 2 * RATE
+    # The long clip stops at its scene's end, so the next clip still starts on time
+    assert data[RATE - 1] == 1000
+    assert data[RATE:RATE + round(SCENE_LEAD_SECONDS * RATE)] == [0] * round(SCENE_LEAD_SECONDS * RATE)
+    assert data[RATE + round(SCENE_LEAD_SECONDS * RATE)] == -7
+
+
+def test_write_track_without_clips(tmp_path):
+    assert write_track([None, None], [1.0, 1.0], str(tmp_path / 'track.wav')) is None
+
+
+def test_create_narrator_from_environment(monkeypatch):
+    monkeypatch.setenv('NARRATION_BACKEND', 'none')
+    assert create_narrator() is None
+    monkeypatch.setenv('NARRATION_BACKEND', 'silent')
+    assert create_narrator().backend.name == 'silent'
+    monkeypatch.setenv('NARRATION_BACKEND', 'robot')
+    with pytest.raises(ValueError):
+        create_narrator()
+
+
+def test_narrated_scenes_are_not_capped(monkeypatch):
+    monkeypatch.setenv('RENDER_MEMORY_BUDGET_MB', '0')
+    from services.video_generator import VideoGenerator
+    generator = VideoGenerator(profile='draft')
+    scene = Scene(1, 'words', duration_seconds=20)
+    assert generator._scene_duration(scene) == 6
+    assert generator._scene_duration(scene.with_audio(scene_seconds({'seconds': 9.2}))) == pytest.approx(10.0)
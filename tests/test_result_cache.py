@@ -0,0 +1,65 @@
+import os
+import time
+from services.result_cache import ResultCache
+
+
+def test_make_key_is_stable_and_order_sensitive():
+    assert ResultCache.make_key('stage', {'b': 1, 'a': 2}) == ResultCache.make_key('stage', {'a': 2, 'b': 1})
+    assert ResultCache.make_key('a', 'b') != ResultCache.make_key('b', 'a')
+    assert ResultCache.make_key('stage', 1) != ResultCache.make_key('stage', '1')
+
+
+def test_normalize_text_shares_keys():
+    assert ResultCache.normalize_text('  a \n b\t') == ResultCache.normalize_text('a b')
+    assert ResultCache.normalize_text(None) == ''
+
+
+def test_json_round_trip_and_stats(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = ResultCache.make_key('x')
+    assert cache.get_json('transform', key) is None
+    cache.put_json('transform', key, {'script': [1, 2]})
+    assert cache.get_json('transform', key) == {'script': [1, 2]}
+    assert cache.stats() == {'transform': {'hits': 1, 'misses': 1}}
+
+
+def test_file_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    source = tmp_path / 'in.bin'
+    source.write_bytes(b'data')
+    key = ResultCache.hash_file(str(source))
+    cache.put_file('video', key, str(source), '.mp4')
+    dest = tmp_path / 'out.mp4'
+    assert cache.get_file('video', key, str(dest), '.mp4')
+    assert dest.read_bytes() == b'data'
+    assert not cache.get_file('video', 'missing', str(tmp_path / 'none.mp4'), '.mp4')
+
+
+def test_evict_drops_expired_then_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=250, max_age_seconds=3600, evict_interval=3600)
+    now = time.time()
+    for name, age in (('expired', 7200), ('oldest', 300), ('older', 200), ('newest', 100)):
+        cache.put_json('stage', name, 'x' * 98)
+        path = cache._path('stage', name, '.json')
+        os.utime(path, (now - age, now - age))
+
+    # Reading refreshes an entry's access time, so it outlives newer ones
+    assert cache.get_json('stage', 'oldest') is not None
+    assert cache.evict() == 2
+    assert cache.get_json('stage', 'expired') is None
+    assert cache.get_json('stage', 'older') is None
+    assert cache.get_json('stage', 'oldest') is not None
+    assert cache.get_json('stage', 'newest') is not None
+
+
+def test_extract_key_tracks_page_limit(monkeypatch):
+    from services.pdf_processor import PDFProcessor
+    from services.pipeline import extract_key
+
+    monkeypatch.delenv('PDF_MAX_PAGES', raising=False)
+    unlimited = extract_key('hash', 12000, PDFProcessor())
+    monkeypatch.setenv('PDF_MAX_PAGES', '5')
+    limited = extract_key('hash', 12000, PDFProcessor())
+    assert unlimited != limited
+    assert limited == extract_key('hash', 12000, PDFProcessor())
+    assert limited != extract_key('hash', 6000, PDFProcessor())
@@ -0,0 +1,64 @@
+import pytest
+from services.script import (MAX_SCENE_SECONDS, MAX_SCENES, MIN_SCENE_SECONDS, Script, ScriptError,
+                             extract_json)
+
+
+def test_extract_json_bare():
+    assert extract_json('{"title": "T", "scenes": []}') == {'title': 'T', 'scenes': []}
+
+
+def test_extract_json_fenced_with_prose():
+    text = 'Here is your script:\n```json\n{"title": "T", "scenes": [{"narration": "a"}]}\n```\nEnjoy!'
+    assert extract_json(text)['scenes'] == [{'narration': 'a'}]
+
+
+def test_extract_json_prefers_object_with_scenes():
+    text = 'Settings {"tone": "fun"} then {"title": "T", "scenes": [{"narration": "a"}]}'
+    assert extract_json(text)['title'] == 'T'
+
+
+def test_extract_json_salvages_truncated_scenes():
+    text = '{"title": "Cut", "scenes": [{"narration": "one"}, {"narration": "two"}, {"narration": "thr'
+    assert extract_json(text) == {'title': 'Cut', 'scenes': [{'narration': 'one'}, {'narration': 'two'}]}
+
+
+@pytest.mark.parametrize('text', ['', '   ', None, 'no json here'])
+def test_extract_json_rejects(text):
+    with pytest.raises(ScriptError):
+        extract_json(text)
+
+
+def test_script_drops_empty_scenes_and_renumbers():
+    script = Script.from_dict({'title': '  My   Title ', 'scenes': [
+        {'narration': 'first'}, {'narration': '   '}, 'plain text scene', 42, {'narration': 'last'}]})
+    assert script.title == 'My Title'
+    assert [scene.narration for scene in script.scenes] == ['first', 'plain text scene', 'last']
+    assert [scene.scene_number for scene in script.scenes] == [1, 2, 3]
+
+
+def test_script_clamps_durations():
+    script = Script.from_dict({'scenes': [
+        {'narration': 'a', 'duration_seconds': 0}, {'narration': 'b', 'duration_seconds': 999},
+        {'narration': 'c', 'duration_seconds': 'soon'}, {'narration': 'd', 'duration_seconds': float('nan')}]})
+    durations = [scene.duration_seconds for scene in script.scenes]
+    assert durations[0] == MIN_SCENE_SECONDS
+    assert durations[1] == MAX_SCENE_SECONDS
+    assert durations[2] == durations[3] == 4.0
+    assert script.title == 'Video'
+
+
+def test_script_caps_scene_count():
+    script = Script.from_dict([{'narration': str(i)} for i in range(MAX_SCENES + 5)])
+    assert len(script.scenes) == MAX_SCENES
+
+
+@pytest.mark.parametrize('data', ['text', {'title': 'T'}, {'scenes': 'x'}, {'scenes': [{'narration': ''}]}])
+def test_script_rejects_unrenderable(data):
+    with pytest.raises(ScriptError):
+        Script.from_dict(data)
+
+
+def test_script_round_trips():
+    script = Script.parse('```json\n{"title": "T", "scenes": [{"narration": "a", "visual_description": "b"}]}\n```')
+    assert Script.from_dict(script.to_dict()).to_dict() == script.to_dict()
+    assert Script.from_content({'script': script.to_dict()}).to_dict() == script.to_dict()
@@ -0,0 +1,83 @@
+import os
+import time
+from services.storage import OUTPUT, UPLOAD, StorageManager
+
+
+def make_storage(**options):
+    options.setdefault('ttl_seconds', 3600)
+    options.setdefault('max_bytes', None)
+    options.setdefault('min_age_seconds', 60)
+    return StorageManager(db_path='data/storage.db', **options)
+
+
+def add_session(storage, session_id, size, accessed_ago):
+    path = storage.upload_path(session_id)
+    with open(path, 'wb') as file:
+        file.write(b'x' * size)
+    storage.register(session_id, UPLOAD, path)
+    with storage._connect() as conn:
+        conn.execute('UPDATE files SET accessed_at = ? WHERE session_id = ?', (time.time() - accessed_ago, session_id))
+    return path
+
+
+def test_register_shards_and_indexes():
+    storage = make_storage()
+    path = add_session(storage, 'abcdef', 10, 0)
+    assert path == os.path.join('uploads', 'ab', 'abcdef.pdf')
+    assert storage.lookup('abcdef')[UPLOAD]['size'] == 10
+    assert storage.usage() == {'bytes': 10, 'files': 1, 'sessions': 1}
+
+
+def test_register_replaces_earlier_file_of_same_kind():
+    storage = make_storage()
+    png = storage.output_path('abcdef', 'png')
+    mp4 = storage.output_path('abcdef')
+    for path in (png, mp4):
+        with open(path, 'wb') as file:
+            file.write(b'x')
+        storage.register('abcdef', OUTPUT, path)
+    assert not os.path.exists(png)
+    assert storage.lookup('abcdef')[OUTPUT]['path'] == mp4
+
+
+def test_reap_expires_sessions_past_ttl():
+    storage = make_storage()
+    expired = add_session(storage, 'aa-expired', 10, 7200)
+    kept = add_session(storage, 'bb-kept', 10, 600)
+    result = storage.reap()
+    assert result['expired'] == 1 and result['evicted'] == 0
+    assert not os.path.exists(expired) and os.path.exists(kept)
+    assert storage.lookup('aa-expired') == {}
+
+
+def test_reap_evicts_least_recently_used_until_under_quota():
+    storage = make_storage(max_bytes=250)
+    paths = {name: add_session(storage, name, 100, ago)
+             for name, ago in (('aa-oldest', 900), ('bb-older', 800), ('cc-newer', 700), ('dd-newest', 600))}
+    result = storage.reap()
+    assert result['evicted'] == 2 and result['total_bytes'] == 200
+    assert [name for name, path in paths.items() if os.path.exists(path)] == ['cc-newer', 'dd-newest']
+
+
+def test_reap_spares_protected_and_recent_sessions():
+    storage = make_storage(max_bytes=1)
+    busy = add_session(storage, 'aa-busy', 100, 7200)
+    recent = add_session(storage, 'bb-recent', 100, 10)
+    result = storage.reap(protected=['aa-busy'])
+    assert result['expired'] == result['evicted'] == 0
+    assert os.path.exists(busy) and os.path.exists(recent)
+
+
+def test_reap_sweeps_abandoned_scratch_directories():
+    storage = make_storage(scratch_ttl_seconds=3600)
+    old = time.time() - 7200
+    for name in ('abandoned', 'running', 'fresh'):
+        directory = os.path.join('outputs', 'segments', name)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'scene_000.mp4'), 'wb') as file:
+            file.write(b'x' * 10)
+        if name != 'fresh':
+            os.utime(directory, (old, old))
+    result = storage.reap(protected=['running'])
+    assert result['scratch_freed_bytes'] == 10
+    assert sorted(os.listdir(os.path.join('outputs', 'segments'))) == ['fresh', 'running']
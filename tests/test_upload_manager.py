@@ -0,0 +1,141 @@
+import io
+import os
+import time
+import hashlib
+import pytest
+from services.upload_manager import MultipartReader, UploadError, UploadManager, read_pdf_hash
+
+PDF = b'%PDF-1.4\n' + bytes(range(256)) * 40
+
+
+class Trickle:
+    """Stream that returns at most size bytes per read, like a slow client"""
+
+    def __init__(self, data, size):
+        self.data = io.BytesIO(data)
+        self.size = size
+
+    def read(self, size=-1):
+        return self.data.read(min(self.size, size) if size >= 0 else self.size)
+
+
+def multipart(*parts, boundary='XyZ'):
+    body = b''
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename is not None else '')
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b'\r\n'
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def read_form(body, block_size):
+    reader = MultipartReader(Trickle(body, block_size), b'XyZ', block_size=block_size)
+    return [(name, filename, reader.read()) for name, filename in reader.parts()]
+
+
+@pytest.mark.parametrize('block_size', [*range(1, 24), 64, 1024 * 1024])
+def test_multipart_reader_yields_parts_in_order(block_size):
+    body = multipart(('pdf', 'a.pdf', PDF), ('requirements', None, b'make it short'))
+    assert read_form(body, block_size) == [('pdf', 'a.pdf', PDF), ('requirements', None, b'make it short')]
+    body = multipart(('requirements', None, b'first'), ('pdf', 'a.pdf', PDF))
+    assert read_form(body, block_size) == [('requirements', None, b'first'), ('pdf', 'a.pdf', PDF)]
+
+
+def test_multipart_reader_skips_unread_parts():
+    reader = MultipartReader(Trickle(multipart(('ignored', 'x.bin', b'x' * 5000), ('note', None, b'kept')), 13),
+                             b'XyZ', block_size=13)
+    names = []
+    for name, _ in reader.parts():
+        names.append(name)
+        if name == 'note':
+            assert reader.read() == b'kept'
+    assert names == ['ignored', 'note']
+
+
+def test_multipart_reader_rejects_truncated_body():
+    reader = MultipartReader(io.BytesIO(multipart(('pdf', 'a.pdf', PDF))[:200]), b'XyZ', block_size=64)
+    with pytest.raises(UploadError):
+        for _ in reader.parts():
+            reader.read()
+
+
+@pytest.mark.parametrize('block_size', [1, 3, 1024])
+def test_save_stream_from_multipart(tmp_path, block_size):
+    manager = UploadManager(str(tmp_path / 'uploads'), block_size=block_size)
+    reader = MultipartReader(Trickle(multipart(('pdf', 'a.pdf', PDF)), block_size), b'XyZ', block_size)
+    for name, _ in reader.parts():
+        saved = manager.save_stream(reader, 'session')
+    path = tmp_path / 'uploads' / 'session.pdf'
+    assert path.read_bytes() == PDF
+    assert saved['sha256'] == hashlib.sha256(PDF).hexdigest() == read_pdf_hash(str(path))
+
+
+@pytest.mark.parametrize('data', [b'%PDX-1.4 not a pdf', b'%P', b'hello'])
+def test_save_stream_rejects_non_pdf_split_across_reads(tmp_path, data):
+    manager = UploadManager(str(tmp_path / 'uploads'), block_size=1)
+    with pytest.raises(UploadError, match='not a PDF'):
+        manager.save_stream(Trickle(data, 1), 'session')
+    assert os.listdir(tmp_path / 'uploads') == ['partial']
+
+
+def test_save_stream_enforces_size_cap(tmp_path):
+    manager = UploadManager(str(tmp_path / 'uploads'), block_size=100, max_size=1000)
+    with pytest.raises(UploadError) as error:
+        manager.save_stream(io.BytesIO(PDF), 'session')
+    assert error.value.status == 413
+
+
+def test_chunked_upload_resumes_and_completes_in_a_fresh_manager(tmp_path):
+    upload_dir = str(tmp_path / 'uploads')
+    first = UploadManager(upload_dir, block_size=5)
+    upload_id = first.create('a.pdf', len(PDF))['upload_id']
+    assert first.append(upload_id, io.BytesIO(PDF[:3000]), 0)['offset'] == 3000
+
+    # Another worker process continues: its hash state is rebuilt from the partial file
+    second = UploadManager(upload_dir, block_size=7)
+    assert second.status(upload_id)['offset'] == 3000
+    assert second.append(upload_id, io.BytesIO(PDF[3000:]), 3000)['complete']
+    third = UploadManager(upload_dir)
+    done = third.complete(upload_id, 'session')
+    assert done['sha256'] == hashlib.sha256(PDF).hexdigest() and done['size'] == len(PDF)
+    assert open(os.path.join(upload_dir, 'session.pdf'), 'rb').read() == PDF
+
+
+def test_chunked_upload_rejects_wrong_offset_and_overflow(tmp_path):
+    manager = UploadManager(str(tmp_path / 'uploads'))
+    upload_id = manager.create('a.pdf', 100)['upload_id']
+    manager.append(upload_id, io.BytesIO(PDF[:40]), 0)
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, io.BytesIO(PDF[40:60]), 10)
+    assert error.value.status == 409
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, io.BytesIO(PDF[40:200]), 40)
+    assert error.value.status == 413
+    with pytest.raises(UploadError) as error:
+        manager.complete(upload_id)
+    assert error.value.status == 409
+    with pytest.raises(UploadError) as error:
+        manager.create('big.pdf', manager.max_size + 1)
+    assert error.value.status == 413
+
+
+def test_chunked_upload_rejects_non_pdf_header_across_chunks(tmp_path):
+    manager = UploadManager(str(tmp_path / 'uploads'))
+    upload_id = manager.create('a.pdf')['upload_id']
+    manager.append(upload_id, io.BytesIO(b'%P'), 0)
+    with pytest.raises(UploadError, match='not a PDF'):
+        manager.append(upload_id, io.BytesIO(b'XF-1.4'), 2)
+    with pytest.raises(UploadError) as error:
+        manager.status(upload_id)
+    assert error.value.status == 404
+
+
+def test_expire_stale_removes_abandoned_uploads(tmp_path):
+    manager = UploadManager(str(tmp_path / 'uploads'), stale_after=60)
+    stale = manager.create('old.pdf')['upload_id']
+    fresh = manager.create('new.pdf')['upload_id']
+    old = time.time() - 120
+    os.utime(manager._data_path(stale), (old, old))
+    assert manager.expire_stale() == 1
+    assert manager.status(fresh)['offset'] == 0
+    with pytest.raises(UploadError):
+        manager.status(stale)
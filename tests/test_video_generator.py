@@ -0,0 +1,64 @@
+import os
+import pytest
+from services.result_cache import ResultCache
+from services.script import Script
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setenv('RENDER_SCENE_WORKERS', '1')
+    monkeypatch.setenv('RENDER_MEMORY_BUDGET_MB', '0')
+    monkeypatch.setenv('VIDEO_TRANSITION', 'crossfade')
+    from services.video_generator import VideoGenerator
+    return VideoGenerator(profile='draft')
+
+
+def make_script(*narrations):
+    return {'title': 'T', 'scenes': [{'narration': text, 'duration_seconds': 1} for text in narrations]}
+
+
+def fingerprints(generator, script, image_ids=None):
+    scenes = Script.from_dict(script).scenes
+    return [generator.scene_fingerprint(scenes, i, image_ids) for i in range(len(scenes))]
+
+
+def test_fingerprint_is_stable(generator):
+    script = make_script('one', 'two', 'three')
+    assert fingerprints(generator, script) == fingerprints(generator, script)
+    assert len(set(fingerprints(generator, script))) == 3
+
+
+def test_edit_changes_scene_and_the_one_crossfading_from_it(generator):
+    before = fingerprints(generator, make_script('one', 'two', 'three', 'four'))
+    after = fingerprints(generator, make_script('one', 'TWO', 'three', 'four'))
+    assert [b == a for b, a in zip(before, after)] == [True, False, False, True]
+
+
+def test_cut_transition_isolates_scenes(generator):
+    generator.motion.transition = 'cut'
+    before = fingerprints(generator, make_script('one', 'two', 'three'))
+    after = fingerprints(generator, make_script('one', 'TWO', 'three'))
+    assert [b == a for b, a in zip(before, after)] == [True, False, True]
+
+
+def test_fingerprint_tracks_backgrounds_and_settings(generator):
+    script = make_script('one', 'two')
+    plain = fingerprints(generator, script)
+    assert fingerprints(generator, script, [None, ['hash', 3, 100]])[1] != plain[1]
+    generator.fps += 1
+    assert fingerprints(generator, script) != plain
+
+
+def test_rerender_reuses_unchanged_segments(generator, tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    first = {}
+    path = generator.create_video({'script': make_script('one', 'two', 'three', 'four')}, 'session-1',
+                                  report=first, segment_cache=cache)
+    assert not first['fallback'] and os.path.getsize(path) > 0
+    assert first['segments_rendered'] == 4 and first['segments_reused'] == 0
+
+    second = {}
+    generator.create_video({'script': make_script('one', 'two', 'three', 'FOUR')}, 'session-1',
+                           report=second, segment_cache=cache)
+    assert not second['fallback']
+    assert second['segments_reused'] == 3 and second['segments_rendered'] == 1
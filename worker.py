@@ -0,0 +1,42 @@
+"""Standalone render worker for multi-worker deployments
+
+Run the web tier with RENDER_WORKERS=0 so it only enqueues jobs, and run
+`python worker.py` (in the same container or in separate ones sharing the
+data/, uploads/ and outputs/ volumes) to render them.
+"""
+import os
+import signal
+import logging
+import threading
+from dotenv import load_dotenv
+from services.job_queue import create_job_queue
+from services.pipeline import run_job, warm_up
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    job_queue = create_job_queue(run_job, workers=max(1, int(os.getenv('RENDER_WORKERS', '1'))),
+                                 initializer=warm_up)
+    if not job_queue.use_processes:
+        raise ValueError("A standalone render worker needs a job store shared across processes")
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    logger.info(f"Render worker host started with {job_queue.workers} worker(s)")
+    while not stop_event.is_set():
+        # Also replaces workers that crashed; their jobs are requeued once their heartbeat goes stale
+        job_queue.start()
+        stop_event.wait(job_queue.heartbeat_interval)
+
+    logger.info("Stopping render workers")
+    job_queue.stop(timeout=float(os.getenv('RENDER_STOP_TIMEOUT', '30')))
+
+
+if __name__ == '__main__':
+    main()